@@ -0,0 +1,226 @@
+"""Time the catalogue pipeline on synthetic databases of increasing size.
+
+    python -m benchmarks.run                         # 1k, 10k, 100k and 1M prices
+    python -m benchmarks.run --sizes 1k 10k          # quick run
+    python -m benchmarks.run --compare benchmarks/results/OLD.json
+
+Synthetic DBs are generated once into benchmarks/data/ (same seed, same
+data) and reused. Each run writes a JSON file to benchmarks/results/ with
+the best and median time per benchmark; --compare prints the ratio against
+an earlier file and exits non-zero when something got slower than
+--threshold. Nothing here touches the network or Google credentials.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import timeit
+from dataclasses import replace
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from wine_catalogue import (SORT_OPTIONS, Catalogue, FilterEngine, SearchIndex, browse, calculate_prices, connect,
+                            export_shortlist, find_duplicates, load_catalogue, sort_rows, what_if)
+from wine_catalogue.dedupe import read_wines
+from wine_catalogue.pricing import active_rules
+from wine_catalogue.sort_index import SortIndex
+from wine_catalogue.snapshot import pa
+from wine_catalogue.synthetic import generate_catalogue
+
+BENCH_DIR = Path(__file__).resolve().parent
+DATA_DIR = BENCH_DIR / "data"
+RESULTS_DIR = BENCH_DIR / "results"
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+SEED = 0
+SEARCH_QUERIES = ["pi", "pinot", "pinot noir", "chateau", "zzqx"]
+SHORTLIST_SIZE = 50
+
+
+def synthetic_db(n_prices, seed=SEED):
+    path = DATA_DIR / f"synthetic_{n_prices}_seed{seed}.db"
+    if not path.exists():
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        print(f"Generating {path.name}...", file=sys.stderr)
+        generate_catalogue(str(path), n_prices, seed=seed)
+    return str(path)
+
+
+def measure(fn, repeat):
+    """(calls per sample, [seconds per call, ...]) using timeit's auto-ranging."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return number, [t / number for t in timer.repeat(repeat=repeat, number=number)]
+
+
+def refresh_after_edit(db_path):
+    """A function that edits one price and refreshes, on a scratch copy so the cached DB stays as generated."""
+    scratch = DATA_DIR / f"scratch_{Path(db_path).name}"
+    shutil.copy(db_path, scratch)
+    catalogue = Catalogue(str(scratch), use_snapshot=False)
+    conn = connect(str(scratch))
+    price_id = int(catalogue.snapshot.df["price_id"].iloc[len(catalogue.snapshot.df) // 2])
+
+    def edit_and_refresh():
+        conn.execute("UPDATE wine_prices SET bottle_price = bottle_price + 0.01 WHERE price_id = ?", (price_id,))
+        conn.commit()
+        catalogue.refresh()
+    return edit_and_refresh
+
+
+def catalogue_benchmarks(db_path):
+    """(group, name, fn) for everything between the DB and the rendered page."""
+    df = load_catalogue(db_path)
+    catalogue = Catalogue(db_path, use_snapshot=False)
+    snapshot = catalogue.snapshot
+    luc = df["bottle_price"].to_numpy(dtype=float)
+    all_rows = np.arange(len(df))
+    top = lambda column: df[column].value_counts().index[0]
+    shortlist = snapshot.df["wine_id"].drop_duplicates().sample(
+        min(SHORTLIST_SIZE, len(df)), random_state=SEED).tolist()
+
+    yield "load", "load_catalogue", lambda: load_catalogue(db_path)
+    yield "load", "catalogue_full_build", lambda: Catalogue(db_path, use_snapshot=False)
+    if pa is not None:
+        Catalogue(db_path)  # make sure the snapshot exists before timing the warm start
+        yield "load", "catalogue_from_snapshot", lambda: Catalogue(db_path)
+    yield "load", "catalogue_refresh_noop", catalogue.refresh
+    yield "load", "catalogue_refresh_one_price", refresh_after_edit(db_path)
+
+    # The bottle, glass and takeaway calculators are one vectorised pass
+    rules = active_rules()
+    yield "pricing", "calculate_prices", lambda: calculate_prices(luc, rules)
+    candidate = replace(rules, version="what_if", bottle_multipliers=tuple(m * 1.05 for m in rules.bottle_multipliers))
+    yield "pricing", "what_if", lambda: what_if(df, rules, candidate)
+
+    yield "search", "build_index", lambda: SearchIndex.from_frame(df)
+    for query in SEARCH_QUERIES:
+        yield "search", f"mask[{query}]", lambda query=query: snapshot.search_index.mask(query)
+    yield "search", "ranked[pinot]", lambda: snapshot.search_index.search("pinot", limit=50)
+
+    filters = {
+        "none": {},
+        "varietal": {"varietals": [top("clean_varietal").title()]},
+        "producer": {"producers": [top("producer")]},
+        "supplier": {"suppliers": [top("supplier")]},
+        "wine_type": {"wine_types": ["Red"]},
+        "price_range": {"price_min": 20.0, "price_max": 100.0},
+        "under_50": {"under_50": True},
+        "over_500": {"over_500": True},
+        "shortlist": {"shortlist": set(shortlist)},
+        "search+varietal+price": {"search": "pinot", "varietals": ["Pinot Noir"], "price_max": 100.0},
+    }
+    yield "filter", "build_engine", lambda: FilterEngine(df)
+    for name, kwargs in filters.items():
+        yield "filter", f"browse[{name}]", lambda kwargs=kwargs: browse(snapshot, with_counts=True, **kwargs)
+    yield "filter", "browse[none,all_suppliers]", lambda: browse(snapshot, group_suppliers=False, with_counts=True)
+    _, supplier_counts = browse(snapshot, with_counts=True, **filters["supplier"])
+    yield "filter", "options[producer]", lambda: snapshot.filter_engine.options("producer")
+    yield "filter", "options[producer,narrowed]", lambda: snapshot.filter_engine.options("producer", supplier_counts)
+
+    yield "sort", "build_sort_index", lambda: SortIndex(snapshot.df)
+    for sort in SORT_OPTIONS:
+        yield "sort", f"sort_rows[{sort}]", lambda sort=sort: sort_rows(snapshot.sort_index, all_rows, sort)
+
+    for fmt in ("CSV", "XLSX"):
+        yield "export", f"export_shortlist[{fmt}]", lambda fmt=fmt: export_shortlist(snapshot, shortlist, fmt)
+
+    conn = connect(db_path)
+    try:
+        wines = read_wines(conn)
+    finally:
+        conn.close()
+    yield "dedupe", "find_duplicates", lambda: find_duplicates(wines)
+
+
+def run(sizes, repeat, only=None):
+    results = []
+    for size in sizes:
+        n_prices = SIZES[size]
+        db_path = synthetic_db(n_prices)
+        for group, name, fn in catalogue_benchmarks(db_path):
+            if only and not any(pattern in f"{group}/{name}" for pattern in only):
+                continue
+            number, times = measure(fn, repeat)
+            results.append({"size": size, "rows": n_prices, "group": group, "name": name, "number": number,
+                            "best_s": min(times), "median_s": statistics.median(times)})
+            print(f"{size:>5} {group:<8} {name:<32} {min(times) * 1000:12.3f} ms", file=sys.stderr)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__ if pa is not None else None,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print current/baseline ratios and return the benchmarks slower than threshold."""
+    before = {(r["size"], r["group"], r["name"]): r["best_s"] for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = before.get((r["size"], r["group"], r["name"]))
+        if old is None:
+            continue
+        ratio = r["best_s"] / old
+        flag = ""
+        if ratio > threshold:
+            flag = "  SLOWER"
+            regressions.append(r)
+        print(f"{r['size']:>5} {r['group']:<8} {r['name']:<32} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the wine catalogue on synthetic data.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="samples per benchmark (best and median are kept)")
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose group/name contains any of these")
+    parser.add_argument("-o", "--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+
+    started = datetime.datetime.now(datetime.timezone.utc)
+    results = run(args.sizes, args.repeat, args.only)
+    report = {"started_at": started.isoformat(timespec="seconds"), "seed": SEED, "repeat": args.repeat,
+              "environment": environment(), "results": results}
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        started.strftime("%Y%m%dT%H%M%SZ") + (f"_{report['environment']['git_revision']}"
+                                              if report["environment"]["git_revision"] else "") + ".json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Wrote {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
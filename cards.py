@@ -0,0 +1,113 @@
+import html
+import math
+
+PAGE_SIZES = [24, 48, 96, 192]
+DEFAULT_PAGE_SIZE = 48
+CARDS_PER_ROW = 3
+
+CARD_CSS = """
+    <style>
+    .card {
+      background: white;
+      border-radius: 12px;
+      padding: 1rem;
+      box-shadow: 0 2px 6px rgba(0,0,0,0.08);
+      display: flex;
+      flex-direction: column;
+      justify-content: space-between;
+      height: 100%;
+      margin-bottom: 0.3rem;
+    }
+    .card-title {
+      font-weight: 700;
+      font-size: 1.1rem;
+      margin-bottom: 0.3rem;
+      color: #111;
+    }
+    .card-sub {
+      font-style: italic;
+      color: #555;
+      font-size: 0.9rem;
+      margin-bottom: 0.3rem;
+    }
+    .price {
+      margin-top: 0.6rem;
+      font-weight: bold;
+      color: #222;
+      font-size: 1rem;
+    }
+    @media only screen and (max-width: 768px) {
+      .card-title {
+        font-size: 1rem;
+      }
+      .card-sub {
+        font-size: 0.85rem;
+      }
+      .price {
+        font-size: 0.95rem;
+      }
+    }
+    </style>
+    """
+
+CARD_TEMPLATE = """
+        <div class='card'>
+            <div class='card-title'>{title}</div>
+            <div class='card-sub'>{vintage}</div>
+            <div class='card-sub'>{varietal} – {region}</div>
+            <div class='card-sub'>Supplier: {supplier}</div>{suppliers}
+            <div class='price'>
+                💲 <strong>LUC:</strong> {luc}<br>
+                🍾 <strong>Bottle Price:</strong> {bottle}<br>
+                🥂 <strong>Glass Price:</strong> {glass}<br>
+                📦 <strong>Takeaway Price:</strong> {takeaway}
+            </div>
+        </div>"""
+
+
+def safe_float_str(value):
+    try:
+        value = float(value)
+    except (ValueError, TypeError):
+        return "N/A"
+    if math.isnan(value):
+        return "N/A"
+    return f"${value:.2f}"
+
+
+def paginate(n_rows, page_size, page_number):
+    """Clamp page_number into range and return (start, stop, page_number, n_pages)."""
+    n_pages = max(1, math.ceil(n_rows / page_size))
+    page_number = min(max(1, page_number), n_pages)
+    start = (page_number - 1) * page_size
+    return start, min(start + page_size, n_rows), page_number, n_pages
+
+
+def render_supplier_prices(row, supplier_prices):
+    """Expandable per-supplier LUC list for a wine sold by several suppliers."""
+    if len(supplier_prices) < 2:
+        return ""
+    items = "".join(f"<li>{html.escape(str(supplier))}: {safe_float_str(price)}</li>"
+                    for supplier, price in supplier_prices)
+    return (f"<details class='card-sub'><summary>Cheapest of {len(supplier_prices)} suppliers "
+            f"(spread {safe_float_str(row.get('price_spread'))})</summary><ul>{items}</ul></details>")
+
+
+def render_card_html(row, supplier_prices=None):
+    """One card's HTML for a catalogue row (a dict).
+
+    supplier_prices is the wine's [(supplier, LUC), ...]; when given, the
+    card gets an expandable comparison of every supplier's price.
+    """
+    return CARD_TEMPLATE.format(
+        title=html.escape(f"{row['producer']} {row['wine_name']}"),
+        vintage=html.escape(str(row["vintage"])),
+        varietal=html.escape(str(row["varietal"])),
+        region=html.escape(str(row["region"])),
+        supplier=html.escape(str(row["supplier"])),
+        suppliers=render_supplier_prices(row, supplier_prices) if supplier_prices else "",
+        luc=safe_float_str(row.get("bottle_price")),
+        bottle=safe_float_str(row.get("calculated_bottle_price")),
+        glass=safe_float_str(row.get("calculated_glass_price")),
+        takeaway=safe_float_str(row.get("calculated_takeaway_price")),
+    )
@@ -0,0 +1,24 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from wine_catalogue.db import Database, migrate
+
+BUNDLED_DB = Path(__file__).resolve().parent.parent / "wine_supplier_with_producer.db"
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A migrated scratch copy of the bundled database."""
+    path = tmp_path / "wines.db"
+    shutil.copy(BUNDLED_DB, path)
+    migrate(path)
+    return path
+
+
+@pytest.fixture
+def db(db_path):
+    db = Database(db_path)
+    yield db
+    db.close()
@@ -0,0 +1,50 @@
+import sqlite3
+
+import pytest
+
+from wine_catalogue.api import CatalogueAPI, TestClient
+from wine_catalogue.catalogue import Catalogue
+
+
+@pytest.fixture
+def api(db_path):
+    app = CatalogueAPI(Catalogue(db_path, use_snapshot=False), refresh_interval=3600)
+    client = TestClient(app)
+    yield client
+    client.close()
+    app._conn.close()
+
+
+def test_etag_revalidates_until_the_catalogue_changes(api, db_path):
+    first = api.get("/wines?q=pinot")
+    assert first.status == 200 and first.json()["total"] > 0
+    etag = first.headers["etag"]
+
+    not_modified = api.get("/wines?q=pinot", headers={"If-None-Match": f'"stale", {etag}'})
+    assert (not_modified.status, not_modified.body, not_modified.headers["etag"]) == (304, b"", etag)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE wine_prices SET bottle_price = bottle_price + 1 WHERE price_id = 5")
+    conn.commit()
+    conn.close()
+    api.app.catalogue.refresh()
+    changed = api.get("/wines?q=pinot", headers={"If-None-Match": etag})
+    assert changed.status == 200 and changed.headers["etag"] != etag
+
+
+@pytest.mark.parametrize("url", ["/wines?limit=0", "/wines?limit=many", "/wines?price_min=cheap",
+                                 "/wines?price_max=nan", "/wines?under_50=maybe", "/wines?sort=vintage"])
+def test_bad_parameters_are_400(api, url):
+    response = api.get(url)
+    assert response.status == 400 and "error" in response.json()
+
+
+@pytest.mark.parametrize("url", ["/wines/99999999", "/wines/pinot", "/no-such-endpoint"])
+def test_unknown_wines_and_paths_are_404(api, url):
+    response = api.get(url)
+    assert response.status == 404 and "error" in response.json()
+
+
+def test_facets_count_the_wines_listed(api):
+    body = api.get("/wines?facets=true&limit=1").json()
+    assert sum(body["facets"]["wine_type"].values()) == body["total"]
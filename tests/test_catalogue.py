@@ -0,0 +1,84 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from wine_catalogue import catalogue as catalogue_module, instrumentation
+from wine_catalogue.catalogue import Catalogue
+from wine_catalogue.filters import FACET_COLUMNS
+from wine_catalogue.query import browse
+from wine_catalogue.snapshot import snapshot_path
+
+QUERIES = ["", "e", "pi", "pinot", "sauvignon blanc", "no such wine"]
+
+
+def assert_same_catalogue(snapshot, expected):
+    """snapshot holds the same rows and answers like expected, a freshly built one."""
+    pd.testing.assert_frame_equal(snapshot.df, expected.df)
+    filters, expected_filters = snapshot.filter_engine, expected.filter_engine
+    for column, codes in expected_filters.codes.items():
+        assert list(filters.categories[column]) == list(expected_filters.categories[column]), column
+        assert np.array_equal(filters.codes[column], codes), column
+        assert np.array_equal(filters.option_counts[column], expected_filters.option_counts[column]), column
+    assert np.array_equal(filters.price_order, expected_filters.price_order)
+    assert filters.price_range == expected_filters.price_range
+    for sort, order in expected.sort_index.orders.items():
+        assert np.array_equal(snapshot.sort_index.orders[sort], order), sort
+        assert np.array_equal(snapshot.sort_index.ranks[sort], expected.sort_index.ranks[sort]), sort
+    assert snapshot.wine_rows.keys() == expected.wine_rows.keys()
+    assert all(np.array_equal(snapshot.wine_rows[wine_id], rows) for wine_id, rows in expected.wine_rows.items())
+    for column in FACET_COLUMNS:
+        assert filters.options(column) == expected_filters.options(column), column
+    for query in QUERIES:
+        assert np.array_equal(snapshot.search_index.mask(query), expected.search_index.mask(query)), query
+        for sort in expected.sort_index.orders:
+            for group_suppliers in (True, False):
+                assert np.array_equal(browse(snapshot, query, sort=sort, group_suppliers=group_suppliers),
+                                      browse(expected, query, sort=sort, group_suppliers=group_suppliers)), query
+
+
+def test_warm_start_restores_the_saved_indexes(db_path):
+    cold = Catalogue(db_path)
+    assert cold.snapshot_path == snapshot_path(db_path)
+
+    recorder = instrumentation.activate(instrumentation.Recorder())
+    try:
+        warm = Catalogue(db_path)
+    finally:
+        instrumentation.activate(None)
+    assert recorder.counters["snapshot.hit"] == 1
+    assert "catalogue.build_indexes" not in [span.name for span in recorder.spans]
+    assert warm.snapshot.change_id == cold.snapshot.change_id
+    assert_same_catalogue(warm.snapshot, Catalogue(db_path, use_snapshot=False).snapshot)
+
+
+@pytest.mark.parametrize("compact", [False, True], ids=["slices", "gathered"])
+def test_refresh_splices_changes_like_a_fresh_build(db_path, monkeypatch, compact):
+    if compact:
+        monkeypatch.setattr(catalogue_module, "SPLICE_COMPACT_PIECES", 0)
+    catalogue = Catalogue(db_path, use_snapshot=False)
+    changes = [
+        # Edit a price, and rename a producer so its wine moves in the sort order
+        ["UPDATE wine_prices SET bottle_price = bottle_price + 5 WHERE price_id = 5",
+         "UPDATE wines SET producer = 'Zz Renamed Estate' WHERE wine_id = 1"],
+        # Insert a wine with two prices
+        ["INSERT INTO wines (wine_id, wine_name, vintage, varietal, region, producer) "
+         "VALUES (100000, 'Aa Brand New Pinot Noir', '2022', 'Pinot Noir', 'Otago', 'Aardvark Estate')",
+         "INSERT INTO wine_prices (wine_id, supplier_id, bottle_price) VALUES (100000, 1, 33.0), (100000, 1, 31.0)"],
+        # Delete one of the two prices Red+White lists for wine 239
+        ["DELETE FROM wine_prices WHERE price_id = 247"],
+        # Delete a whole wine
+        ["DELETE FROM wine_prices WHERE wine_id = 47", "DELETE FROM wines WHERE wine_id = 47"],
+    ]
+    conn = sqlite3.connect(db_path)
+    try:
+        for statements in changes:
+            for sql in statements:
+                conn.execute(sql)
+            conn.commit()
+            snapshot = catalogue.refresh()
+            assert_same_catalogue(snapshot, Catalogue(db_path, use_snapshot=False).snapshot)
+    finally:
+        conn.close()
+    assert 47 not in snapshot.wine_rows and len(snapshot.wine_rows[100000]) == 2
@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from wine_catalogue import dedupe
+from wine_catalogue.dedupe import find_duplicates, merge_wines, read_wines
+
+
+def test_tiled_scoring_finds_the_same_duplicates(db, monkeypatch):
+    with db.read() as conn:
+        wines = read_wines(conn)
+    # One large block of near-identical names, so it spans many tiles
+    block = pd.DataFrame({"wine_id": range(10**6, 10**6 + 40), "producer": "Tiling Test Estate", "vintage": "2020",
+                          "wine_name": [f"Reserve Pinot Noir {'Clone' if i % 2 else 'Clones'} {i % 5 * 'x'}"
+                                        for i in range(40)]})
+    wines = pd.concat([wines, block], ignore_index=True)
+    expected = find_duplicates(wines)
+    assert (expected["keep_wine_id"] >= 10**6).any()
+    monkeypatch.setattr(dedupe, "BLOCK_CHUNK", 3)
+    pd.testing.assert_frame_equal(find_duplicates(wines), expected)
+
+
+def test_merging_into_a_missing_wine_changes_nothing(db):
+    with db.read() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM wines").fetchone()[0]
+    # The second merge keeps wine 2, which the first merge removes
+    with pytest.raises(ValueError, match="does not exist"):
+        merge_wines(db, [(1, 2), (2, 3)])
+    with pytest.raises(ValueError, match="does not exist"):
+        merge_wines(db, [(99999999, 1)])
+    with db.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM wines").fetchone()[0] == before
+        assert conn.execute("SELECT COUNT(*) FROM wine_prices WHERE wine_id = 99999999").fetchone()[0] == 0
@@ -0,0 +1,32 @@
+import pytest
+
+from wine_catalogue import Database, EditConflict, WineEdit, apply_edits
+from wine_catalogue.catalogue import last_change_id
+
+
+def prices(db):
+    with db.read() as conn:
+        return dict(conn.execute("SELECT price_id, bottle_price FROM wine_prices WHERE price_id IN (5, 6)"))
+
+
+def test_second_writer_of_the_same_price_conflicts_and_writes_nothing(db, db_path):
+    # Both editors loaded the catalogue at the same version
+    with db.read() as conn:
+        seen_change_id = last_change_id(conn)
+        (wine_id,), (other_wine_id,) = conn.execute("SELECT wine_id FROM wine_prices WHERE price_id IN (5, 6) "
+                                                     "ORDER BY price_id").fetchall()
+    before = prices(db)
+
+    apply_edits(db, [WineEdit(wine_id, price_id=5, price_changes={"bottle_price": 11.0})], seen_change_id)
+
+    second = Database(db_path)
+    try:
+        with pytest.raises(EditConflict) as conflict:
+            apply_edits(second, [WineEdit(other_wine_id, price_id=6, price_changes={"bottle_price": 66.0}),
+                                 WineEdit(wine_id, {"vintage": "1999"}, 5, {"bottle_price": 22.0})], seen_change_id)
+    finally:
+        second.close()
+    assert conflict.value.wine_ids == [wine_id]
+    assert prices(db) == {5: 11.0, 6: before[6]}
+    with db.read() as conn:
+        assert conn.execute("SELECT vintage FROM wines WHERE wine_id = ?", (wine_id,)).fetchone()[0] != "1999"
@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+from wine_catalogue import importer
+from wine_catalogue.importer import import_price_list
+
+
+def price_list(n):
+    lines = ["Producer,Wine Name,Vintage,Bottle Price"]
+    lines += [f"Import Test Producer {i},Import Test Cuvee {i},2021,{30 + i}.00" for i in range(n)]
+    return io.StringIO("\n".join(lines))
+
+
+def imported_wines(db):
+    with db.read() as conn:
+        return conn.execute("SELECT COUNT(*) FROM wines WHERE producer LIKE 'Import Test Producer %'").fetchone()[0]
+
+
+def test_import_writes_every_chunk(db):
+    report = import_price_list(price_list(5), "Import Test Supplier", filename="prices.csv", db=db,
+                               create_missing=True, chunk_size=2)
+    assert report.created_wines == 5 and imported_wines(db) == 5
+
+
+def test_failure_part_way_writes_nothing(db, monkeypatch):
+    chunks = list(importer.read_price_list(price_list(5), "prices.csv", chunk_size=2))
+
+    def failing_read(source, filename=None, chunk_size=importer.CHUNK_SIZE):
+        yield chunks[0]
+        raise ValueError("unreadable row")
+
+    monkeypatch.setattr(importer, "read_price_list", failing_read)
+    with pytest.raises(ValueError):
+        import_price_list(price_list(5), "Import Test Supplier", filename="prices.csv", db=db, create_missing=True)
+    assert imported_wines(db) == 0
+    with db.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM suppliers WHERE name = 'Import Test Supplier'").fetchone()[0] == 0
+
+
+def test_streams_a_binary_upload_and_leaves_it_open(db):
+    upload = io.BytesIO("\ufeffProducer,Wine Name,Vintage,Bottle Price\nImport Test Producer 1,Cuvée 1,2021,30.00\n"
+                        .encode("utf-8"))
+    report = import_price_list(upload, "Import Test Supplier", filename="prices.csv", db=db, create_missing=True)
+    assert report.created_wines == 1 and not upload.closed
+    with db.read() as conn:
+        assert conn.execute("SELECT wine_name FROM wines WHERE producer = 'Import Test Producer 1'").fetchone() == ("Cuvée 1",)
+
+
+def test_updates_only_the_first_of_duplicate_prices(db):
+    # Red+White lists Leeuwin Estate Sauvignon Blanc (wine 239) twice, as prices 240 and 247
+    with db.read() as conn:
+        producer, wine_name, vintage = conn.execute(
+            "SELECT producer, wine_name, vintage FROM wines WHERE wine_id = 239").fetchone()
+        second = conn.execute("SELECT bottle_price FROM wine_prices WHERE price_id = 247").fetchone()[0]
+    source = io.StringIO(f"Producer,Wine Name,Vintage,Bottle Price\n{producer},{wine_name},{vintage},19.99\n")
+    report = import_price_list(source, "Red+White", filename="prices.csv", db=db)
+    assert report.updated == 1
+    with db.read() as conn:
+        prices = dict(conn.execute("SELECT price_id, bottle_price FROM wine_prices WHERE wine_id = 239"))
+    assert prices == {240: 19.99, 247: second}
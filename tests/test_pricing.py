@@ -0,0 +1,86 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from wine_catalogue.pricing import calculate_prices, load_rule_sets
+
+# The per-row formulas the app used before pricing was vectorized, with their hard-coded 2024-01 tables
+price_tiers = [0, 5, 10, 15, 25, 35, 50, 60, 70, 80, 90, 100, 125, 150, 200, 250, 300, 350, 400, 450, 500, 550, 600, 700]
+bottle_multipliers = [3, 2.5, 2.5, 2.25, 2.15, 2.0, 1.9, 1.8, 1.7, 1.6, 1.6, 1.6, 1.6, 1.55, 1.5, 1.5, 1.45, 1.4, 1.4, 1.3,
+                      1.3, 1.3, 1.3, 1.3]
+glass_multipliers = [2.2, 2.1, 2.05, 2.00, 1.95, 1.85, 1.80, 1.75, 1.70, 1.65, 1.6, 1.6, 1.6]
+takeaway_multipliers = [2, 1.8, 1.7, 1.65, 1.57, 1.54, 1.50, 1.48, 1.45, 1.42, 1.39, 1.36, 1.33, 1.3, 1.2, 1.2, 1.2, 1.2,
+                        1.15, 1.15, 1.15, 1.15]
+
+
+def calculate_bottle_price(luc):
+    if np.isnan(luc) or luc <= 0:
+        return "N/A"
+    inc_price = luc * 1.1
+    idx = np.searchsorted(price_tiers, luc, side="right") - 1
+    idx = min(idx, len(bottle_multipliers) - 1)
+    multiplier = bottle_multipliers[idx]
+    result = math.ceil(inc_price * multiplier / 10.0) * 10
+    return int(result)
+
+
+def calculate_glass_price(luc):
+    if np.isnan(luc) or luc <= 0 or luc * 1.1 > 200:
+        return "N/A"
+    inc_price = luc * 1.1
+    idx = np.searchsorted(price_tiers, luc, side="left") - 1
+    idx = min(idx, len(glass_multipliers) - 1)
+    multiplier = glass_multipliers[idx]
+    rounded_bottle_price = math.ceil(inc_price * multiplier / 10.0) * 10
+    glass_price = max(rounded_bottle_price / 4, 14)
+    return round(glass_price, 2)
+
+
+def calculate_takeaway_price(luc):
+    if np.isnan(luc) or luc <= 0:
+        return "N/A"
+    inc_price = luc * 1.1
+    idx = np.searchsorted(price_tiers, luc, side="left") - 1
+    idx = min(idx, len(takeaway_multipliers) - 1)
+    multiplier = takeaway_multipliers[idx]
+    result = math.ceil(inc_price * multiplier / 10.0) * 10
+    return int(result)
+
+
+def edge_lucs():
+    lucs = [0.0, -0.0, -5.0, np.nan, 1e-9, 0.01, 200 / 1.1, 1000.0, 1e6]
+    for tier in price_tiers:
+        lucs += [tier, np.nextafter(tier, -np.inf), np.nextafter(tier, np.inf), tier - 0.005, tier + 0.005]
+    # LUCs whose marked-up price lands exactly on, or one ulp either side of, a multiple of ten
+    for multiplier in set(bottle_multipliers + glass_multipliers + takeaway_multipliers):
+        for target in range(10, 2000, 10):
+            luc = target / (1.1 * multiplier)
+            lucs += [luc, np.nextafter(luc, -np.inf), np.nextafter(luc, np.inf), round(luc, 2)]
+    return lucs
+
+
+def test_matches_the_per_row_formulas():
+    rng = np.random.default_rng(0)
+    luc = np.concatenate([edge_lucs(), rng.uniform(0, 1000, 20_000), np.round(rng.lognormal(3, 1, 20_000), 2)])
+    prices = calculate_prices(luc, load_rule_sets()[0]["2024-01"])
+    for column, formula in [("calculated_bottle_price", calculate_bottle_price),
+                            ("calculated_glass_price", calculate_glass_price),
+                            ("calculated_takeaway_price", calculate_takeaway_price)]:
+        expected = np.array([np.nan if price == "N/A" else price for price in map(formula, luc)], dtype=float)
+        mismatched = ~((prices[column] == expected) | (np.isnan(prices[column]) & np.isnan(expected)))
+        assert not mismatched.any(), (column, luc[mismatched][:5])
+
+
+def test_rule_sets_are_reread_only_when_the_file_changes(tmp_path):
+    path = tmp_path / "pricing_rules.json"
+    rules = load_rule_sets()[0]["2024-01"].as_dict()
+    path.write_text(json.dumps({"rule_sets": [rules]}))
+    first, active = load_rule_sets(path)
+    assert active == "2024-01" and load_rule_sets(path)[0]["2024-01"] is first["2024-01"]
+
+    path.write_text(json.dumps({"rule_sets": [rules, {**rules, "version": "2025-01", "gst": 1.15}]}))
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+    rule_sets, active = load_rule_sets(path)
+    assert active == "2025-01" and rule_sets[active].gst == 1.15
@@ -0,0 +1,18 @@
+import pytest
+
+from wine_catalogue.catalogue import Catalogue
+from wine_catalogue.query import browse
+
+
+@pytest.fixture
+def snapshot(db_path):
+    return Catalogue(db_path, use_snapshot=False).snapshot
+
+
+@pytest.mark.parametrize("group_suppliers", [True, False])
+def test_facet_counts_match_the_cards(snapshot, group_suppliers):
+    rows, counts = browse(snapshot, group_suppliers=group_suppliers, with_counts=True)
+    # Every wine (and row) has exactly one wine type
+    assert sum(counts["wine_type"].values()) == len(rows)
+    for supplier, count in counts["supplier"].items():
+        assert count == len(browse(snapshot, suppliers=[supplier], group_suppliers=group_suppliers)), supplier
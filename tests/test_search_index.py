@@ -0,0 +1,34 @@
+import random
+
+import numpy as np
+
+from wine_catalogue.search_index import SearchIndex, normalize_query
+from wine_catalogue.text import fold
+
+
+def contains_mask(producers, names, query):
+    mask = np.ones(len(producers), dtype=bool)
+    for token in normalize_query(query).split():
+        mask &= [token in producer or token in name for producer, name in zip(producers, names)]
+    return mask
+
+
+def test_matches_substring_search(db):
+    with db.read() as conn:
+        rows = conn.execute("SELECT COALESCE(producer, ''), COALESCE(wine_name, '') FROM wines").fetchall()
+    producers, wine_names = [fold(producer) for producer, _ in rows], [fold(name) for _, name in rows]
+    half = len(producers) // 2
+    full = SearchIndex(producers, wine_names)
+    extended = SearchIndex(producers[:half], wine_names[:half]).with_rows(producers, wine_names)
+
+    rng = random.Random(0)
+    queries = ["", "a", "Rosé", "pinot noir", "  sauv  blanc ", "no such wine"]
+    for _ in range(200):
+        text = rng.choice(producers + wine_names)
+        start = rng.randrange(max(1, len(text)))
+        queries.append(text[start:start + rng.randint(1, 8)])
+    for query in queries:
+        expected = contains_mask(producers, wine_names, query)
+        for index in (full, extended):
+            assert np.array_equal(index.mask(query), expected), query
+            assert sorted(index.search(query).tolist()) == np.flatnonzero(expected).tolist(), query
@@ -0,0 +1,63 @@
+
+import pytest
+
+from wine_catalogue.google_sheet import FakeWorksheet
+from wine_catalogue.sheet_sync import SyncRefused, sync_sheet
+
+HEADER = ["Producer", "Wine Name", "Vintage", "Bottle Price", "Supplier"]
+
+
+def sheet_rows(n):
+    return [[f"Sync Test Producer {i}", f"Sync Test Cuvee {i}", "2020", f"{20 + i}.50", "Sync Test Supplier"]
+            for i in range(n)]
+
+
+def synced_prices(db):
+    with db.read() as conn:
+        return conn.execute("SELECT COUNT(*) FROM sheet_sync_rows r JOIN wine_prices p USING (price_id)").fetchone()[0]
+
+
+def test_blank_row_at_page_end_does_not_delete_later_rows(db):
+    rows = sheet_rows(6)
+    report = sync_sheet(db, FakeWorksheet(HEADER, rows, revision="1"), page_size=3)
+    assert report.inserted == 6 and synced_prices(db) == 6
+
+    # Sheet row 4 is the last row of the first page; the API drops it from that page
+    with_blank = rows[:2] + [[""] * len(HEADER)] + rows[2:]
+    report = sync_sheet(db, FakeWorksheet(HEADER, with_blank, revision="2"), page_size=3)
+    assert (report.inserted, report.updated, report.deleted, report.unchanged) == (0, 0, 0, 6)
+    assert synced_prices(db) == 6
+
+
+def test_removed_rows_delete_their_prices_and_wines(db):
+    rows = sheet_rows(6)
+    sync_sheet(db, FakeWorksheet(HEADER, rows, revision="1"), page_size=4)
+    report = sync_sheet(db, FakeWorksheet(HEADER, rows[:1] + rows[2:], revision="2"), page_size=4)
+    assert (report.deleted, report.unchanged) == (1, 5)
+    assert synced_prices(db) == 5
+    with db.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM wines WHERE producer = 'Sync Test Producer 1'").fetchone()[0] == 0
+        assert conn.execute("SELECT COUNT(*) FROM wines WHERE producer LIKE 'Sync Test Producer %'").fetchone()[0] == 5
+
+
+def bundled_wine_1_price(db):
+    with db.read() as conn:
+        return conn.execute("SELECT wine_id, bottle_price FROM wine_prices WHERE price_id = 1").fetchone()
+
+
+def test_removing_a_linked_row_keeps_the_price_and_wine_it_did_not_create(db):
+    # Bundled wine 1 is priced by Red+White as price_id 1
+    row = ["Alkoomi", "Grazing Collection Sauvignon Blanc", "2023/2024", "12.50", "Red+White"]
+    report = sync_sheet(db, FakeWorksheet(HEADER, [row], revision="1"))
+    assert (report.inserted, report.linked) == (0, 1)
+    assert bundled_wine_1_price(db) == (1, 12.5)
+
+    with pytest.raises(SyncRefused):
+        sync_sheet(db, FakeWorksheet(HEADER, [], revision="2"))
+    assert synced_prices(db) == 1
+
+    report = sync_sheet(db, FakeWorksheet(HEADER, [], revision="2"), force=True)
+    assert report.deleted == 1 and synced_prices(db) == 0
+    assert bundled_wine_1_price(db) == (1, 12.5)
+    with db.read() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM wines WHERE wine_id = 1").fetchone()[0] == 1
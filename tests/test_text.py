@@ -0,0 +1,24 @@
+from wine_catalogue import text
+from wine_catalogue.text import fold, fold_values
+
+VALUES = ["", "Château Léoville-Las Cases", "GRÜNER VELTLINER", "Côte-Rôtie", "Ürziger Würzgarten", "張裕", "Rosé 🍷",
+          "Bodegas Muga Reserva Ñ", "ŽILAVKA"]
+
+
+def test_pool_and_serial_folding_agree(monkeypatch):
+    values = [f"{value} {i}" for i in range(200) for value in VALUES]
+    monkeypatch.setattr(text, "PARALLEL_MIN_VALUES", 100)
+    monkeypatch.setattr(text, "_folded", {})
+    pooled = fold_values(values, processes=2)
+    assert text._folded == dict(zip(values, pooled))
+
+    monkeypatch.setattr(text, "_folded", {})
+    assert fold_values(values, processes=1) == pooled
+    assert [fold(value) for value in values] == pooled
+
+
+def test_memo_keeps_the_newest_values(monkeypatch):
+    monkeypatch.setattr(text, "FOLD_CACHE_SIZE", 3)
+    monkeypatch.setattr(text, "_folded", {})
+    fold_values(["A", "B", "C", "D"], processes=1)
+    assert text._folded == {"B": "b", "C": "c", "D": "d"}
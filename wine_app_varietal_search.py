@@ -1,163 +1,87 @@
 import streamlit as st
-import pandas as pd
-import sqlite3
-from unidecode import unidecode
-import math
-import numpy as np
-import gspread
-from google.oauth2.service_account import Credentials
+import json
+import logging
+import os
+import time
+from wine_catalogue import (DB_PATH, SORT_OPTIONS, Catalogue, Database, EditConflict, WineEdit, apply_edits, browse,
+                            export_shortlist, import_price_list, migrate)
+from wine_catalogue.price_history import biggest_movers
+from wine_catalogue.pricing import load_rule_sets, what_if
+from wine_catalogue import instrumentation
+from wine_catalogue.shortlist import EXPORT_FORMATS
+from wine_catalogue.text import fold
+from cards import CARD_CSS, CARDS_PER_ROW, DEFAULT_PAGE_SIZE, PAGE_SIZES, paginate, render_card_html
+from wine_catalogue.google_sheet import (BackgroundSheetLoader, FIXTURE_ENV_VAR, FakeWorksheet, fixture_records,
+                                        gspread_records, open_worksheet)
+from wine_catalogue.sheet_sync import sync_sheet
 
 st.set_page_config(layout="wide")
 st.title("🍇 Wine Listings")
 
-# Authorize with Google Sheets using secrets.toml
-gcp_creds = st.secrets["gcp_service_account"]
-    
-# Authenticate with proper scopes
-scoped_creds = Credentials.from_service_account_info(
-st.secrets["gcp_service_account"],
-scopes=["https://www.googleapis.com/auth/spreadsheets", 
-"https://www.googleapis.com/auth/drive"])
-            
-gc = gspread.authorize(scoped_creds)
-            
-            
-# Use the key from your sheet URL
-sheet_key = "1H6guq90INPuSk49BfweRJ8zpPUCBLmHLNtVpVX-vThU"
-worksheet = gc.open_by_key(sheet_key).sheet1
-            
-            
-# This pulls all rows of the Google Sheet as a list of dictionaries
-data = worksheet.get_all_records()
-            
-# Convert it into a pandas DataFrame
-df_sheet = pd.DataFrame(data)
-            
-# Ensure all values in 'vintage' are strings for Arrow compatibility
-if 'vintage' in df_sheet.columns:
-    df_sheet['vintage'] = df_sheet['vintage'].astype(str)
-
-# Load cleaned varietal mapping from CSV
-varietal_map_df = pd.read_csv("raw_varietals_for_cleaning.csv").dropna(subset=["varietal", "Clean Varietal"])
-varietal_map = dict(zip(varietal_map_df["varietal"].str.strip(), varietal_map_df["Clean Varietal"].str.strip()))
-
-# Load data from SQLite
-@st.cache_data
-def get_google_sheet_df():
-    worksheet = gc.open_by_key(sheet_key).sheet1
-    data = worksheet.get_all_records()
-    df_sheet = pd.DataFrame(data)
-    for col in df_sheet.columns:
-        df_sheet[col] = df_sheet[col].astype(str)
-    return df_sheet
-    
-def load_data():
-    conn = sqlite3.connect("wine_supplier_with_producer.db")
-    query = '''
-        SELECT w.wine_id, w.wine_name, w.vintage, w.varietal, w.region, w.producer,
-               s.name AS supplier, p.bottle_price
-        FROM wines w
-        JOIN wine_prices p ON w.wine_id = p.wine_id
-        JOIN suppliers s ON p.supplier_id = s.supplier_id
-    '''
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+# Timing spans and cache counters for this rerun, when the Performance tab's
+# toggle is on or WINE_PERF_LOG is set (then every rerun is also logged as JSON)
+PERF_LOG = bool(os.environ.get("WINE_PERF_LOG"))
+if PERF_LOG and not logging.getLogger().handlers:
+    logging.basicConfig(level=logging.INFO)
+recorder = instrumentation.activate(
+    instrumentation.Recorder("rerun") if PERF_LOG or st.session_state.get("perf_enabled") else None
+)
 
-    df.fillna({
-        "wine_name": "",
-        "vintage": "NV",
-        "varietal": "Unknown",
-        "region": "Unknown",
-        "producer": "Unknown",
-        "supplier": "Unknown",
-        "bottle_price": 0.0
-    }, inplace=True)
+# One loader per process; the Google client is only created when the
+# debugging tab asks for the sheet, and the fetch runs on a worker thread.
+@st.cache_resource
+def get_sheet_loader():
+    fixture_path = os.environ.get(FIXTURE_ENV_VAR)
+    if fixture_path:
+        return BackgroundSheetLoader(fixture_records(fixture_path))
+    return BackgroundSheetLoader(gspread_records(dict(st.secrets["gcp_service_account"])))
 
-    df["sort_name"] = df["producer"].apply(lambda x: unidecode(x).lower()) + " " + df["wine_name"].apply(lambda x: unidecode(x).lower())
+# One catalogue per process, shared by every session. The first run migrates
+# the schema and does the full load; later reruns only apply rows logged in
+# catalogue_changes since the last refresh, so searching or clicking a filter
+# never redoes the ETL and a saved edit costs a few rows of work.
+@st.cache_resource(show_spinner="Loading wines...")
+def get_catalogue():
+    instrumentation.count("cache.get_catalogue.miss")
+    migrate(DB_PATH)
+    return Catalogue(DB_PATH)
 
-    df["clean_varietal"] = df["varietal"].map(varietal_map).fillna(df["varietal"])
-    df["clean_varietal"] = df["clean_varietal"].apply(lambda x: unidecode(str(x)).lower())
+# One read connection and one serialized writer per process, shared by every
+# session, so reruns reuse a warm connection and concurrent edits queue up
+# behind the write lock instead of failing with "database is locked"
+@st.cache_resource
+def get_database():
+    return Database(DB_PATH)
 
-    def classify_wine_type(varietal):
-        varietal = varietal.lower()
-        if any(x in varietal for x in ["shiraz", "pinot noir", "merlot", "cabernet", "tempranillo", "malbec"]):
-            return "Red"
-        elif any(x in varietal for x in ["chardonnay", "sauvignon", "riesling", "semillon", "pinot gris", "vermentino"]):
-            return "White"
-        elif "rosé" in varietal or "rose" in varietal:
-            return "Rosé"
-        elif any(x in varietal for x in ["sparkling", "champagne", "prosecco", "methode", "cava"]):
-            return "Sparkling"
-        elif any(x in varietal for x in ["port", "sherry", "vermouth"]):
-            return "Fortified"
-        return "Other"
+# Export files are only built while something is shortlisted, once per
+# (catalogue version, shortlist contents, format)
+@st.cache_data(max_entries=32)
+def build_shortlist_export(change_id, wine_ids, export_format):
+    instrumentation.count("cache.build_shortlist_export.miss")
+    return export_shortlist(get_catalogue().snapshot, wine_ids, export_format)
 
-    df["wine_type"] = df["clean_varietal"].apply(classify_wine_type)
-    df["clean_producer"] = df["producer"].apply(lambda x: unidecode(x).lower())
-    df["clean_wine_name"] = df["wine_name"].apply(lambda x: unidecode(x).lower())
-    df = df.sort_values("sort_name")
-    return df.reset_index(drop=True)
+instrumentation.count("cache.get_catalogue.calls")
+catalogue = get_catalogue()
+with get_database().read() as conn:
+    catalogue = catalogue.refresh(conn)
 
-df = load_data()
+def cached_shortlist_export(*args):
+    instrumentation.count("cache.build_shortlist_export.calls")
+    return build_shortlist_export(*args)
+df = catalogue.df
 
-tab1, tab2 = st.tabs(["🍷 Wine Browser", "📋 Google Sheet Debugging"])
+tab1, tab2, tab3 = st.tabs(["🍷 Wine Browser", "📋 Google Sheet Debugging", "⏱️ Performance"])
 with tab1:
 
-    price_tiers = [0, 5, 10, 15, 25, 35, 50, 60, 70, 80, 90, 100, 125, 150, 200, 250, 300, 350, 400, 450, 500, 550, 600, 700]
-    bottle_multipliers = [3, 2.5, 2.5, 2.25, 2.15, 2.0, 1.9, 1.8, 1.7, 1.6, 1.6, 1.6, 1.6, 1.55, 1.5, 1.5, 1.45, 1.4, 1.4, 1.3, 1.3, 1.3, 1.3, 1.3]
-    glass_multipliers = [2.2, 2.1, 2.05, 2.00, 1.95, 1.85, 1.80, 1.75, 1.70, 1.65, 1.6, 1.6, 1.6]  # Glass price multiplier only for <= $200
-    takeaway_multipliers = [2, 1.8, 1.7, 1.65, 1.57, 1.54, 1.50, 1.48, 1.45, 1.42, 1.39, 1.36, 1.33, 1.3, 1.2, 1.2, 1.2, 1.2, 1.15, 1.15, 1.15, 1.15]
-    
-    def calculate_bottle_price(luc):
-        if np.isnan(luc) or luc <= 0:
-            return "N/A"
-        inc_price = luc * 1.1
-        idx = np.searchsorted(price_tiers, luc, side="right") - 1
-        idx = min(idx, len(bottle_multipliers) - 1)
-        multiplier = bottle_multipliers[idx]
-        result = math.ceil(inc_price * multiplier / 10.0) * 10
-        return int(result)
-    
-    def calculate_glass_price(luc):
-        if np.isnan(luc) or luc <= 0 or luc * 1.1 > 200:
-            return "N/A"
-        inc_price = luc * 1.1
-        idx = np.searchsorted(price_tiers, luc, side="left") - 1
-        idx = min(idx, len(glass_multipliers) - 1)
-        multiplier = glass_multipliers[idx]
-        rounded_bottle_price = math.ceil(inc_price * multiplier / 10.0) * 10
-        glass_price = max(rounded_bottle_price / 4, 14)
-        return round(glass_price, 2)
-    
-    def calculate_takeaway_price(luc):
-        if np.isnan(luc) or luc <= 0:
-            return "N/A"
-        inc_price = luc * 1.1
-        idx = np.searchsorted(price_tiers, luc, side="left") - 1
-        idx = min(idx, len(takeaway_multipliers) - 1)
-        multiplier = takeaway_multipliers[idx]
-        result = math.ceil(inc_price * multiplier / 10.0) * 10
-        return int(result)
-    
     def safe_float(value, default=0.0):
         try:
             return float(value)
         except (ValueError, TypeError):
             return default
     
-    def safe_float_str(value):
-        try:
-            return f"${float(value):.2f}"
-        except (ValueError, TypeError):
-            return "N/A"
-    
-    
-    df["calculated_bottle_price"] = df["bottle_price"].apply(calculate_bottle_price)
-    df["calculated_glass_price"] = df["bottle_price"].apply(calculate_glass_price)
-    df["calculated_takeaway_price"] = df["bottle_price"].apply(calculate_takeaway_price)
-    
     # PAGE NAVIGATION
-    page = st.sidebar.radio("Select Page", ["🍷 Wine Browser", "✏️ Edit Wines"])
+    page = st.sidebar.radio("Select Page", ["🍷 Wine Browser", "✏️ Edit Wines", "📥 Import Price List", "📈 Price Movers",
+                                            "💲 Pricing What-If"])
     
     if page == "🍷 Wine Browser":
         # all existing filtering + display logic remains here (unchanged)
@@ -165,11 +89,14 @@ with tab1:
     
     elif page == "✏️ Edit Wines":
         st.header("✏️ Edit Existing Wine")
-        df["display_name"] = df["wine_name"] + " (" + df["producer"] + ")"
-        wine_to_edit = st.selectbox("Select wine", df["display_name"].tolist())
-        selected_row = df[df["display_name"] == wine_to_edit]
-        if not selected_row.empty:
-            selected_row = selected_row.iloc[0]
+        display_names = (df["wine_name"] + " (" + df["producer"] + ") – " + df["supplier"]).tolist()
+        # Keyed by price_id, not row position: a refresh splices other edits in and shifts positions
+        price_ids = df["price_id"].tolist()
+        row_of_price = dict(zip(price_ids, range(len(df))))
+        price_to_edit = st.selectbox("Select wine", price_ids, key="edit_price_id",
+                                     format_func=lambda price_id: display_names[row_of_price[price_id]])
+        if price_to_edit in row_of_price:
+            selected_row = df.iloc[row_of_price[price_to_edit]]
             with st.form("edit_wine_form"):
                 new_name = st.text_input("Wine Name", selected_row["wine_name"])
                 new_vintage = st.text_input("Vintage", selected_row["vintage"])
@@ -180,27 +107,95 @@ with tab1:
     
                 submitted = st.form_submit_button("Update Wine")
                 if submitted:
-                    conn = sqlite3.connect("wine_supplier_with_producer.db")
-                    cursor = conn.cursor()
-                    cursor.execute("""
-                        UPDATE wines
-                        SET wine_name = ?, vintage = ?, varietal = ?, region = ?, producer = ?
-                        WHERE wine_id = ?
-                    """, (new_name, new_vintage, new_varietal, new_region, new_producer, selected_row["wine_id"]))
-    
-                    cursor.execute("""
-                        UPDATE wine_prices
-                        SET bottle_price = ?
-                        WHERE wine_id = ?
-                    """, (new_price, selected_row["wine_id"]))
-    
-                    conn.commit()
-                    conn.close()
-                    st.success("✅ Wine updated successfully!")
-                    st.cache_data.clear()
+                    edit = WineEdit(
+                        int(selected_row["wine_id"]),
+                        {"wine_name": new_name, "vintage": new_vintage, "varietal": new_varietal,
+                         "region": new_region, "producer": new_producer},
+                        # Only this supplier's price; the wine's other suppliers keep theirs
+                        int(selected_row["price_id"]), {"bottle_price": new_price},
+                    )
+                    try:
+                        # Refuse to overwrite an edit someone else saved after this form was shown
+                        report = apply_edits(get_database(), [edit],
+                                             seen_change_id=st.session_state.get("edit_seen_change_id", catalogue.change_id))
+                    except EditConflict:
+                        st.session_state.edit_seen_change_id = catalogue.change_id
+                        st.error("⚠️ Someone else changed this wine while you were editing it. "
+                                 "The form now shows their version; re-apply your changes and save again.")
+                    else:
+                        st.session_state.edit_seen_change_id = report.change_id
+                        st.success("✅ Wine updated successfully!")
+            if not submitted:
+                st.session_state.edit_seen_change_id = catalogue.change_id
         else:
             st.warning("⚠️ Could not find selected wine.")
     
+    elif page == "📥 Import Price List":
+        st.header("📥 Import Supplier Price List")
+        price_file = st.file_uploader("Price list (CSV or XLSX)", type=["csv", "xlsx"])
+        import_supplier = st.selectbox("Supplier", catalogue.filter_engine.categories["supplier"].tolist())
+        new_supplier = st.text_input("…or a new supplier name")
+        create_missing = st.checkbox("Add wines that are not in the catalogue yet")
+        if price_file is not None:
+            import_args = dict(filename=price_file.name, db=get_database(), create_missing=create_missing)
+            # Parse the upload once per (file, supplier, option, catalogue version), not on every rerun
+            preview_key = (price_file.file_id, new_supplier or import_supplier, create_missing, catalogue.change_id)
+            cached_key, preview = st.session_state.get("import_preview", (None, None))
+            if cached_key != preview_key:
+                try:
+                    price_file.seek(0)
+                    preview = import_price_list(price_file, new_supplier or import_supplier, dry_run=True, **import_args)
+                except ValueError as e:
+                    preview = e
+                st.session_state.import_preview = (preview_key, preview)
+            if isinstance(preview, ValueError):
+                st.error(f"⚠️ {preview}")
+            else:
+                st.info(preview.summary())
+                if preview.changes:
+                    st.dataframe(preview.changes, use_container_width=True)
+                if preview.unmatched_rows:
+                    with st.expander(f"Unmatched rows ({preview.unmatched})"):
+                        st.dataframe(preview.unmatched_rows, use_container_width=True)
+                if st.button("Apply import"):
+                    price_file.seek(0)
+                    report = import_price_list(price_file, new_supplier or import_supplier, **import_args)
+                    st.success(f"✅ {report.summary()}")
+    
+    elif page == "📈 Price Movers":
+        st.header("📈 Biggest Supplier Price Movers")
+        mover_days = st.slider("Over the last N days", min_value=1, max_value=365, value=30)
+        with get_database().read() as conn:
+            movers = biggest_movers(conn, days=mover_days, limit=50)
+        if movers.empty:
+            st.info(f"No supplier prices changed in the last {mover_days} days.")
+        else:
+            st.dataframe(movers.drop(columns=["price_id", "wine_id", "supplier_id"]), use_container_width=True, hide_index=True)
+
+    elif page == "💲 Pricing What-If":
+        st.header("💲 Pricing What-If")
+        # The rules the cached catalogue was priced with, which lag the file until the catalogue is reloaded
+        priced_rules = get_catalogue().pricing_rules
+        file_rule_sets, file_active_version = load_rule_sets()
+        rule_sets = {**file_rule_sets, priced_rules.version: priced_rules}
+        active_version = priced_rules.version
+        versions = list(rule_sets)
+        st.caption(f"Rule sets are versioned in pricing_rules.json; the catalogue is priced with {active_version}."
+                   + (f" The file now marks {file_active_version} active, which applies once the catalogue reloads."
+                      if file_active_version != active_version else ""))
+        base_col, candidate_col = st.columns(2)
+        base_version = base_col.selectbox("Current rules", versions, index=versions.index(active_version))
+        candidate_version = candidate_col.selectbox("Proposed rules", versions, index=len(versions) - 1)
+        what_if_rows, what_if_summary = what_if(
+            df, rule_sets[base_version], rule_sets[candidate_version],
+            keep_columns=["producer", "wine_name", "vintage", "supplier"],
+        )
+        st.dataframe(what_if_summary, use_container_width=True, hide_index=True)
+        changed_rows = what_if_rows[what_if_rows["bottle_delta"].fillna(0) != 0]
+        st.markdown(f"**{len(changed_rows)} of {len(what_if_rows)} bottle prices change**")
+        st.dataframe(changed_rows.reindex(changed_rows["bottle_delta"].abs().sort_values(ascending=False).index).head(200),
+                     use_container_width=True, hide_index=True)
+    
     if "shortlist" not in st.session_state:
         st.session_state.shortlist = set()
     
@@ -209,10 +204,11 @@ with tab1:
         with cols[0]:
             wine_search = st.text_input("🔍 Search by Wine or Producer")
         with cols[1]:
-            sort_option = st.selectbox("Sort By", ["Producer A-Z", "Producer Z-A", "Price Low-High", "Price High-Low"])
+            sort_option = st.selectbox("Sort By", SORT_OPTIONS)
         with cols[2]:
-            type_tags = st.multiselect("Wine Type", ["Red", "White", "Rosé", "Sparkling", "Fortified","Orange"])
+            type_tags = st.multiselect("Wine Type", get_catalogue().classifier.wine_types)
         only_shortlisted = st.checkbox("📌 Show Only Shortlisted Wines")
+        group_suppliers = st.checkbox("🏷️ One card per wine (cheapest supplier)", value=True)
 
     
     with st.sidebar:
@@ -220,209 +216,181 @@ with tab1:
     
         under_50 = st.checkbox("💲 Show only wines under $50")
         over_500 = st.checkbox("💰 Show only wines over $500")
-with st.sidebar:
-    pretty_varietals = sorted(set(v.title() for v in df["clean_varietal"].unique()))
-    varietal_selection = st.multiselect("Varietal", pretty_varietals)
-    producers = st.multiselect("Producer", sorted(df["producer"].unique()))
-    suppliers = st.multiselect("Supplier", sorted(df["supplier"].unique()))
-        
-    filtered_df = df.copy()
-    if only_shortlisted:
-        if st.session_state.shortlist:
-            filtered_df = filtered_df[filtered_df["wine_id"].isin(st.session_state.shortlist)]
-        else:
-            filtered_df = filtered_df.iloc[0:0]  # show empty DataFrame if no shortlist
+# Facet options, counts and the price bound come from the snapshot's filter engine (built once per
+# catalogue version). The query runs before the facet widgets are drawn, on their values from
+# session_state, so each list narrows to the options that still match the other active filters.
+engine = catalogue.filter_engine
+default_price_max = float(engine.price_range[1] + 10)
+varietal_selection = st.session_state.get("varietal_filter", [])
+producers = st.session_state.get("producer_filter", [])
+suppliers = st.session_state.get("supplier_filter", [])
+price_min = st.session_state.get("price_min_filter", 0.0)
+price_max = st.session_state.get("price_max_filter", default_price_max)
 
+# Search, filter, group and sort in the headless package; this script only draws the result
+with instrumentation.span("browse"):
+    filtered_rows, facet_counts = browse(
+        catalogue, search=wine_search, varietals=varietal_selection, producers=producers, suppliers=suppliers,
+        wine_types=type_tags, shortlist=st.session_state.shortlist if only_shortlisted else None,
+        price_min=price_min, price_max=price_max, under_50=under_50, over_500=over_500,
+        group_suppliers=group_suppliers, sort=sort_option, with_counts=True,
+    )
+    filtered_df = df.iloc[filtered_rows]
 
+def facet_widget(label, column, key, selected, to_label=str, to_value=str):
+    values, counts = engine.options(column, facet_counts, selected=[to_value(v) for v in selected])
+    labelled = {}
+    for value, count in zip(values, counts):
+        labelled[to_label(value)] = labelled.get(to_label(value), 0) + count
+    return st.multiselect(label, list(labelled), key=key,
+                          format_func=lambda option: f"{option} ({labelled[option]})")
+
+with st.sidebar:
+    varietal_selection = facet_widget("Varietal", "clean_varietal", "varietal_filter", varietal_selection,
+                                      to_label=str.title, to_value=fold)
+    producers = facet_widget("Producer", "producer", "producer_filter", producers)
+    suppliers = facet_widget("Supplier", "supplier", "supplier_filter", suppliers)
         
-    if wine_search:
-            wine_search_clean = unidecode(wine_search.lower())
-            filtered_df = filtered_df[
-                filtered_df["clean_wine_name"].str.contains(wine_search_clean, na=False) |
-                filtered_df["clean_producer"].str.contains(wine_search_clean, na=False)
-            ]
-        
-    
     st.markdown("**Price Range (LUC $)**")
     col_min, col_max = st.columns(2)
     
     with col_min:
         price_min = st.number_input(
-            "Min", min_value=0.0, value=0.0, step=1.0, format="%.2f"
+            "Min", min_value=0.0, value=0.0, step=1.0, format="%.2f", key="price_min_filter"
         )
     
     with col_max:
         price_max = st.number_input(
-            "Max", min_value=0.0, value=float(df["bottle_price"].max() + 10), step=1.0, format="%.2f"
+            "Max", min_value=0.0, value=default_price_max, step=1.0, format="%.2f", key="price_max_filter"
         )
-        
-        
-    # Apply checkbox filters
-    if under_50:
-        filtered_df = filtered_df[filtered_df["bottle_price"] <= 50]
-    
-    if over_500:
-        filtered_df = filtered_df[filtered_df["bottle_price"] > 500]
-    
-    # Apply box-based price range filter
-    filtered_df = filtered_df[
-        (filtered_df["bottle_price"] >= price_min) &
-        (filtered_df["bottle_price"] <= price_max)
-    ]
 
-    
-if varietal_selection:
-        varietals_clean = [unidecode(v.lower()) for v in varietal_selection]
-        filtered_df = filtered_df[filtered_df["clean_varietal"].isin(varietals_clean)]
-if producers:
-        filtered_df = filtered_df[filtered_df["producer"].isin(producers)]
-if suppliers:
-        filtered_df = filtered_df[filtered_df["supplier"].isin(suppliers)]
-if type_tags:
-        filtered_df = filtered_df[filtered_df["wine_type"].isin(type_tags)]
-    
-if sort_option == "Producer A-Z":
-        filtered_df = filtered_df.sort_values("sort_name")
-elif sort_option == "Producer Z-A":
-        filtered_df = filtered_df.sort_values("sort_name", ascending=False)
-elif sort_option == "Price Low-High":
-        filtered_df = filtered_df.sort_values("bottle_price")
-elif sort_option == "Price High-Low":
-        filtered_df = filtered_df.sort_values("bottle_price", ascending=False)
-    
-st.markdown(f"**Displaying {len(filtered_df)} of {len(df)} wines**")
-    
-st.markdown("""
-    <style>
-    .grid {
-      display: grid;
-      grid-template-columns: repeat(auto-fill, minmax(260px, 1fr));
-      gap: 1rem;
-      padding: 1rem 0.5rem;
-    }
-    .card {
-      background: white;
-      border-radius: 12px;
-      padding: 1rem;
-      box-shadow: 0 2px 6px rgba(0,0,0,0.08);
-      display: flex;
-      flex-direction: column;
-      justify-content: space-between;
-      height: 100%;
-    }
-    .card-title {
-      font-weight: 700;
-      font-size: 1.1rem;
-      margin-bottom: 0.3rem;
-      color: #111;
-    }
-    .card-sub {
-      font-style: italic;
-      color: #555;
-      font-size: 0.9rem;
-      margin-bottom: 0.3rem;
-    }
-    .price {
-      margin-top: 0.6rem;
-      font-weight: bold;
-      color: #222;
-      font-size: 1rem;
-    }
-    .shortlist-button {
-      margin-top: 0.6rem;
-      text-align: right;
-    }
-    @media only screen and (max-width: 768px) {
-      .card-title {
-        font-size: 1rem;
-      }
-      .card-sub {
-        font-size: 0.85rem;
-      }
-      .price {
-        font-size: 0.95rem;
-      }
-    }
-    </style>
-    """, unsafe_allow_html=True)
-    
-st.markdown("<div class='grid'>", unsafe_allow_html=True)
-    
-for i, row in filtered_df.iterrows():
-    is_shortlisted = row['wine_id'] in st.session_state.shortlist
-    
-    st.markdown(f"""
-        <div class='card'>
-            <div class='card-title'>{row['producer']} {row['wine_name']}</div>
-            <div class='card-sub'>{row['vintage']}</div>
-            <div class='card-sub'>{row['varietal']} – {row['region']}</div>
-            <div class='card-sub'>Supplier: {row['supplier']}</div>
-            <div class='price'>
-                💲 <strong>LUC:</strong> {safe_float_str(row.get('bottle_price'))}<br>
-                🍾 <strong>Bottle Price:</strong> {safe_float_str(row.get('calculated_bottle_price'))}<br>
-                🥂 <strong>Glass Price:</strong> {safe_float_str(row.get('calculated_glass_price'))}<br>
-                📦 <strong>Takeaway Price:</strong> {safe_float_str(row.get('calculated_takeaway_price'))}
-    </div>
-    
-    
-    
-        """, unsafe_allow_html=True)
-    
-    # 🔘 Show button (outside of st.markdown!)
-    button_label = "✅ Shortlisted" if is_shortlisted else "➕ Shortlist"
-    if st.button(button_label, key=f"shortlist_btn_{row['wine_id']}_{i}"):
-        if is_shortlisted:
-            st.session_state.shortlist.remove(row['wine_id'])
-        else:
-            st.session_state.shortlist.add(row['wine_id'])
+# PAGINATION – only the current page of cards is sent to the browser
+pager_cols = st.columns([2, 1, 1, 1])
+with pager_cols[1]:
+    page_size = st.selectbox("Wines per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+start, stop, page_number, n_pages = paginate(len(filtered_df), page_size, st.session_state.get("page_number", 1))
+st.session_state.page_number = page_number
+
+def step_page(delta):
+    st.session_state.page_number = min(max(1, st.session_state.page_number + delta), n_pages)
 
-    # ✅ CLOSE the div after button
-    st.markdown("</div>", unsafe_allow_html=True)
+with pager_cols[2]:
+    st.number_input("Page", min_value=1, max_value=n_pages, step=1, key="page_number")
+with pager_cols[3]:
+    prev_col, next_col = st.columns(2)
+    prev_col.button("◀", on_click=step_page, args=(-1,), disabled=page_number <= 1)
+    next_col.button("▶", on_click=step_page, args=(1,), disabled=page_number >= n_pages)
+with pager_cols[0]:
+    st.markdown(f"**Displaying {start + 1 if stop else 0}–{stop} of {len(filtered_df)} matching wines ({len(df)} total)**")
+    st.caption(" · ".join(f"{wine_type} {count}" for wine_type, count in facet_counts["wine_type"].items()))
 
-st.markdown("</div>", unsafe_allow_html=True)  # Close grid container
+page_df = filtered_df.iloc[start:stop]
+
+st.markdown(CARD_CSS, unsafe_allow_html=True)
+
+def toggle_shortlist(wine_id, key):
+    if st.session_state[key]:
+        st.session_state.shortlist.add(wine_id)
+    else:
+        st.session_state.shortlist.discard(wine_id)
+
+with instrumentation.span("render_cards", cards=len(page_df)):
+    supplier_prices = {}
+    if group_suppliers:
+        supplier_prices = {
+            wine_id: sorted(zip(df["supplier"].iloc[rows], df["bottle_price"].iloc[rows]), key=lambda sp: sp[1])
+            for wine_id, rows in ((wine_id, catalogue.wine_rows[wine_id]) for wine_id in page_df["wine_id"])
+        }
+    records = page_df.to_dict("records")
+    for first in range(0, len(records), CARDS_PER_ROW):
+        for card_col, row in zip(st.columns(CARDS_PER_ROW), records[first:first + CARDS_PER_ROW]):
+            with card_col:
+                st.markdown(render_card_html(row, supplier_prices.get(row["wine_id"])), unsafe_allow_html=True)
+                # Keyed by price_id, as ungrouped pages show a card per supplier; the checkbox follows the
+                # shared shortlist, which other cards and "Clear Shortlist" also change
+                key = f"shortlist_{row['price_id']}"
+                st.session_state[key] = row["wine_id"] in st.session_state.shortlist
+                st.checkbox("📌 Shortlist", key=key, on_change=toggle_shortlist, args=(row["wine_id"], key))
     
 with st.sidebar:
     if st.session_state.shortlist:
         st.markdown("### 📝 Shortlist")
         for sid in st.session_state.shortlist:
-            wine = df[df['wine_id'] == sid].iloc[0]
+            if sid not in catalogue.wine_rows:
+                continue  # removed from the catalogue since it was shortlisted
+            wine = df.iloc[catalogue.wine_rows[sid][0]]
             st.write(f"{wine['producer']} {wine['wine_name']} ({wine['vintage']}) – ${wine['bottle_price']:.2f}")
         st.button("Clear Shortlist", on_click=lambda: st.session_state.shortlist.clear())
     
-    columns_to_export = [
-                "wine_name", "vintage", "clean_varietal", "region", "producer", "supplier", "bottle_price"
-            ]
-    
-    export_df = df[df["wine_id"].isin(st.session_state.shortlist)].copy()
-    export_df = export_df[columns_to_export]
-    export_df = export_df.rename(columns={
-                "wine_name": "Wine Name",
-                "vintage": "Vintage",
-                "clean_varietal": "Varietal",
-                "region": "Region",
-                "producer": "Producer",
-                "supplier": "Supplier",
-                "bottle_price": "Price ($)"
-            })
-    
-    export_csv = export_df.to_csv(index=False)
-    
-    st.download_button(
-            label="📅 Download Shortlist (CSV)",
-            data=export_csv,
-            file_name="wine_shortlist.csv",
-            mime="text/csv"
-        )
+        export_format = st.radio("Export format", list(EXPORT_FORMATS), horizontal=True)
+        file_name, mime = EXPORT_FORMATS[export_format]
+        st.download_button(
+                label=f"📅 Download Shortlist ({export_format})",
+                data=cached_shortlist_export(catalogue.change_id, tuple(sorted(st.session_state.shortlist)), export_format),
+                file_name=file_name,
+                mime=mime
+            )
 with tab2:
-    with tab2:
-        st.subheader("📋 Wines from Google Sheet")
+    st.subheader("📋 Wines from Google Sheet")
 
-    with st.spinner("Loading sheet..."):
-        df_sheet = get_google_sheet_df()
+    # Only the rows that changed since the last sync are written; an unchanged sheet costs one metadata call
+    sync_cols = st.columns([1, 1, 3])
+    sync_dry_run = sync_cols[1].checkbox("Preview only", value=True, key="sheet_sync_dry_run")
+    sync_force = sync_cols[1].checkbox("Allow removing most synced rows", key="sheet_sync_force")
+    if sync_cols[0].button("⇄ Sync sheet to database"):
+        fixture_path = os.environ.get(FIXTURE_ENV_VAR)
+        try:
+            worksheet = (FakeWorksheet.from_fixture(fixture_path) if fixture_path
+                         else open_worksheet(dict(st.secrets["gcp_service_account"])))
+            sync_report = sync_sheet(get_database(), worksheet, dry_run=sync_dry_run, force=sync_force)
+        except Exception as e:  # shown to the user; the DB is untouched on failure
+            st.error(f"Sheet sync failed: {e}")
+        else:
+            sync_cols[2].info(sync_report.summary())
 
-    # Ensure all object columns are safely converted to string
-    for col in df_sheet.select_dtypes(include=["object", "int", "float"]).columns:
-        df_sheet[col] = df_sheet[col].astype(str)
+    if st.toggle("Load Google Sheet", key="load_google_sheet"):
+        sheet_loader = get_sheet_loader()
+        if st.button("🔄 Refresh sheet"):
+            sheet_loader.refresh()
 
-    st.dataframe(df_sheet, use_container_width=True)
+        with st.spinner("Loading sheet..."):
+            df_sheet, sheet_error, fetched_at = sheet_loader.get(wait=10)
+
+        if sheet_error is not None:
+            st.error(f"Could not load the Google Sheet: {sheet_error}")
+        if df_sheet is None:
+            if sheet_loader.is_loading():
+                st.info("Still fetching the sheet in the background – refresh the page in a moment.")
+        else:
+            st.caption(f"Fetched {time.strftime('%H:%M:%S', time.localtime(fetched_at))}")
+            st.dataframe(df_sheet, use_container_width=True)
+
+with tab3:
+    st.subheader("⏱️ Timings for this rerun")
+    st.toggle("Record timings", key="perf_enabled",
+              help="Time each stage of every rerun in this session and count cache hits and misses.")
+    if recorder is None:
+        st.caption("Turn on the toggle (or set WINE_PERF_LOG=1) and interact with the browser to record timings.")
+    else:
+        run = recorder.as_dict()
+        st.metric("Rerun so far", f"{run['elapsed_ms']:.1f} ms")
+        st.dataframe(
+            [{"stage": "  " * span["depth"] + span["name"],
+              "ms": None if span["duration_ms"] is None else round(span["duration_ms"], 3),
+              "details": json.dumps({k: v for k, v in span.items() if k not in ("name", "depth", "offset_ms", "duration_ms")},
+                                    default=str)}
+             for span in run["spans"]],
+            use_container_width=True, hide_index=True,
+        )
+        counters = run["counters"]
+        caches = sorted({name.rsplit(".", 1)[0] for name in counters if name.startswith("cache.")})
+        st.dataframe(
+            [{"cache": name[len("cache."):],
+              "hits": counters.get(f"{name}.calls", 0) - counters.get(f"{name}.miss", 0),
+              "misses": counters.get(f"{name}.miss", 0)} for name in caches],
+            use_container_width=True, hide_index=True,
+        )
+        st.json({name: value for name, value in counters.items() if not name.startswith("cache.")})
 
+if recorder is not None:
+    recorder.log()
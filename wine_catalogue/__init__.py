@@ -0,0 +1,35 @@
+"""Headless wine catalogue: loading, pricing, search/filter and shortlist export.
+
+Nothing here imports Streamlit or talks to Google, so it can be used from
+scripts, cron jobs, benchmarks and other services as well as the app.
+"""
+from .catalogue import Catalogue, CatalogueSnapshot, load_catalogue
+from .classifier import WineTypeClassifier
+from .config import DB_PATH
+from .db import Database, connect, migrate
+from .dedupe import find_duplicates, merge_wines
+from .edits import EditConflict, WineEdit, apply_edits
+from .filters import FilterEngine
+from .importer import import_price_list
+from .pricing import PricingRules, active_rules, add_price_columns, calculate_prices, load_rule_sets, what_if
+from .query import SORT_OPTIONS, browse, sort_rows
+from .search_index import SearchIndex
+from .sheet_sync import SyncRefused, sync_sheet
+from .shortlist import EXPORT_FORMATS, export_shortlist
+from .sort_index import SortIndex
+
+__all__ = [
+    "Catalogue", "CatalogueSnapshot", "load_catalogue",
+    "WineTypeClassifier",
+    "DB_PATH", "Database", "connect", "migrate",
+    "find_duplicates", "merge_wines",
+    "EditConflict", "WineEdit", "apply_edits",
+    "FilterEngine",
+    "import_price_list",
+    "PricingRules", "active_rules", "add_price_columns", "calculate_prices", "load_rule_sets", "what_if",
+    "SORT_OPTIONS", "browse", "sort_rows",
+    "SearchIndex",
+    "SyncRefused", "sync_sheet",
+    "EXPORT_FORMATS", "export_shortlist",
+    "SortIndex",
+]
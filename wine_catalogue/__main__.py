@@ -0,0 +1,69 @@
+"""Command line entry point, e.g. for a nightly cron job.
+
+    python -m wine_catalogue migrate [--db PATH]
+    python -m wine_catalogue price -o priced_catalogue.csv [--db PATH]
+    python -m wine_catalogue import LIST.xlsx --supplier NAME [--dry-run]
+    python -m wine_catalogue dedupe -o proposals.csv | --apply proposals.csv
+    python -m wine_catalogue what-if --candidate VERSION [--base VERSION] [-o deltas.csv]
+    python -m wine_catalogue sync-sheet --credentials service_account.json [--dry-run]
+"""
+import argparse
+import sys
+
+from . import dedupe, importer, sheet_sync
+from .catalogue import load_catalogue
+from .config import DB_PATH
+from .db import migrate
+from .pricing import load_rule_sets, what_if
+
+WHAT_IF_COLUMNS = ["wine_id", "price_id", "producer", "wine_name", "vintage", "supplier"]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["import"]:
+        return importer.main(argv[1:])
+    if argv[:1] == ["dedupe"]:
+        return dedupe.main(argv[1:])
+    if argv[:1] == ["sync-sheet"]:
+        return sheet_sync.main(argv[1:])
+
+    parser = argparse.ArgumentParser(prog="python -m wine_catalogue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_cmd = commands.add_parser("migrate", help="apply pending schema migrations")
+    migrate_cmd.add_argument("--db", default=DB_PATH)
+    price_cmd = commands.add_parser("price", help="write the fully priced catalogue to CSV")
+    price_cmd.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    price_cmd.add_argument("--db", default=DB_PATH)
+    what_if_cmd = commands.add_parser("what-if", help="reprice the catalogue under two pricing rule sets")
+    what_if_cmd.add_argument("--base", help="rule set version to compare against (default: the active one)")
+    what_if_cmd.add_argument("--candidate", required=True, help="rule set version to model")
+    what_if_cmd.add_argument("-o", "--output", help="also write every row's prices and deltas to this CSV")
+    what_if_cmd.add_argument("--db", default=DB_PATH)
+    commands.add_parser("import", help="import a supplier price list (see importer --help)")
+    commands.add_parser("sync-sheet", help="sync the Google Sheet into the database (see sheet_sync --help)")
+    commands.add_parser("dedupe", help="propose or apply merges of near-duplicate wines (see dedupe --help)")
+    args = parser.parse_args(argv)
+
+    if args.command == "migrate":
+        print(f"{args.db}: schema version {migrate(args.db)}")
+    elif args.command == "price":
+        migrate(args.db)
+        df = load_catalogue(args.db)
+        df.to_csv(sys.stdout if args.output == "-" else args.output, index=False)
+    elif args.command == "what-if":
+        rule_sets, active = load_rule_sets()
+        unknown = [v for v in (args.base, args.candidate) if v is not None and v not in rule_sets]
+        if unknown:
+            parser.error(f"unknown rule set(s) {', '.join(unknown)}; defined: {', '.join(rule_sets)}")
+        migrate(args.db)
+        base = rule_sets[args.base or active]
+        rows, summary = what_if(load_catalogue(args.db, pricing_rules=base), base, rule_sets[args.candidate],
+                                keep_columns=WHAT_IF_COLUMNS)
+        print(summary.to_string(index=False))
+        if args.output:
+            rows.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Read-only JSON API over the in-memory catalogue, for the POS and the website.
+
+    python -m wine_catalogue.api [--db PATH] [--host 127.0.0.1] [--port 8000]
+
+A plain ASGI application (serve it with any ASGI server; the command above
+uses uvicorn), so it needs no web framework. Every request is answered from
+the same Catalogue snapshot the Streamlit app uses: search, facet and price
+filters, supplier grouping, sorting and the calculated prices are exactly
+the browser's.
+
+Endpoints (GET only):
+
+    /health                     catalogue version and size
+    /wines                      priced list: q, varietal, producer, supplier,
+                                wine_type (repeatable), price_min, price_max,
+                                under_50, over_500, group_suppliers, sort,
+                                limit, offset, facets
+    /wines/<wine_id>            every supplier price of one wine
+    /search?q=...&limit=...     ranked search results
+
+Responses carry an ETag made of the catalogue version, so clients can
+revalidate with If-None-Match and get a bodiless 304 until the data
+changes. The catalogue follows the DB through its change log over one
+long-lived read-only connection, checked at most every refresh_interval
+seconds on a worker thread while requests keep being served from the
+current snapshot.
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import parse_qs
+
+from .catalogue import Catalogue
+from .config import DB_PATH
+from .db import connect_readonly, migrate
+from .query import SORT_OPTIONS, browse
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+REFRESH_INTERVAL_SECONDS = 1.0
+RESPONSE_CACHE_SIZE = 1024
+
+# API sort keys -> browser sort options
+SORTS = {
+    "producer": "Producer A-Z",
+    "-producer": "Producer Z-A",
+    "price": "Price Low-High",
+    "-price": "Price High-Low",
+}
+# Catalogue column -> JSON field for each priced row
+ITEM_FIELDS = {
+    "wine_id": "wine_id",
+    "price_id": "price_id",
+    "wine_name": "wine_name",
+    "vintage": "vintage",
+    "clean_varietal": "varietal",
+    "region": "region",
+    "producer": "producer",
+    "supplier": "supplier",
+    "wine_type": "wine_type",
+    "bottle_price": "luc",
+    "calculated_bottle_price": "bottle_price",
+    "calculated_glass_price": "glass_price",
+    "calculated_takeaway_price": "takeaway_price",
+    "supplier_count": "supplier_count",
+    "min_price": "min_luc",
+}
+FACET_PARAMS = {"varietal": "clean_varietal", "producer": "producer", "supplier": "supplier",
+                "wine_type": "wine_type"}
+TRUE_VALUES = {"1", "true", "yes", "on"}
+FALSE_VALUES = {"0", "false", "no", "off", ""}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class NotFound(LookupError):
+    pass
+
+
+def item_columns(df):
+    """JSON field -> numpy column, taken once per snapshot so a page is a few gathers."""
+    return {field: df[column].to_numpy() for column, field in ITEM_FIELDS.items()}
+
+
+def _json_values(values):
+    values = values.tolist()
+    if values and isinstance(values[0], float):
+        return [None if v != v else v for v in values]  # NaN -> null
+    return values
+
+
+def items(columns, rows):
+    """JSON-ready dicts for the given row positions."""
+    page = {field: _json_values(values[rows]) for field, values in columns.items()}
+    return [dict(zip(page, row)) for row in zip(*page.values())]
+
+
+def _one(params, name, default=None):
+    values = params.get(name)
+    return values[-1] if values else default
+
+
+def _int(params, name, default, minimum=0, maximum=None):
+    raw = _one(params, name)
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer") from None
+    if value < minimum or (maximum is not None and value > maximum):
+        raise BadRequest(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+
+def _float(params, name):
+    raw = _one(params, name)
+    if raw is None or raw == "":
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        raise BadRequest(f"{name} must be a number") from None
+    if math.isnan(value):
+        raise BadRequest(f"{name} must be a number")
+    return value
+
+
+def _bool(params, name, default=False):
+    raw = _one(params, name)
+    if raw is None:
+        return default
+    if raw.lower() in TRUE_VALUES:
+        return True
+    if raw.lower() in FALSE_VALUES:
+        return False
+    raise BadRequest(f"{name} must be true or false")
+
+
+def _sort(params):
+    raw = _one(params, "sort", "producer")
+    if raw in SORTS:
+        return SORTS[raw]
+    if raw in SORT_OPTIONS:
+        return raw
+    raise BadRequest(f"sort must be one of {', '.join(SORTS)}")
+
+
+def list_wines(snapshot, columns, params):
+    limit = _int(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+    offset = _int(params, "offset", 0)
+    with_facets = _bool(params, "facets")
+    result = browse(
+        snapshot,
+        search=_one(params, "q", "").strip(),
+        varietals=params.get("varietal", ()),
+        producers=params.get("producer", ()),
+        suppliers=params.get("supplier", ()),
+        wine_types=params.get("wine_type", ()),
+        price_min=_float(params, "price_min"),
+        price_max=_float(params, "price_max"),
+        under_50=_bool(params, "under_50"),
+        over_500=_bool(params, "over_500"),
+        group_suppliers=_bool(params, "group_suppliers", True),
+        sort=_sort(params),
+        with_counts=with_facets,
+    )
+    rows, facet_counts = result if with_facets else (result, None)
+    body = {"total": len(rows), "offset": offset, "limit": limit,
+            "items": items(columns, rows[offset:offset + limit])}
+    if with_facets:
+        body["facets"] = {param: {str(value): count for value, count in facet_counts[column].items() if count}
+                          for param, column in FACET_PARAMS.items()}
+    return body
+
+
+def get_wine(snapshot, columns, wine_id):
+    try:
+        rows = snapshot.wine_rows[int(wine_id)]
+    except (KeyError, ValueError):
+        raise NotFound(f"wine {wine_id} not found") from None
+    return {"wine_id": int(wine_id), "prices": items(columns, rows)}
+
+
+def search_wines(snapshot, columns, params):
+    query = _one(params, "q", "").strip()
+    if not query:
+        raise BadRequest("q is required")
+    limit = _int(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+    return {"q": query, "items": items(columns, snapshot.search_index.search(query, limit=limit))}
+
+
+def route(snapshot, columns, path, params):
+    """JSON body for a GET of path (params as from parse_qs; columns from item_columns)."""
+    if path == "/health":
+        return {"status": "ok", "change_id": snapshot.change_id, "rows": len(snapshot.df),
+                "wines": len(snapshot.wine_rows)}
+    if path == "/wines":
+        return list_wines(snapshot, columns, params)
+    if path.startswith("/wines/"):
+        return get_wine(snapshot, columns, path[len("/wines/"):])
+    if path == "/search":
+        return search_wines(snapshot, columns, params)
+    raise NotFound(f"no such endpoint: {path}")
+
+
+class CatalogueAPI:
+    """The ASGI application.
+
+    Encoded responses are kept in a small LRU keyed by (catalogue version,
+    path, query string), which is emptied whenever the version changes,
+    together with the snapshot's item columns.
+    """
+
+    def __init__(self, catalogue, refresh_interval=REFRESH_INTERVAL_SECONDS, cache_size=RESPONSE_CACHE_SIZE):
+        self.catalogue = catalogue
+        self.refresh_interval = refresh_interval
+        self.cache_size = cache_size
+        self._conn = connect_readonly(catalogue.path)
+        self._refreshing = None
+        self._last_refresh = time.monotonic()
+        self._cache = OrderedDict()
+        self._cache_version = None
+        self._columns = None
+
+    @classmethod
+    def from_path(cls, path=DB_PATH, **kwargs):
+        return cls(Catalogue(path), **kwargs)
+
+    def etag(self, snapshot):
+        return f'"{self.catalogue.enrichment[:12]}-{snapshot.change_id}"'
+
+    def _maybe_refresh(self):
+        """Start a background refresh if one is due; never waits for it."""
+        if self._refreshing is not None or time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = time.monotonic()
+        self._refreshing = asyncio.get_running_loop().run_in_executor(None, self.catalogue.refresh, self._conn)
+        self._refreshing.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, future):
+        self._refreshing = None
+        if not future.cancelled():
+            future.exception()  # a failed refresh keeps the previous snapshot; the next one retries
+
+    def respond(self, method, path, query_string, headers):
+        """(status, headers, body) for one request; synchronous and does no I/O."""
+        if method not in ("GET", "HEAD"):
+            return 405, [(b"allow", b"GET, HEAD")], _encode({"error": "method not allowed"})
+        snapshot = self.catalogue.snapshot
+        etag = self.etag(snapshot)
+        response_headers = [(b"etag", etag.encode()), (b"cache-control", b"no-cache")]
+        if_none_match = headers.get(b"if-none-match")
+        if if_none_match and etag.encode() in [tag.strip() for tag in if_none_match.split(b",")]:
+            return 304, response_headers, b""
+
+        if self._cache_version != etag:
+            self._cache.clear()
+            self._columns = item_columns(snapshot.df)
+            self._cache_version = etag
+        key = (path, query_string)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached[0], response_headers, cached[1]
+
+        try:
+            status, body = 200, _encode(route(snapshot, self._columns, path, parse_qs(query_string.decode("latin-1"))))
+        except BadRequest as e:
+            status, body = 400, _encode({"error": str(e)})
+        except NotFound as e:
+            status, body = 404, _encode({"error": str(e)})
+        if status != 400:
+            self._cache[key] = (status, body)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return status, response_headers, body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        self._maybe_refresh()
+        status, headers, body = self.respond(scope["method"], scope["path"], scope.get("query_string", b""),
+                                             dict(scope.get("headers", [])))
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                   *headers]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._refreshing is not None:
+                    await asyncio.wait([self._refreshing])
+                self._conn.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _encode(body):
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class Response(namedtuple("Response", ["status", "headers", "body"])):
+    def json(self):
+        return json.loads(self.body)
+
+
+class TestClient:
+    """Calls the ASGI app in-process, for scripts and tests; no server or network needed.
+
+        client = TestClient(CatalogueAPI.from_path("synthetic.db"))
+        r = client.get("/wines?q=pinot&sort=-price")
+        r.status, r.json()["total"], r.headers["etag"]
+    """
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+
+    def get(self, url, headers=None, method="GET"):
+        path, _, query = url.partition("?")
+        return self.loop.run_until_complete(self._request(method, path, query, headers or {}))
+
+    async def _request(self, method, path, query, headers):
+        scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(),
+                 "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await self.app(scope, receive, send)
+        start = messages[0]
+        return Response(start["status"], {k.decode(): v.decode() for k, v in start["headers"]},
+                        b"".join(m.get("body", b"") for m in messages[1:]))
+
+    def close(self):
+        self.loop.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the catalogue as a read-only JSON API.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("Serving the API needs an ASGI server: pip install uvicorn") from None
+    migrate(args.db)
+    uvicorn.run(CatalogueAPI.from_path(args.db), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+import bisect
+import hashlib
+import json
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from . import instrumentation
+from .classifier import WineTypeClassifier, clean_varietals
+from .config import DB_PATH, VARIETAL_MAP_PATH
+from .db import connect
+from .filters import FACET_COLUMNS, FilterEngine
+from .pricing import active_rules, add_price_columns
+from .search_index import BIGRAM, FIELD_SEP, TRIGRAM, SearchIndex
+from .shortlist import WineRows, index_wine_rows
+from .sort_index import SORT_KEYS, TIE_BREAK_COLUMN, SortIndex
+from .snapshot import read_snapshot, read_snapshot_meta, snapshot_path, write_snapshot
+from .text import fold_columns
+
+# Rewrite the on-disk snapshot once this many changes have been applied on top of it
+SNAPSHOT_REWRITE_CHANGES = 500
+# A refresh concatenates at most this many slices of the old frame; larger ones gather every row
+SPLICE_MAX_PIECES = 64
+# Slices pile up as chunks in the string columns; past this many in total the next splice gathers
+SPLICE_COMPACT_PIECES = 2048
+# Up to this many removed + re-read rows the indexes are updated in place of a rebuild; each row
+# costs a few binary searches in Python, so a large import is cheaper to re-sort in numpy
+SPLICE_INDEX_ROWS = 256
+
+CATALOGUE_QUERY = '''
+    SELECT w.wine_id, w.wine_name, w.vintage, w.varietal, w.region, w.producer,
+           s.name AS supplier, p.bottle_price, p.price_id
+    FROM wines w
+    JOIN wine_prices p ON w.wine_id = p.wine_id
+    JOIN suppliers s ON p.supplier_id = s.supplier_id
+'''
+
+DEFAULTS = {
+    "wine_name": "",
+    "vintage": "NV",
+    "varietal": "Unknown",
+    "region": "Unknown",
+    "producer": "Unknown",
+    "supplier": "Unknown",
+    "bottle_price": 0.0
+}
+
+# The enriched catalogue plus the indexes built over it. A snapshot is never
+# mutated, so sessions can keep using one while a refresh builds the next.
+CatalogueSnapshot = namedtuple("CatalogueSnapshot",
+                               ["df", "search_index", "filter_engine", "sort_index", "wine_rows", "change_id"])
+
+
+class Splice(namedtuple("Splice", ["df", "old_to_new", "removed", "added", "new_rows", "pieces"])):
+    """A refreshed frame plus where its rows came from.
+
+    old_to_new maps each old row position to its new one (-1 if removed),
+    removed lists the removed old positions, added the new positions of the
+    re-read rows (both ascending) and new_rows those rows in the same order,
+    so their values are read without indexing into df. pieces counts the
+    slices concatenated into df (0 when every row was gathered afresh).
+    """
+
+    def move(self, values, new_values):
+        """A per-row array of the old frame carried over to the new one, with new_values at `added`."""
+        kept = np.delete(values, self.removed)
+        return np.insert(kept, self.added - np.arange(len(self.added)), new_values)
+
+
+def load_varietal_map(path=VARIETAL_MAP_PATH):
+    """Load cleaned varietal mapping from CSV"""
+    varietal_map_df = pd.read_csv(path).dropna(subset=["varietal", "Clean Varietal"])
+    return dict(zip(varietal_map_df["varietal"].str.strip(), varietal_map_df["Clean Varietal"].str.strip()))
+
+
+def read_rows(conn, wine_ids=None):
+    """Run the catalogue JOIN, optionally only for the given wine_ids."""
+    with instrumentation.span("sql.read_rows", wines="all" if wine_ids is None else len(wine_ids)) as span:
+        if wine_ids is None:
+            df = pd.read_sql_query(CATALOGUE_QUERY, conn)
+        else:
+            query = CATALOGUE_QUERY + " WHERE w.wine_id IN (SELECT value FROM json_each(?))"
+            df = pd.read_sql_query(query, conn, params=(json.dumps([int(i) for i in wine_ids]),))
+        span.set(rows=len(df))
+    return df
+
+
+def enrich(df, varietal_map, classifier, pricing_rules):
+    """Derive the sort, clean_*, wine_type and calculated price columns (unsorted)."""
+    span = instrumentation.span
+    with span("enrich", rows=len(df)):
+        df.fillna(DEFAULTS, inplace=True)
+
+        # Producers and names are transliterated once per distinct string, then reused for sorting
+        with span("enrich.normalize_text"):
+            df["clean_producer"], df["clean_wine_name"] = fold_columns(df["producer"], df["wine_name"])
+            df["sort_name"] = df["clean_producer"] + " " + df["clean_wine_name"]
+        with span("enrich.clean_varietals"):
+            df["clean_varietal"] = clean_varietals(df["varietal"], varietal_map)
+        with span("enrich.classify"):
+            df["wine_type"] = classifier.classify_column(df["clean_varietal"])
+        with span("enrich.prices"):
+            add_price_columns(df, rules=pricing_rules)
+        with span("enrich.supplier_stats"):
+            add_supplier_stats(df)
+    return df
+
+
+def add_supplier_stats(df):
+    """Per-wine supplier count and cheapest/dearest LUC, repeated on each of the wine's rows.
+
+    Every row of a wine is always loaded together (refresh re-reads whole
+    wines), so these stay correct when computed over a partial frame.
+    """
+    by_wine = df.groupby("wine_id")
+    priced = df["bottle_price"].where(df["bottle_price"] > 0)
+    df["supplier_count"] = by_wine["wine_id"].transform("size")
+    df["min_price"] = priced.groupby(df["wine_id"]).transform("min")
+    df["max_price"] = priced.groupby(df["wine_id"]).transform("max")
+    df["price_spread"] = df["max_price"] - df["min_price"]
+    return df
+
+
+def read_catalogue(conn, varietal_map, classifier, pricing_rules):
+    df = enrich(read_rows(conn), varietal_map, classifier, pricing_rules)
+    with instrumentation.span("sort_catalogue"):
+        df = df.sort_values("sort_name", kind="stable")
+        return df.reset_index(drop=True)
+
+
+def load_catalogue(path=DB_PATH, varietal_map=None, classifier=None, pricing_rules=None):
+    """Load and enrich the whole priced catalogue, one row per (wine, supplier) price.
+
+    Prices use the active rule set of pricing_rules.json unless pricing_rules is given.
+    """
+    conn = connect(path)
+    try:
+        return read_catalogue(conn, load_varietal_map() if varietal_map is None else varietal_map,
+                              WineTypeClassifier.from_file() if classifier is None else classifier,
+                              active_rules() if pricing_rules is None else pricing_rules)
+    finally:
+        conn.close()
+
+
+def last_change_id(conn):
+    return conn.execute("SELECT COALESCE(MAX(change_id), 0) FROM catalogue_changes").fetchone()[0]
+
+
+def changed_wine_ids(conn, since):
+    """Wine ids touched after change `since`, and the newest change id seen."""
+    rows = conn.execute(
+        "SELECT change_id, wine_id FROM catalogue_changes WHERE change_id > ? ORDER BY change_id", (since,)
+    ).fetchall()
+    if not rows:
+        return [], since
+    return sorted({wine_id for _, wine_id in rows}), rows[-1][0]
+
+
+def change_fingerprint(conn, change_id):
+    """Identifies the DB state at `change_id`, so a snapshot is never applied to a different database."""
+    if change_id == 0:
+        return [0, *conn.execute(
+            "SELECT (SELECT COUNT(*) FROM wines), (SELECT COUNT(*) FROM wine_prices), (SELECT MAX(price_id) FROM wine_prices)"
+        ).fetchone()]
+    row = conn.execute("SELECT changed_at FROM catalogue_changes WHERE change_id = ?", (change_id,)).fetchone()
+    return [change_id, row[0] if row else None]
+
+
+def enrichment_key(varietal_map, classifier, pricing_rules):
+    """Hash of every input besides the DB that shapes the enriched columns."""
+    inputs = [CATALOGUE_QUERY, sorted(varietal_map.items()), classifier.wine_types, sorted(classifier.keyword_priority.items()),
+              classifier.default, pricing_rules.as_dict()]
+    return hashlib.sha1(json.dumps(inputs, ensure_ascii=False).encode()).hexdigest()
+
+
+def index_key():
+    """Hash of the settings that shape the indexes, so a snapshot's saved indexes are only reused as-is."""
+    inputs = [FIELD_SEP, BIGRAM, TRIGRAM, FACET_COLUMNS, SORT_KEYS, TIE_BREAK_COLUMN]
+    return hashlib.sha1(json.dumps(inputs).encode()).hexdigest()
+
+
+def build_indexes(df, change_id):
+    """A CatalogueSnapshot of df with every index built from its columns."""
+    return CatalogueSnapshot(df, SearchIndex.from_frame(df), FilterEngine(df), SortIndex(df),
+                             index_wine_rows(df["wine_id"]), change_id)
+
+
+SNAPSHOT_INDEXES = ["search_index", "filter_engine", "sort_index", "wine_rows"]
+
+
+def snapshot_arrays(snapshot):
+    """Every index of a CatalogueSnapshot as named arrays, prefixed by the index's field name."""
+    return {f"{field}/{name}": values for field in SNAPSHOT_INDEXES
+            for name, values in getattr(snapshot, field).arrays().items()}
+
+
+def snapshot_from_arrays(df, arrays, change_id):
+    """The CatalogueSnapshot saved by snapshot_arrays() for df, without building any index."""
+    parts = {field: {name[len(field) + 1:]: values for name, values in arrays.items() if name.startswith(f"{field}/")}
+             for field in SNAPSHOT_INDEXES}
+    return CatalogueSnapshot(df, SearchIndex.from_arrays(parts["search_index"]),
+                             FilterEngine.from_arrays(df, parts["filter_engine"]),
+                             SortIndex.from_arrays(parts["sort_index"]),
+                             WineRows.from_arrays(parts["wine_rows"]), change_id)
+
+
+def splice(df, wine_rows, wine_ids, new_rows, max_pieces=SPLICE_MAX_PIECES):
+    """Replace every row of `wine_ids` in the sort_name-ordered df with new_rows.
+
+    Surviving rows keep their relative order and the new rows are merged in
+    by binary search, so there is no string sort. A small change is a
+    concatenation of untouched slices of df around the new rows; past
+    `max_pieces` slices every row is gathered into fresh columns instead.
+    Returns a Splice whose old_to_new/added positions let the indexes
+    follow the rows without being rebuilt.
+    """
+    removed = np.sort(np.concatenate([wine_rows[wine_id] for wine_id in wine_ids if wine_id in wine_rows]
+                                     + [np.empty(0, dtype=np.int64)]))
+    new_rows = new_rows.sort_values("sort_name", kind="stable")[df.columns].reset_index(drop=True)
+    new_names = new_rows["sort_name"].tolist()
+    if len(new_names) <= max_pieces:
+        names = df["sort_name"].array
+        insert_at = np.array([bisect.bisect_right(names, name) for name in new_names], dtype=np.int64)
+    else:
+        insert_at = np.searchsorted(df["sort_name"].to_numpy(dtype=object), np.asarray(new_names, dtype=object),
+                                    side="right")
+
+    # A new row inserted before old row p lands after the kept rows before p and the new rows before it
+    old_to_new = np.arange(len(df)) - np.searchsorted(removed, np.arange(len(df)))
+    old_to_new += np.searchsorted(insert_at, np.arange(len(df)), side="right")
+    old_to_new[removed] = -1
+    added = insert_at - np.searchsorted(removed, insert_at) + np.arange(len(insert_at))
+
+    cuts = np.union1d(removed, insert_at)
+    if len(cuts) < max_pieces:
+        pieces, start = [], 0
+        for position in cuts.tolist():
+            first, last = np.searchsorted(insert_at, position), np.searchsorted(insert_at, position, side="right")
+            pieces += [df.iloc[start:position], new_rows.iloc[first:last]]
+            start = position + 1 if position in removed else position
+        pieces = [piece for piece in pieces + [df.iloc[start:]] if len(piece)]
+        spliced = pd.concat(pieces, ignore_index=True) if pieces else df.iloc[:0]
+    else:
+        source = np.empty(len(df) - len(removed) + len(new_rows), dtype=np.int64)
+        kept = old_to_new >= 0
+        source[old_to_new[kept]] = np.flatnonzero(kept)
+        source[added] = len(df) + np.arange(len(new_rows))
+        # An empty new_rows (only deletions) has object columns and would upcast df's
+        rows = pd.concat([df, new_rows], ignore_index=True) if len(new_rows) else df
+        spliced = rows.iloc[source].reset_index(drop=True)
+        pieces = []
+    return Splice(spliced, old_to_new, removed, added, new_rows, len(pieces))
+
+
+class Catalogue:
+    """Process-wide catalogue that follows the DB through its change log.
+
+    The first load memory-maps the columnar snapshot written by an earlier
+    process when it is still valid for this DB, frame and indexes
+    together, and otherwise runs the full ETL and writes one. Afterwards `refresh()` reads only the
+    catalogue_changes rows it has not seen, re-enriches just those wines,
+    splices them into the frame and updates the search and filter indexes.
+    """
+
+    def __init__(self, path=DB_PATH, varietal_map=None, classifier=None, pricing_rules=None, use_snapshot=True):
+        self.path = path
+        self.varietal_map = load_varietal_map() if varietal_map is None else varietal_map
+        self.classifier = WineTypeClassifier.from_file() if classifier is None else classifier
+        self.pricing_rules = active_rules() if pricing_rules is None else pricing_rules
+        self.snapshot_path = snapshot_path(path) if use_snapshot else None
+        self.enrichment = enrichment_key(self.varietal_map, self.classifier, self.pricing_rules)
+        self._lock = threading.Lock()
+        self.frame_pieces = 0
+        span = instrumentation.span
+        conn = connect(path)
+        try:
+            with span("catalogue.read_snapshot") as read_span:
+                self.snapshot = self._read_snapshot(conn)
+                read_span.set(hit=self.snapshot is not None)
+            instrumentation.count("snapshot.hit" if self.snapshot is not None else "snapshot.miss")
+            if self.snapshot is None:
+                # Read the change id first: anything logged during the load is simply re-applied
+                change_id = last_change_id(conn)
+                df = read_catalogue(conn, self.varietal_map, self.classifier, self.pricing_rules)
+                with span("catalogue.build_indexes", rows=len(df)):
+                    self.snapshot = build_indexes(df, change_id)
+                with span("catalogue.write_snapshot"):
+                    self._write_snapshot(conn, self.snapshot)
+        finally:
+            conn.close()
+        self.refresh()
+
+    def _read_snapshot(self, conn):
+        """The CatalogueSnapshot saved on disk, or None if it is missing or stale.
+
+        Its indexes are rebuilt from the frame only if they were saved with
+        different index settings.
+        """
+        meta = read_snapshot_meta(self.snapshot_path) if self.snapshot_path else None
+        if (meta is None or meta.get("enrichment") != self.enrichment
+                or meta.get("fingerprint") != change_fingerprint(conn, meta.get("change_id", 0))):
+            return None
+        self.snapshot_change_id = change_id = meta["change_id"]
+        # Changes logged after the snapshot was written are applied by refresh()
+        df, arrays = read_snapshot(self.snapshot_path)
+        if meta.get("indexes") != index_key():
+            with instrumentation.span("catalogue.build_indexes", rows=len(df)):
+                return build_indexes(df, change_id)
+        return snapshot_from_arrays(df, arrays, change_id)
+
+    def _write_snapshot(self, conn, snapshot):
+        self.snapshot_change_id = snapshot.change_id
+        if self.snapshot_path:
+            meta = {"change_id": snapshot.change_id, "fingerprint": change_fingerprint(conn, snapshot.change_id),
+                    "enrichment": self.enrichment, "indexes": index_key()}
+            write_snapshot(snapshot.df, self.snapshot_path, meta, snapshot_arrays(snapshot))
+
+    def refresh(self, conn=None):
+        """Apply any logged changes and return the current snapshot.
+
+        Uses `conn` if given (e.g. a long-lived read-only connection; it is
+        only used under this catalogue's lock), otherwise a fresh connection.
+        """
+        with self._lock, instrumentation.span("catalogue.refresh") as span:
+            own_conn = conn is None
+            if own_conn:
+                conn = connect(self.path)
+            try:
+                return self._apply_changes(conn, span)
+            finally:
+                if own_conn:
+                    conn.close()
+
+    def _apply_changes(self, conn, span):
+        snapshot = self.snapshot
+        wine_ids, change_id = changed_wine_ids(conn, snapshot.change_id)
+        span.set(changed_wines=len(wine_ids))
+        if not wine_ids:
+            instrumentation.count("catalogue.refresh.noop")
+            return snapshot
+        instrumentation.count("catalogue.refresh.applied")
+        new_rows = enrich(read_rows(conn, wine_ids), self.varietal_map, self.classifier, self.pricing_rules)
+        with instrumentation.span("catalogue.splice"):
+            compact = self.frame_pieces >= SPLICE_COMPACT_PIECES
+            spliced = splice(snapshot.df, snapshot.wine_rows, wine_ids, new_rows,
+                             max_pieces=0 if compact else SPLICE_MAX_PIECES)
+            self.frame_pieces = self.frame_pieces + spliced.pieces if spliced.pieces else 0
+        df = spliced.df
+        changed_rows = len(spliced.added) + int((spliced.old_to_new < 0).sum())
+        with instrumentation.span("catalogue.update_indexes", rows=len(df), changed_rows=changed_rows):
+            if changed_rows <= SPLICE_INDEX_ROWS:
+                self.snapshot = CatalogueSnapshot(
+                    df,
+                    snapshot.search_index.spliced(df, spliced),
+                    snapshot.filter_engine.spliced(df, spliced),
+                    snapshot.sort_index.spliced(df, spliced),
+                    snapshot.wine_rows.spliced(spliced, wine_ids),
+                    change_id,
+                )
+            else:
+                self.snapshot = CatalogueSnapshot(
+                    df,
+                    snapshot.search_index.with_rows(df["clean_producer"].tolist(), df["clean_wine_name"].tolist()),
+                    FilterEngine(df),
+                    SortIndex(df),
+                    index_wine_rows(df["wine_id"]),
+                    change_id,
+                )
+        if change_id - self.snapshot_change_id >= SNAPSHOT_REWRITE_CHANGES:
+            with instrumentation.span("catalogue.write_snapshot"):
+                self._write_snapshot(conn, self.snapshot)
+        return self.snapshot
@@ -0,0 +1,59 @@
+import csv
+import re
+
+import numpy as np
+import pandas as pd
+
+from .config import WINE_TYPE_RULES_PATH
+from .text import fold_values
+
+DEFAULT_WINE_TYPE = "Other"
+
+
+def load_type_rules(path=WINE_TYPE_RULES_PATH):
+    """(wine_type, keyword) pairs in priority order: earlier types win."""
+    with open(path, newline="", encoding="utf-8") as f:
+        return [(row["wine_type"].strip(), row["keyword"].strip().lower())
+                for row in csv.DictReader(f) if row["keyword"].strip()]
+
+
+class WineTypeClassifier:
+    """Keyword rules compiled into one regex.
+
+    A varietal gets the highest-priority type with any keyword inside it,
+    the same result as testing each type's keywords in turn. The alternation
+    sits in a lookahead so matches may overlap and every keyword occurrence
+    is seen in a single scan.
+    """
+
+    def __init__(self, rules, default=DEFAULT_WINE_TYPE):
+        self.wine_types = list(dict.fromkeys(wine_type for wine_type, _ in rules))
+        self.default = default
+        priority = {wine_type: rank for rank, wine_type in enumerate(self.wine_types)}
+        # Longest keywords first so a keyword is never hidden by a prefix of it at the same position
+        ordered = sorted(rules, key=lambda rule: (priority[rule[0]], -len(rule[1])))
+        self.keyword_priority = {}
+        for wine_type, keyword in ordered:
+            self.keyword_priority.setdefault(keyword, priority[wine_type])
+        self.pattern = re.compile("(?=(" + "|".join(re.escape(k) for _, k in ordered) + "))")
+
+    @classmethod
+    def from_file(cls, path=WINE_TYPE_RULES_PATH):
+        return cls(load_type_rules(path))
+
+    def classify(self, varietal):
+        matches = [self.keyword_priority[m.group(1)] for m in self.pattern.finditer(varietal.lower())]
+        return self.wine_types[min(matches)] if matches else self.default
+
+    def classify_column(self, varietals):
+        """Classify each distinct value once and broadcast back via category codes."""
+        codes, uniques = pd.factorize(varietals)
+        types = np.array([self.classify(v) for v in uniques], dtype=object)
+        return pd.Series(types[codes], index=varietals.index)
+
+
+def clean_varietals(varietals, varietal_map):
+    """Map raw varietals through the cleaning table and unidecode/lower them, once per distinct value."""
+    codes, uniques = pd.factorize(varietals)
+    cleaned = np.array(fold_values([str(varietal_map.get(v, v)) for v in uniques]), dtype=object)
+    return pd.Series(cleaned[codes], index=varietals.index)
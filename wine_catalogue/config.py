@@ -0,0 +1,10 @@
+"""File locations, resolved from the repository root so the library works from any cwd."""
+import os
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+DB_PATH = os.environ.get("WINE_DB_PATH", str(PROJECT_DIR / "wine_supplier_with_producer.db"))
+VARIETAL_MAP_PATH = str(PROJECT_DIR / "raw_varietals_for_cleaning.csv")
+WINE_TYPE_RULES_PATH = str(PROJECT_DIR / "wine_type_rules.csv")
+PRICING_RULES_PATH = os.environ.get("WINE_PRICING_RULES_PATH", str(PROJECT_DIR / "pricing_rules.json"))
@@ -0,0 +1,287 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from .config import DB_PATH
+
+# Applied to every connection. WAL lets readers keep browsing while a staff
+# member saves an edit; synchronous=NORMAL is durable enough under WAL.
+CONNECTION_PRAGMAS = [
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",      # 64 MB page cache
+    "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+]
+
+# A writer that still finds the DB locked after busy_timeout retries BEGIN
+# this many more times, backing off exponentially from WRITE_RETRY_DELAY.
+WRITE_RETRIES = 4
+WRITE_RETRY_DELAY = 0.1
+
+# (version, description, statements). Append new migrations; never edit old ones.
+# The applied version is stored in PRAGMA user_version.
+MIGRATIONS = [
+    (1, "index the catalogue join and edit lookups", [
+        "CREATE INDEX IF NOT EXISTS idx_wine_prices_wine_id ON wine_prices(wine_id)",
+        "CREATE INDEX IF NOT EXISTS idx_wine_prices_supplier_id ON wine_prices(supplier_id)",
+        "CREATE INDEX IF NOT EXISTS idx_wines_producer ON wines(producer)",
+        "CREATE INDEX IF NOT EXISTS idx_wines_varietal ON wines(varietal)",
+    ]),
+    (2, "log which wines change so the app can refresh incrementally", [
+        """CREATE TABLE IF NOT EXISTS catalogue_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            wine_id INTEGER NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS trg_wines_insert AFTER INSERT ON wines BEGIN
+            INSERT INTO catalogue_changes (wine_id) VALUES (NEW.wine_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_wines_update AFTER UPDATE ON wines BEGIN
+            INSERT INTO catalogue_changes (wine_id) VALUES (NEW.wine_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_wines_delete AFTER DELETE ON wines BEGIN
+            INSERT INTO catalogue_changes (wine_id) VALUES (OLD.wine_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_wine_prices_insert AFTER INSERT ON wine_prices BEGIN
+            INSERT INTO catalogue_changes (wine_id) VALUES (NEW.wine_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_wine_prices_update AFTER UPDATE ON wine_prices BEGIN
+            INSERT INTO catalogue_changes (wine_id) VALUES (NEW.wine_id);
+            INSERT INTO catalogue_changes (wine_id) SELECT OLD.wine_id WHERE OLD.wine_id IS NOT NEW.wine_id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_wine_prices_delete AFTER DELETE ON wine_prices BEGIN
+            INSERT INTO catalogue_changes (wine_id) VALUES (OLD.wine_id);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_suppliers_update AFTER UPDATE OF name ON suppliers BEGIN
+            INSERT INTO catalogue_changes (wine_id)
+            SELECT DISTINCT wine_id FROM wine_prices WHERE supplier_id = NEW.supplier_id;
+        END""",
+    ]),
+    (3, "composite index for per-supplier price upserts", [
+        "CREATE INDEX IF NOT EXISTS idx_wine_prices_wine_supplier ON wine_prices(wine_id, supplier_id)",
+        "DROP INDEX IF EXISTS idx_wine_prices_wine_id",
+    ]),
+    (4, "append-only price history, filled by triggers on wine_prices", [
+        # Clustered on (wine, supplier, date): "latest price as of D" is a single index seek
+        """CREATE TABLE IF NOT EXISTS price_history (
+            wine_id INTEGER NOT NULL,
+            supplier_id INTEGER NOT NULL,
+            effective_date TEXT NOT NULL,
+            bottle_price REAL NOT NULL,
+            recorded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (wine_id, supplier_id, effective_date)
+        ) WITHOUT ROWID""",
+        "CREATE INDEX IF NOT EXISTS idx_price_history_effective_date ON price_history(effective_date)",
+        """INSERT OR IGNORE INTO price_history (wine_id, supplier_id, effective_date, bottle_price)
+            SELECT wine_id, supplier_id, date('now'), bottle_price FROM wine_prices
+            WHERE bottle_price IS NOT NULL ORDER BY price_id""",
+        # Several changes on one day keep the day's last price
+        """CREATE TRIGGER IF NOT EXISTS trg_price_history_insert AFTER INSERT ON wine_prices
+            WHEN NEW.bottle_price IS NOT NULL BEGIN
+            INSERT OR REPLACE INTO price_history (wine_id, supplier_id, effective_date, bottle_price)
+            VALUES (NEW.wine_id, NEW.supplier_id, date('now'), NEW.bottle_price);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_price_history_update AFTER UPDATE OF bottle_price, wine_id, supplier_id ON wine_prices
+            WHEN NEW.bottle_price IS NOT NULL AND (NEW.bottle_price IS NOT OLD.bottle_price
+                OR NEW.wine_id IS NOT OLD.wine_id OR NEW.supplier_id IS NOT OLD.supplier_id) BEGIN
+            INSERT OR REPLACE INTO price_history (wine_id, supplier_id, effective_date, bottle_price)
+            VALUES (NEW.wine_id, NEW.supplier_id, date('now'), NEW.bottle_price);
+        END""",
+        # The latest recorded price of every (wine, supplier)
+        """CREATE VIEW IF NOT EXISTS current_prices AS
+            SELECT wine_id, supplier_id, MAX(effective_date) AS effective_date, bottle_price
+            FROM price_history GROUP BY wine_id, supplier_id""",
+    ]),
+    (5, "remember what the Google Sheet sync last wrote", [
+        """CREATE TABLE IF NOT EXISTS sheet_sync_state (
+            sheet_key TEXT PRIMARY KEY,
+            revision TEXT,
+            row_count INTEGER NOT NULL DEFAULT 0,
+            synced_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )""",
+        # One row per synced sheet row: its content hash and the wine/price it was written to
+        """CREATE TABLE IF NOT EXISTS sheet_sync_rows (
+            sheet_key TEXT NOT NULL,
+            row_key TEXT NOT NULL,
+            row_hash TEXT NOT NULL,
+            wine_id INTEGER NOT NULL,
+            price_id INTEGER NOT NULL,
+            PRIMARY KEY (sheet_key, row_key)
+        ) WITHOUT ROWID""",
+    ]),
+    (6, "key price history on price_id and record deleted prices", [
+        # Some wines have two price rows from one supplier, which (wine, supplier) keys merged
+        """CREATE TABLE IF NOT EXISTS price_history_by_price (
+            price_id INTEGER NOT NULL,
+            effective_date TEXT NOT NULL,
+            wine_id INTEGER,
+            supplier_id INTEGER,
+            bottle_price REAL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            recorded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (price_id, effective_date)
+        ) WITHOUT ROWID""",
+        # Old entries are only unambiguous where the (wine, supplier) has a single price row
+        """INSERT INTO price_history_by_price (price_id, effective_date, wine_id, supplier_id, bottle_price, recorded_at)
+            SELECT p.price_id, h.effective_date, h.wine_id, h.supplier_id, h.bottle_price, h.recorded_at
+            FROM price_history h JOIN wine_prices p ON p.wine_id = h.wine_id AND p.supplier_id = h.supplier_id
+            WHERE (SELECT COUNT(*) FROM wine_prices q
+                   WHERE q.wine_id = h.wine_id AND q.supplier_id = h.supplier_id) = 1""",
+        """INSERT INTO price_history_by_price (price_id, effective_date, wine_id, supplier_id, bottle_price)
+            SELECT price_id, date('now'), wine_id, supplier_id, bottle_price FROM wine_prices
+            WHERE price_id NOT IN (SELECT price_id FROM price_history_by_price)""",
+        "DROP TRIGGER IF EXISTS trg_price_history_insert",
+        "DROP TRIGGER IF EXISTS trg_price_history_update",
+        "DROP VIEW IF EXISTS current_prices",
+        "DROP TABLE IF EXISTS price_history",
+        "ALTER TABLE price_history_by_price RENAME TO price_history",
+        "CREATE INDEX IF NOT EXISTS idx_price_history_effective_date ON price_history(effective_date)",
+        "CREATE INDEX IF NOT EXISTS idx_price_history_wine_supplier ON price_history(wine_id, supplier_id)",
+        # Several changes on one day keep the day's last state
+        """CREATE TRIGGER IF NOT EXISTS trg_price_history_insert AFTER INSERT ON wine_prices BEGIN
+            INSERT OR REPLACE INTO price_history (price_id, effective_date, wine_id, supplier_id, bottle_price)
+            VALUES (NEW.price_id, date('now'), NEW.wine_id, NEW.supplier_id, NEW.bottle_price);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_price_history_update AFTER UPDATE OF bottle_price, wine_id, supplier_id ON wine_prices
+            WHEN NEW.bottle_price IS NOT OLD.bottle_price
+                OR NEW.wine_id IS NOT OLD.wine_id OR NEW.supplier_id IS NOT OLD.supplier_id BEGIN
+            INSERT OR REPLACE INTO price_history (price_id, effective_date, wine_id, supplier_id, bottle_price)
+            VALUES (NEW.price_id, date('now'), NEW.wine_id, NEW.supplier_id, NEW.bottle_price);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS trg_price_history_delete AFTER DELETE ON wine_prices BEGIN
+            INSERT OR REPLACE INTO price_history (price_id, effective_date, wine_id, supplier_id, bottle_price, deleted)
+            VALUES (OLD.price_id, date('now'), OLD.wine_id, OLD.supplier_id, OLD.bottle_price, 1);
+        END""",
+        # The latest state of every price row that still exists
+        """CREATE VIEW IF NOT EXISTS current_prices AS
+            SELECT price_id, wine_id, supplier_id, effective_date, bottle_price FROM (
+                SELECT price_id, wine_id, supplier_id, MAX(effective_date) AS effective_date, bottle_price, deleted
+                FROM price_history GROUP BY price_id)
+            WHERE NOT deleted""",
+    ]),
+    (7, "remember which wines and prices the sheet sync created", [
+        # Rows synced before this migration may have adopted an existing price, so they are not owned
+        "ALTER TABLE sheet_sync_rows ADD COLUMN created_wine INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE sheet_sync_rows ADD COLUMN created_price INTEGER NOT NULL DEFAULT 0",
+    ]),
+]
+
+
+def connect(path=DB_PATH, **kwargs):
+    conn = sqlite3.connect(path, **kwargs)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def connect_readonly(path=DB_PATH, **kwargs):
+    """A connection that cannot write, for long-lived readers such as the API server.
+
+    Opened with check_same_thread=False so it can be kept and reused from a
+    worker thread; callers must not use it from two threads at once.
+    """
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    return connect(uri, uri=True, check_same_thread=False, **kwargs)
+
+
+def is_busy(error):
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+class Database:
+    """The process's connections to one DB file: a cached reader and a serialized writer.
+
+    Readers share one read-only connection, so a rerun no longer opens and
+    tears down a connection (and its page cache) just to check the change
+    log. Writes go through one connection as well, one transaction at a
+    time; each transaction takes the write lock up front (BEGIN IMMEDIATE)
+    and is retried with backoff if another process holds it for longer
+    than busy_timeout, so concurrent editors wait instead of failing with
+    "database is locked".
+    """
+
+    def __init__(self, path=DB_PATH, retries=WRITE_RETRIES, retry_delay=WRITE_RETRY_DELAY):
+        self.path = path
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._read_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._reader = None
+        self._writer = None
+
+    @contextmanager
+    def read(self):
+        """The shared read-only connection, held exclusively for the duration of the block."""
+        with self._read_lock:
+            if self._reader is None:
+                self._reader = connect_readonly(self.path)
+            yield self._reader
+
+    @contextmanager
+    def transaction(self):
+        """One write transaction on the shared writer; commits on success, rolls back on error."""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = connect(self.path, isolation_level=None, check_same_thread=False)
+            conn = self._writer
+            for attempt in range(self.retries + 1):
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    break
+                except sqlite3.OperationalError as e:
+                    if not is_busy(e) or attempt == self.retries:
+                        raise
+                    time.sleep(self.retry_delay * 2 ** attempt)
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._read_lock, self._write_lock:
+            for conn in (self._reader, self._writer):
+                if conn is not None:
+                    conn.close()
+            self._reader = self._writer = None
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(path=DB_PATH):
+    """Bring the database up to the latest schema version; safe to call repeatedly.
+
+    Each pending migration runs in its own transaction together with the
+    user_version bump, so a failure leaves the DB at the last good version.
+    Returns the resulting schema version.
+    """
+    conn = connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        for version, _description, statements in MIGRATIONS:
+            if version <= schema_version(conn):
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-check under the write lock in case another process just migrated
+                if version > schema_version(conn):
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        conn.execute("PRAGMA optimize")
+        return schema_version(conn)
+    finally:
+        conn.close()
+
@@ -0,0 +1,306 @@
+"""Find and merge near-duplicate wines.
+
+    python -m wine_catalogue dedupe -o merge_proposals.csv [--threshold 0.85]
+    python -m wine_catalogue dedupe --apply merge_proposals.csv
+
+Supplier lists spell the same wine differently ("Ch. Margaux" / "Château
+Margaux", "2019" / "19"), so wines only ever get compared inside a block
+of the same normalized producer, vintage and bottle size. Inside a block, names are
+scored by the Dice overlap of their character trigrams, computed as dense
+matrix products of name x trigram incidence over tiles of the block, so no
+Python loop ever runs over pairs of wines. Matches are
+clustered transitively and every cluster keeps its oldest wine_id.
+
+Proposals are a table for someone to review; merge_wines() then moves the
+duplicates' supplier prices and price history onto the kept wine and
+deletes the duplicates, in one transaction.
+"""
+import argparse
+import datetime
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .config import DB_PATH
+from .db import Database, connect, migrate
+from .importer import normalize_text, normalize_vintage
+
+DEFAULT_THRESHOLD = 0.85
+NGRAM = 3
+# Two candidate names must use the same words, up to typos of at least this word-level score
+WORD_THRESHOLD = 0.6
+# Names per tile of a block. Each matrix product scores one tile against another, over only the
+# first tile's trigrams, so memory stays bounded however large the block is.
+BLOCK_CHUNK = 512
+
+# Spellings folded together before blocking and scoring (after unidecode + lower-casing)
+ABBREVIATIONS = {
+    "ch": "chateau", "chat": "chateau", "dom": "domaine", "dne": "domaine", "st": "saint", "ste": "sainte",
+    "mt": "mount", "mtn": "mountain", "&": "and", "et": "and", "vyd": "vineyard", "vyds": "vineyards",
+    "est": "estate", "res": "reserve", "rsv": "reserve", "sv": "single vineyard", "ov": "old vine",
+    "cab": "cabernet", "sauv": "sauvignon", "pn": "pinot noir", "1er": "premier", "gc": "grand cru",
+}
+# Producer words that suppliers add or leave off at will
+PRODUCER_NOISE = {"the", "wines", "wine", "winery", "estate", "estates", "vineyard", "vineyards", "cellars",
+                  "family", "and", "fils", "co", "company", "pty", "ltd"}
+YEAR = re.compile(r"\b(19|20)\d{2}\b")
+# Bottle formats are different products, so the size is blocked on too (in ml, 750 when not given)
+SIZE = re.compile(r"\b(\d+(?:\.\d+)?)\s*(ml|cl|lt?r?|litres?|liters?)\b|\b(magnum|jeroboam|half bottle|demi)\b")
+SIZE_UNITS_ML = {"ml": 1, "cl": 10}
+NAMED_SIZES_ML = {"magnum": 1500, "jeroboam": 3000, "half bottle": 375, "demi": 375}
+DEFAULT_SIZE_ML = 750
+
+PROPOSAL_COLUMNS = ["keep_wine_id", "wine_id", "score", "keep_producer", "keep_wine_name", "keep_vintage",
+                    "producer", "wine_name", "vintage"]
+
+
+def _words(value):
+    text = re.sub(r"[^\w&]+", " ", normalize_text(value or ""))
+    return [ABBREVIATIONS.get(word, word) for word in text.split()]
+
+
+def producer_key(value):
+    words = [word for word in _words(value) if word not in PRODUCER_NOISE]
+    return " ".join(words) or " ".join(_words(value))
+
+
+def bottle_size(value):
+    """Bottle size in ml mentioned in a wine name ("1.5L", "375ml", "Magnum"), else DEFAULT_SIZE_ML."""
+    match = SIZE.search(normalize_text(value or ""))
+    if match is None:
+        return DEFAULT_SIZE_ML
+    if match.group(3):
+        return NAMED_SIZES_ML[match.group(3)]
+    return round(float(match.group(1)) * SIZE_UNITS_ML.get(match.group(2), 1000))
+
+
+def name_key(value, producer=""):
+    """Normalized wine name without its vintage, size or a repeat of the producer's name."""
+    # The vintage and size are blocked on separately, so they are left out of the name
+    words = _words(SIZE.sub(" ", YEAR.sub(" ", normalize_text(value or ""))))
+    producer_words = set(producer.split())
+    return " ".join([word for word in words if word not in producer_words] or words)
+
+
+def vintage_key(value):
+    vintage = normalize_vintage(value)
+    if len(vintage) == 2 and vintage.isdigit():  # "19" -> "2019", "98" -> "1998"
+        century = "20" if int(vintage) <= datetime.date.today().year % 100 + 1 else "19"
+        vintage = century + vintage
+    return vintage
+
+
+def name_grams(name):
+    padded = f" {name} "
+    return {padded[i:i + NGRAM] for i in range(max(1, len(padded) - NGRAM + 1))}
+
+
+def name_similarity(a, b):
+    """Trigram Dice score of two normalized names (the same measure find_duplicates uses)."""
+    if a == b:
+        return 1.0
+    grams_a, grams_b = name_grams(a), name_grams(b)
+    return round(2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b)), 3)
+
+
+def same_words(a, b):
+    """Whether two normalized names have the same words, allowing typos but no extra words.
+
+    Trigram scores on whole names let one word differ ("Block 2" / "Block 6",
+    "Blanc de Blancs" / "Blanc de Noirs"); those name different wines, so
+    every word only one name has must be a near spelling of a word only the
+    other has, and numbers and one- or two-letter words must match exactly.
+    """
+    only_a, only_b = set(a.split()), set(b.split())
+    only_a, only_b = only_a - only_b, only_b - only_a
+    if len(only_a) != len(only_b):
+        return False
+    for word in only_a:
+        if len(word) <= 2 or any(ch.isdigit() for ch in word):
+            return False
+        partner = max(only_b, key=lambda other: name_similarity(word, other))
+        if len(partner) <= 2 or any(ch.isdigit() for ch in partner) or name_similarity(word, partner) < WORD_THRESHOLD:
+            return False
+        only_b.discard(partner)
+    return True
+
+
+def _trigrams(names):
+    """CSR-style (flat gram ids, offsets) of every name's distinct character trigrams."""
+    vocabulary, grams, offsets = {}, [], [0]
+    for name in names:
+        grams.extend(vocabulary.setdefault(gram, len(vocabulary)) for gram in name_grams(name))
+        offsets.append(len(grams))
+    return np.asarray(grams, dtype=np.int64), np.asarray(offsets, dtype=np.int64)
+
+
+def _incidence(names, grams, offsets, vocabulary):
+    """Dense names x vocabulary 0/1 matrix of which of the (sorted) vocabulary trigrams each name has."""
+    lengths = offsets[names + 1] - offsets[names]
+    owner = np.repeat(np.arange(len(names)), lengths)
+    within = np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    gram_ids = grams[offsets[names][owner] + within]
+    columns = np.minimum(np.searchsorted(vocabulary, gram_ids), len(vocabulary) - 1)
+    known = vocabulary[columns] == gram_ids
+    incidence = np.zeros((len(names), len(vocabulary)), dtype=np.float32)
+    incidence[owner[known], columns[known]] = 1.0
+    return incidence
+
+
+def _similar_pairs(names_in_block, grams, offsets, threshold):
+    """(i, j) name positions, i < j, of one block whose trigram Dice score passes threshold."""
+    lengths = offsets[names_in_block + 1] - offsets[names_in_block]
+    found_i, found_j = [], []
+    for start in range(0, len(names_in_block), BLOCK_CHUNK):
+        tile = names_in_block[start:start + BLOCK_CHUNK]
+        # Trigrams the tile's names do not have add nothing to their overlaps, so they are left out
+        vocabulary = np.unique(np.concatenate([grams[offsets[name]:offsets[name + 1]] for name in tile]))
+        left = _incidence(tile, grams, offsets, vocabulary)
+        for other in range(start, len(names_in_block), BLOCK_CHUNK):
+            shared = left @ _incidence(names_in_block[other:other + BLOCK_CHUNK], grams, offsets, vocabulary).T
+            score = 2 * shared / (lengths[start:start + BLOCK_CHUNK, None] + lengths[None, other:other + BLOCK_CHUNK])
+            i, j = np.nonzero(score >= threshold)
+            i += start
+            j += other
+            upper = i < j
+            found_i.append(i[upper])
+            found_j.append(j[upper])
+    return np.concatenate(found_i), np.concatenate(found_j)
+
+
+def _clusters(n, pairs):
+    """Union-find over row pairs; returns each row's root (its smallest member)."""
+    parent = list(range(n))
+
+    def root(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return np.array([root(x) for x in range(n)])
+
+
+def read_wines(conn):
+    return pd.read_sql_query("SELECT wine_id, producer, wine_name, vintage FROM wines ORDER BY wine_id", conn)
+
+
+def find_duplicates(wines, threshold=DEFAULT_THRESHOLD):
+    """Merge proposals (PROPOSAL_COLUMNS) for a frame of wine_id, producer, wine_name, vintage.
+
+    Each duplicate is proposed for merging into the lowest wine_id of its
+    cluster; score is its name similarity to that wine (1.0 = same
+    normalized name).
+    """
+    wines = wines.sort_values("wine_id").reset_index(drop=True)
+    producers = wines["producer"].map(producer_key)
+    vintages = wines["vintage"].map(vintage_key)
+    sizes = wines["wine_name"].map(bottle_size).astype(str)
+    names = pd.Series([name_key(name, producer) for name, producer in zip(wines["wine_name"], producers)])
+
+    # Wines with no producer could be anything, so they are never blocked together
+    has_producer = (producers != "").to_numpy()
+    block, _ = pd.factorize(producers + "\x1f" + vintages + "\x1f" + sizes)
+    name_code, unique_names = pd.factorize(names)
+    grams, offsets = _trigrams(unique_names)
+
+    # Every row points at the first row with its (block, name): identical names are matched outright
+    positions = np.arange(len(wines))
+    first_row = pd.Series(positions).groupby([block, name_code]).transform("first").to_numpy()
+    repeated = np.flatnonzero((first_row != positions) & has_producer)
+    pairs = list(zip(repeated, first_row[repeated]))
+
+    # Score each block's distinct names against each other
+    representatives = np.flatnonzero((first_row == positions) & has_producer)
+    rep_blocks = block[representatives]
+    order = np.argsort(rep_blocks, kind="stable")
+    representatives, rep_blocks = representatives[order], rep_blocks[order]
+    boundaries = np.flatnonzero(np.diff(rep_blocks)) + 1
+    for members in np.split(representatives, boundaries):
+        if len(members) < 2:
+            continue
+        i, j = _similar_pairs(name_code[members], grams, offsets, threshold)
+        pairs.extend((a, b) for a, b in zip(members[i], members[j])
+                     if same_words(unique_names[name_code[a]], unique_names[name_code[b]]))
+
+    roots = _clusters(len(wines), pairs)
+    duplicate = np.flatnonzero(roots != positions)
+    keep = roots[duplicate]
+    proposals = pd.DataFrame({
+        "keep_wine_id": wines["wine_id"].to_numpy()[keep],
+        "wine_id": wines["wine_id"].to_numpy()[duplicate],
+        "score": [name_similarity(a, b) for a, b in zip(names.to_numpy()[keep], names.to_numpy()[duplicate])],
+        "keep_producer": wines["producer"].to_numpy()[keep],
+        "keep_wine_name": wines["wine_name"].to_numpy()[keep],
+        "keep_vintage": wines["vintage"].to_numpy()[keep],
+        "producer": wines["producer"].to_numpy()[duplicate],
+        "wine_name": wines["wine_name"].to_numpy()[duplicate],
+        "vintage": wines["vintage"].to_numpy()[duplicate],
+    }, columns=PROPOSAL_COLUMNS)
+    return proposals.sort_values(["keep_wine_id", "wine_id"]).reset_index(drop=True)
+
+
+def merge_wines(db, merges):
+    """Fold each (keep_wine_id, wine_id) duplicate into its kept wine, in one transaction.
+
+    The duplicate's supplier prices move to the kept wine; where both have a
+    price from the same supplier, the most recently added price_id wins.
+    Their price history is relabelled to the kept wine and the duplicate
+    row is deleted. Returns the number of wines merged; a kept wine that
+    does not exist raises ValueError and nothing is merged.
+    """
+    merges = [(int(keep), int(wine_id)) for keep, wine_id in merges if int(keep) != int(wine_id)]
+    with db.transaction() as conn:
+        for keep, wine_id in merges:
+            # Checked as the batch goes, so a wine merged away earlier in it cannot be kept either
+            if conn.execute("SELECT 1 FROM wines WHERE wine_id = ?", (keep,)).fetchone() is None:
+                raise ValueError(f"Cannot merge wine {wine_id} into wine {keep}, which does not exist")
+            # Drop whichever of two same-supplier prices is older, then move the rest
+            conn.execute("""
+                DELETE FROM wine_prices WHERE price_id IN (
+                    SELECT CASE WHEN a.price_id < b.price_id THEN a.price_id ELSE b.price_id END
+                    FROM wine_prices a JOIN wine_prices b ON a.supplier_id = b.supplier_id
+                    WHERE a.wine_id = ? AND b.wine_id = ?)
+            """, (keep, wine_id))
+            conn.execute("UPDATE wine_prices SET wine_id = ? WHERE wine_id = ?", (keep, wine_id))
+            conn.execute("UPDATE price_history SET wine_id = ? WHERE wine_id = ?", (keep, wine_id))
+            conn.execute("DELETE FROM wines WHERE wine_id = ?", (wine_id,))
+    return len(merges)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Propose (or apply) merges of near-duplicate wines.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="minimum trigram Dice score of two names in the same producer/vintage block")
+    parser.add_argument("-o", "--output", default="-", help="proposal CSV (default: stdout)")
+    parser.add_argument("--apply", metavar="PROPOSALS_CSV",
+                        help="merge the keep_wine_id/wine_id pairs of a (reviewed) proposal file")
+    args = parser.parse_args(argv)
+
+    migrate(args.db)
+    if args.apply:
+        proposals = pd.read_csv(args.apply)
+        db = Database(args.db)
+        try:
+            merged = merge_wines(db, zip(proposals["keep_wine_id"], proposals["wine_id"]))
+        finally:
+            db.close()
+        print(f"Merged {merged} duplicate wines")
+        return
+    conn = connect(args.db)
+    try:
+        proposals = find_duplicates(read_wines(conn), args.threshold)
+    finally:
+        conn.close()
+    proposals.to_csv(sys.stdout if args.output == "-" else args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
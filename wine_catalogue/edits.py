@@ -0,0 +1,121 @@
+"""Batched, conflict-checked edits to wines and their supplier prices.
+
+    db = Database(DB_PATH)
+    report = apply_edits(db, [
+        WineEdit(wine_id=12, wine_changes={"vintage": "2019"}, price_id=40, price_changes={"bottle_price": 31.5}),
+        ...
+    ], seen_change_id=snapshot.change_id)
+
+Every edit in a batch is written in one transaction on the Database's
+serialized writer. Edits are optimistic: the caller passes the catalogue
+version (change id) its editor was showing, and a wine that has been
+logged in catalogue_changes since then was changed by someone else. Such a
+batch is rolled back and raises EditConflict instead of silently
+overwriting the other change.
+"""
+import json
+from dataclasses import dataclass, field
+
+from .catalogue import last_change_id
+
+WINE_COLUMNS = ["wine_name", "vintage", "varietal", "region", "producer"]
+PRICE_COLUMNS = ["bottle_price", "case_price", "case_size", "availability"]
+
+
+@dataclass
+class WineEdit:
+    """New values for one wine and, optionally, one of its supplier price rows."""
+    wine_id: int
+    wine_changes: dict = field(default_factory=dict)
+    price_id: int = None
+    price_changes: dict = field(default_factory=dict)
+
+
+@dataclass
+class EditReport:
+    wines_updated: int = 0
+    prices_updated: int = 0
+    change_id: int = 0    # catalogue version after the batch, to check the next edit against
+
+
+class EditConflict(Exception):
+    """Some wines were changed by someone else after the editor read them."""
+
+    def __init__(self, wine_ids):
+        self.wine_ids = wine_ids
+        super().__init__(f"{len(wine_ids)} wine(s) were changed by someone else since they were loaded: "
+                         f"{', '.join(map(str, wine_ids))}")
+
+
+def _check_columns(changes, allowed, table):
+    unknown = set(changes) - set(allowed)
+    if unknown:
+        raise ValueError(f"Cannot edit {table} column(s): {', '.join(sorted(unknown))}")
+
+
+def _sql_value(value):
+    """Plain Python value for sqlite (numpy scalars from the catalogue frame, NaN -> NULL)."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def conflicting_wines(conn, wine_ids, seen_change_id):
+    """Of wine_ids, those logged in catalogue_changes after seen_change_id."""
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT wine_id FROM catalogue_changes "
+        "WHERE change_id > ? AND wine_id IN (SELECT value FROM json_each(?)) ORDER BY wine_id",
+        (seen_change_id, json.dumps(sorted(wine_ids))))]
+
+
+def _grouped_updates(table, key_column, rows):
+    """(sql, params) per distinct set of edited columns, so each group is one executemany."""
+    groups = {}
+    for key, changes in rows:
+        columns = tuple(sorted(changes))
+        groups.setdefault(columns, []).append((*(_sql_value(changes[c]) for c in columns), int(key)))
+    for columns, params in groups.items():
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        yield f"UPDATE {table} SET {assignments} WHERE {key_column} = ?", params
+
+
+def apply_edits(db, edits, seen_change_id=None):
+    """Write a batch of WineEdits in one transaction and return an EditReport.
+
+    With seen_change_id set, raises EditConflict (writing nothing) if any
+    edited wine changed after that catalogue version. A price_id that does
+    not belong to its edit's wine is rejected with ValueError.
+    """
+    edits = list(edits)
+    for edit in edits:
+        _check_columns(edit.wine_changes, WINE_COLUMNS, "wines")
+        _check_columns(edit.price_changes, PRICE_COLUMNS, "wine_prices")
+        if edit.price_changes and edit.price_id is None:
+            raise ValueError(f"Price changes for wine {edit.wine_id} need a price_id")
+
+    report = EditReport()
+    with db.transaction() as conn:
+        if seen_change_id is not None:
+            conflicts = conflicting_wines(conn, {int(e.wine_id) for e in edits}, seen_change_id)
+            if conflicts:
+                raise EditConflict(conflicts)
+
+        price_edits = [e for e in edits if e.price_changes]
+        if price_edits:
+            owners = dict(conn.execute(
+                "SELECT price_id, wine_id FROM wine_prices WHERE price_id IN (SELECT value FROM json_each(?))",
+                (json.dumps([int(e.price_id) for e in price_edits]),)))
+            for edit in price_edits:
+                if owners.get(int(edit.price_id)) != int(edit.wine_id):
+                    raise ValueError(f"Price {edit.price_id} is not a price of wine {edit.wine_id}")
+
+        for sql, params in _grouped_updates("wines", "wine_id",
+                                            [(e.wine_id, e.wine_changes) for e in edits if e.wine_changes]):
+            report.wines_updated += conn.executemany(sql, params).rowcount
+        for sql, params in _grouped_updates("wine_prices", "price_id",
+                                            [(e.price_id, e.price_changes) for e in price_edits]):
+            report.prices_updated += conn.executemany(sql, params).rowcount
+        report.change_id = last_change_id(conn)
+    return report
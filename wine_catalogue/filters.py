@@ -0,0 +1,245 @@
+import numpy as np
+import pandas as pd
+
+from . import instrumentation
+
+FACET_COLUMNS = ["clean_varietal", "producer", "supplier", "wine_type"]
+
+
+class FilterEngine:
+    """Sidebar filtering over integer category codes of the cached catalogue.
+
+    Each facet column is factorized once; a selection becomes a boolean
+    lookup table over that facet's categories, so "is this row's varietal
+    selected" is a single gather `allowed[codes]` rather than an `isin`
+    over strings. All active filters are ANDed into one mask and the
+    result is a sorted array of row positions into the catalogue, so no
+    intermediate DataFrame copies are made.
+
+    The engine is built once per catalogue version, so it also serves the
+    sidebar: each facet's sorted options with their counts, and the price
+    bounds, without scanning the frame on every rerun.
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.codes = {}
+        self.categories = {}
+        for column in FACET_COLUMNS:
+            codes, categories = pd.factorize(df[column], sort=True)
+            self.codes[column] = codes
+            self.categories[column] = categories
+        self.prices = df["bottle_price"].to_numpy(dtype=float)
+        self.wine_ids = df["wine_id"].to_numpy()
+        # Rows ordered by wine, then cheapest priced supplier first (unpriced rows last)
+        self.price_order = self._price_order(np.arange(self.n_rows))
+        self._summarize()
+
+    def arrays(self):
+        """Facet codes, categories (lists of str) and the price order as named arrays, for a catalogue snapshot."""
+        arrays = {"price_order": self.price_order}
+        for column in FACET_COLUMNS:
+            arrays[f"codes/{column}"] = self.codes[column]
+            arrays[f"categories/{column}"] = self.categories[column].tolist()
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, df, arrays):
+        """The engine saved by arrays() for the same df, without re-factorizing the facets."""
+        engine = cls.__new__(cls)
+        engine.n_rows = len(df)
+        engine.codes = {column: arrays[f"codes/{column}"] for column in FACET_COLUMNS}
+        engine.categories = {column: pd.Index(arrays[f"categories/{column}"], dtype=df[column].dtype)
+                             for column in FACET_COLUMNS}
+        engine.prices = df["bottle_price"].to_numpy(dtype=float)
+        engine.wine_ids = df["wine_id"].to_numpy()
+        engine.price_order = arrays["price_order"]
+        engine._summarize()
+        return engine
+
+    def _price_order(self, rows):
+        price_key = np.where(self.prices[rows] > 0, self.prices[rows], np.inf)
+        return rows[np.lexsort((rows, price_key, self.wine_ids[rows]))]
+
+    def _summarize(self):
+        self.option_counts = {column: np.bincount(codes[codes >= 0], minlength=len(self.categories[column]))
+                              for column, codes in self.codes.items()}
+        self._price_range()
+
+    def _price_range(self):
+        priced = self.prices[~np.isnan(self.prices)]
+        self.price_range = (float(priced.min()), float(priced.max())) if len(priced) else (0.0, 0.0)
+
+    def spliced(self, df, splice):
+        """The engine for a catalogue Splice, moving the kept rows' codes instead of re-factorizing.
+
+        Only the re-read rows are looked up and counted; a facet's
+        categories are rebuilt just when a value appears or the last row of
+        one goes.
+        """
+        engine = FilterEngine.__new__(FilterEngine)
+        engine.n_rows = len(df)
+        added = splice.added
+        engine.codes, engine.categories, engine.option_counts = {}, {}, {}
+        for column in FACET_COLUMNS:
+            categories, codes = self.categories[column], self.codes[column]
+            removed_codes = codes[splice.removed]
+            counts = self.option_counts[column] - np.bincount(removed_codes[removed_codes >= 0],
+                                                              minlength=len(categories))
+            new_values = splice.new_rows[column]
+            present = categories if counts.all() else categories[counts > 0]
+            # An Index keeps its hash table, so looking up a few values in an unchanged facet is cheap
+            new_codes = present.get_indexer(new_values)
+            unseen = new_values[(new_codes < 0) & new_values.notna().to_numpy()].unique()
+            if len(unseen) or len(present) < len(categories):
+                updated = present.append(pd.Index(unseen, dtype=categories.dtype)).sort_values()
+                remap = updated.get_indexer(categories)
+                codes = np.append(remap, -1)[codes]
+                counts = np.bincount(remap[counts > 0], weights=counts[counts > 0],
+                                     minlength=len(updated)).astype(np.int64)
+                new_codes = updated.get_indexer(new_values)
+                categories = updated
+            engine.codes[column] = splice.move(codes, new_codes)
+            engine.categories[column] = categories
+            engine.option_counts[column] = counts + np.bincount(new_codes[new_codes >= 0], minlength=len(categories))
+        engine.prices = df["bottle_price"].to_numpy(dtype=float)
+        engine.wine_ids = df["wine_id"].to_numpy()
+
+        # Re-read wines are replaced whole, so their rows slot in as complete groups between kept wines
+        price_order = splice.old_to_new[self.price_order]
+        price_order = price_order[price_order >= 0]
+        added_order = engine._price_order(added)
+        at = np.searchsorted(engine.wine_ids[price_order], engine.wine_ids[added_order])
+        engine.price_order = np.insert(price_order, at, added_order)
+        engine._price_range()
+        return engine
+
+    def options(self, column, facet_counts=None, selected=()):
+        """(values, counts) of a facet's options in sorted order.
+
+        With the per-facet counts from filter(with_counts=True) the options
+        narrow to values that still match the other active filters
+        (dependent facets); values without rows are dropped unless they are
+        in `selected`, so a current selection always stays listed.
+        """
+        categories = self.categories[column]
+        if facet_counts is None:
+            counts = self.option_counts[column]
+        else:
+            counts = np.fromiter(facet_counts[column].values(), dtype=np.int64, count=len(categories))
+        keep = counts > 0
+        if len(selected):
+            positions = categories.get_indexer(list(selected))
+            keep[positions[positions >= 0]] = True
+        return categories[keep].tolist(), counts[keep].tolist()
+
+    def facet_mask(self, column, values):
+        """Rows whose `column` is one of `values` (unknown values match nothing)."""
+        allowed = np.zeros(len(self.categories[column]) + 1, dtype=bool)  # last slot: missing (-1)
+        positions = self.categories[column].get_indexer(list(values))
+        allowed[positions[positions >= 0]] = True
+        return allowed[self.codes[column]]
+
+    def price_mask(self, price_min=None, price_max=None, under_50=False, over_500=False):
+        mask = np.ones(self.n_rows, dtype=bool)
+        if under_50:
+            mask &= self.prices <= 50
+        if over_500:
+            mask &= self.prices > 500
+        if price_min is not None:
+            mask &= self.prices >= price_min
+        if price_max is not None:
+            mask &= self.prices <= price_max
+        return mask
+
+    def cheapest_per_wine(self, rows):
+        """Reduce row positions to one per wine: its cheapest supplier among `rows`.
+
+        Returned in catalogue order, like the input.
+        """
+        selected = np.zeros(self.n_rows, dtype=bool)
+        selected[rows] = True
+        ordered = self.price_order[selected[self.price_order]]
+        wine_ids = self.wine_ids[ordered]
+        first = np.ones(len(ordered), dtype=bool)
+        first[1:] = wine_ids[1:] != wine_ids[:-1]
+        return np.sort(ordered[first])
+
+    def _wine_groups(self, mask):
+        """The rows in mask grouped by wine: (rows in price order, each wine's first row, each row's wine number)."""
+        ordered = self.price_order[mask[self.price_order]]
+        first = np.ones(len(ordered), dtype=bool)
+        wine_ids = self.wine_ids[ordered]
+        first[1:] = wine_ids[1:] != wine_ids[:-1]
+        return ordered, ordered[first], np.cumsum(first) - 1
+
+    def _wine_codes(self, column, groups):
+        """`column`'s codes once per distinct (wine, value) among grouped rows, to count wines rather than rows."""
+        ordered, first_rows, wine_numbers = groups
+        codes = self.codes[column]
+        first_codes = codes[first_rows]
+        # Most facets have one value per wine: only rows whose value differs from their wine's first row
+        # need deduplicating
+        other = ordered[codes[ordered] != first_codes[wine_numbers]]
+        size = len(self.categories[column]) + 1
+        other_codes = pd.unique(self.wine_ids[other] * size + codes[other] + 1) % size - 1
+        return np.concatenate([first_codes, other_codes])
+
+    def filter(self, facets=None, wine_ids=None, extra_mask=None, with_counts=False, distinct_wines=False,
+               **price_filters):
+        """Apply every filter in one pass.
+
+        facets maps facet column -> selected values (empty selections are
+        ignored), wine_ids restricts to a set of ids (e.g. the shortlist),
+        extra_mask is any precomputed row mask (e.g. search matches) and
+        price_filters are passed to `price_mask`.
+
+        Returns the matching row positions, plus (with_counts=True) a dict of
+        per-facet value counts. Each facet's counts apply every filter
+        except that facet's own selection, so they show how many rows each
+        value would add or keep. With distinct_wines=True they count wines
+        rather than rows, matching a view that shows one card per wine.
+        """
+        # Rows left after each successive filter, only worked out while instrumenting
+        rows_after = {} if instrumentation.enabled() else None
+        base = self.price_mask(**price_filters)
+        if rows_after is not None:
+            rows_after["price"] = int(base.sum())
+        if wine_ids is not None:
+            base &= np.isin(self.wine_ids, list(wine_ids))
+            if rows_after is not None:
+                rows_after["wine_ids"] = int(base.sum())
+        if extra_mask is not None:
+            base &= extra_mask
+            if rows_after is not None:
+                rows_after["extra_mask"] = int(base.sum())
+        facet_masks = {column: self.facet_mask(column, values)
+                       for column, values in (facets or {}).items() if values}
+
+        mask = base.copy()
+        for column, facet_mask in facet_masks.items():
+            mask &= facet_mask
+            if rows_after is not None:
+                rows_after[column] = int(mask.sum())
+        rows = np.flatnonzero(mask)
+        if rows_after is not None:
+            instrumentation.annotate(rows_after=rows_after)
+        if not with_counts:
+            return rows
+
+        counts, masks = {}, {}
+        for column in FACET_COLUMNS:
+            # Facets with the same other selections (all of them, when nothing is selected) share a mask
+            applied = tuple(other for other in facet_masks if other != column)
+            if applied not in masks:
+                others = base.copy()
+                for other in applied:
+                    others &= facet_masks[other]
+                masks[applied] = self._wine_groups(others) if distinct_wines else others
+            if distinct_wines:
+                codes = self._wine_codes(column, masks[applied])
+            else:
+                codes = self.codes[column][masks[applied]]
+            tally = np.bincount(codes[codes >= 0], minlength=len(self.categories[column]))
+            counts[column] = dict(zip(self.categories[column], tally.tolist()))
+        return rows, counts
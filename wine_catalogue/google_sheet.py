@@ -0,0 +1,176 @@
+import csv
+import json
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+
+SHEET_KEY = "1H6guq90INPuSk49BfweRJ8zpPUCBLmHLNtVpVX-vThU"
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets",
+          "https://www.googleapis.com/auth/drive"]
+# Point this at a .json (list of row dicts) or .csv file to stand in for the live sheet
+FIXTURE_ENV_VAR = "WINE_SHEET_FIXTURE"
+SHEET_TTL_SECONDS = 600
+
+
+def open_worksheet(service_account_info, sheet_key=SHEET_KEY):
+    """Authorize with gspread and return the sheet's first worksheet.
+
+    The Google libraries are imported here so nothing touches them (or the
+    network) until a sheet is actually needed.
+    """
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    scoped_creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    gc = gspread.authorize(scoped_creds)
+    return gc.open_by_key(sheet_key).sheet1
+
+
+def gspread_records(service_account_info, sheet_key=SHEET_KEY):
+    """Return a zero-argument fetcher that pulls all rows from the live sheet."""
+    def fetch():
+        return open_worksheet(service_account_info, sheet_key).get_all_records()
+    return fetch
+
+
+def fixture_records(path):
+    """Return a zero-argument fetcher that reads rows from a local JSON/CSV file."""
+    def fetch():
+        if str(path).lower().endswith(".json"):
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+    return fetch
+
+
+class FakeSpreadsheet:
+    def __init__(self, revision):
+        self.revision = revision
+
+    def get_lastUpdateTime(self):
+        return self.revision
+
+
+class FakeWorksheet:
+    """Local stand-in for the parts of a gspread Worksheet the sheet sync uses.
+
+    Holds a header and rows of cell values in memory; `get("2:501")` returns
+    whole rows like the live API does (strings, trailing empty cells and
+    trailing empty rows of the range dropped, so a page can come back short
+    before the end of the sheet) and `spreadsheet.get_lastUpdateTime()`
+    returns `revision`.
+    """
+
+    def __init__(self, header, rows, revision="1"):
+        self.header = [str(h) for h in header]
+        self.rows = [["" if v is None else str(v) for v in row] for row in rows]
+        self.spreadsheet = FakeSpreadsheet(revision)
+        self.get_calls = 0
+
+    @classmethod
+    def from_records(cls, records, revision="1"):
+        header = list(dict.fromkeys(key for record in records for key in record))
+        return cls(header, [[record.get(h) for h in header] for record in records], revision)
+
+    @classmethod
+    def from_fixture(cls, path):
+        """The WINE_SHEET_FIXTURE file as a worksheet whose revision is the file's mtime."""
+        return cls.from_records(fixture_records(path)(), revision=str(os.path.getmtime(path)))
+
+    @property
+    def row_count(self):
+        return len(self.rows) + 1
+
+    def row_values(self, row):
+        return list(self.header) if row == 1 else self._trimmed(self.rows[row - 2])
+
+    @staticmethod
+    def _trimmed(values):
+        values = list(values)
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def get(self, range_name):
+        self.get_calls += 1
+        first, last = (int(n) for n in re.fullmatch(r"(\d+):(\d+)", range_name).groups())
+        page = [self._trimmed(values) for values in ([self.header] + self.rows)[first - 1:last]]
+        while page and not page[-1]:
+            page.pop()
+        return page
+
+
+def records_to_frame(records):
+    df_sheet = pd.DataFrame(records)
+    # Ensure all values are strings for Arrow compatibility
+    for col in df_sheet.columns:
+        df_sheet[col] = df_sheet[col].astype(str)
+    return df_sheet
+
+
+class BackgroundSheetLoader:
+    """Fetches the sheet on a worker thread and keeps the result for ttl seconds.
+
+    `get()` never waits on the network while something is cached: it
+    returns whatever is cached (possibly stale or None) and starts a
+    refresh if the cache is missing or expired. After a failed fetch the
+    next automatic attempt waits for the ttl too.
+    """
+
+    def __init__(self, fetch, ttl=SHEET_TTL_SECONDS):
+        self._fetch = fetch
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = None
+        self.df = None
+        self.error = None
+        self.fetched_at = None
+        self.failed_at = None
+
+    def _run(self):
+        try:
+            df_sheet = records_to_frame(self._fetch())
+        except Exception as e:  # surfaced to the UI via .error
+            with self._lock:
+                self.error, self.failed_at = e, time.time()
+        else:
+            with self._lock:
+                self.df, self.error, self.fetched_at = df_sheet, None, time.time()
+        finally:
+            self._done.set()
+
+    def is_stale(self):
+        return self.fetched_at is None or time.time() - self.fetched_at > self.ttl
+
+    def is_loading(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def refresh(self):
+        """Start a background fetch unless one is already running."""
+        with self._lock:
+            if self.is_loading():
+                return
+            self._done.clear()
+            self._thread = threading.Thread(target=self._run, name="sheet-fetch", daemon=True)
+            self._thread.start()
+
+    def retry_due(self):
+        return self.error is None or time.time() - self.failed_at > self.ttl
+
+    def get(self, wait=0):
+        """Return (df, error, fetched_at).
+
+        Only when nothing is cached yet does it wait, up to `wait` seconds,
+        for a running fetch; a stale frame is returned at once.
+        """
+        if self.is_stale() and self.retry_due():
+            self.refresh()
+        if wait and self.df is None and self.is_loading():
+            self._done.wait(wait)
+        with self._lock:
+            return self.df, self.error, self.fetched_at
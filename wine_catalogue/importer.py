@@ -0,0 +1,330 @@
+"""Bulk supplier price-list import.
+
+    python -m wine_catalogue.importer price_list.xlsx --supplier "Red+White" [--dry-run] [--create-missing]
+
+Rows are streamed from CSV/XLSX in chunks, matched to existing wines on
+normalized producer + wine name + vintage, and upserted into wine_prices for
+the given supplier with one executemany per chunk. The whole import is one
+transaction on the Database's serialized writer: a file that fails part-way
+(a bad XLSX, a locked database) writes nothing, rather than the chunks
+before the failure.
+"""
+import argparse
+import csv
+import io
+import json
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from unidecode import unidecode
+
+from .config import DB_PATH
+from .db import Database
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_CHANGES = 200
+
+# Accepted header spellings (compared lower-cased, spaces/underscores ignored)
+COLUMN_ALIASES = {
+    "producer": ["producer", "winery", "maker"],
+    "wine_name": ["winename", "wine", "name", "product", "description"],
+    "vintage": ["vintage", "year"],
+    "varietal": ["varietal", "variety", "grape"],
+    "region": ["region"],
+    "bottle_price": ["bottleprice", "luc", "price", "wholesale", "unitprice"],
+    "case_price": ["caseprice"],
+    "case_size": ["casesize", "packsize", "pack"],
+    "availability": ["availability", "available", "status", "stock"],
+}
+REQUIRED_COLUMNS = ["producer", "wine_name", "bottle_price"]
+# Marks a wine this import is adding, until the insert gives it a wine_id
+NEW_WINE = object()
+
+
+@lru_cache(maxsize=65536)
+def normalize_text(value):
+    return " ".join(unidecode(str(value)).lower().split())
+
+
+def normalize_vintage(value):
+    vintage = normalize_text(value if value is not None else "")
+    if vintage.endswith(".0"):  # spreadsheets hand back 2019 as 2019.0
+        vintage = vintage[:-2]
+    return vintage if vintage not in ("", "nv", "n/v", "none", "nan") else "nv"
+
+
+def vintage_text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def wine_key(producer, wine_name, vintage):
+    return normalize_text(producer or ""), normalize_text(wine_name or ""), normalize_vintage(vintage)
+
+
+def parse_number(value, cast=float):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return cast(value)
+    text = re.sub(r"[^\d.\-]", "", str(value))
+    try:
+        return cast(float(text))
+    except ValueError:
+        return None
+
+
+def _header_map(header):
+    """Map our field names to column positions in the file's header row."""
+    positions = {}
+    for position, name in enumerate(header):
+        compact = re.sub(r"[\s_]+", "", str(name or "")).lower()
+        for column, aliases in COLUMN_ALIASES.items():
+            if column not in positions and compact in aliases:
+                positions[column] = position
+    missing = [c for c in REQUIRED_COLUMNS if c not in positions]
+    if missing:
+        raise ValueError(f"Price list is missing required column(s): {', '.join(missing)}")
+    return positions
+
+
+def _raw_rows(source, filename):
+    """Yield raw row tuples (header first) from a CSV or XLSX path or file object."""
+    name = str(filename or source).lower()
+    if name.endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(source, read_only=True, data_only=True)
+        try:
+            yield from workbook.active.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+        return
+    if isinstance(source, (str, bytes)) or hasattr(source, "__fspath__"):
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            yield from csv.reader(f)
+        return
+    if isinstance(source, io.TextIOBase):
+        yield from csv.reader(source)
+        return
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()  # leave the caller's file open
+
+
+def read_price_list(source, filename=None, chunk_size=CHUNK_SIZE):
+    """Yield lists of up to chunk_size row dicts keyed by our field names."""
+    rows = _raw_rows(source, filename)
+    header = next(rows, None)
+    if header is None:
+        return
+    positions = _header_map(header)
+    chunk = []
+    for values in rows:
+        if not values or all(v in (None, "") for v in values):
+            continue
+        chunk.append({column: values[position] if position < len(values) else None
+                      for column, position in positions.items()})
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+@dataclass
+class ImportReport:
+    supplier: str
+    dry_run: bool
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    created_wines: int = 0
+    unmatched: int = 0
+    invalid: int = 0
+    changes: list = field(default_factory=list)    # first MAX_REPORTED_CHANGES diffs
+    unmatched_rows: list = field(default_factory=list)
+
+    def note_change(self, action, key, old, new):
+        if len(self.changes) < MAX_REPORTED_CHANGES:
+            producer, wine_name, vintage = key
+            self.changes.append({"action": action, "producer": producer, "wine_name": wine_name,
+                                 "vintage": vintage, "old": old, "new": new})
+
+    def summary(self):
+        verb = "would be" if self.dry_run else "were"
+        return (f"{self.rows} rows read for supplier '{self.supplier}': {self.inserted} prices {verb} added, "
+                f"{self.updated} {verb} updated, {self.unchanged} unchanged, {self.created_wines} new wines, "
+                f"{self.unmatched} unmatched, {self.invalid} invalid")
+
+
+def _supplier_id(conn, name, create):
+    row = conn.execute("SELECT supplier_id FROM suppliers WHERE name = ? ORDER BY supplier_id LIMIT 1", (name,)).fetchone()
+    if row:
+        return row[0]
+    if not create:
+        return None
+    return conn.execute("INSERT INTO suppliers (name) VALUES (?)", (name,)).lastrowid
+
+
+def _wine_index(conn):
+    """Normalized (producer, wine_name, vintage) -> lowest matching wine_id."""
+    index = {}
+    for wine_id, producer, wine_name, vintage in conn.execute(
+            "SELECT wine_id, producer, wine_name, vintage FROM wines ORDER BY wine_id"):
+        index.setdefault(wine_key(producer, wine_name, vintage), wine_id)
+    return index
+
+
+def _current_prices(conn, supplier_id):
+    """wine_id -> (price_id, values) of the supplier's lowest price_id for each wine.
+
+    A wine can carry more than one price from the same supplier; the import
+    compares and updates only that first one and leaves the others alone.
+    """
+    prices = {}
+    if supplier_id is None:
+        return prices
+    for price_id, wine_id, *values in conn.execute(
+            "SELECT price_id, wine_id, bottle_price, case_price, case_size, availability FROM wine_prices "
+            "WHERE supplier_id = ? ORDER BY price_id", (supplier_id,)):
+        prices.setdefault(wine_id, (price_id, tuple(values)))
+    return prices
+
+
+def import_price_list(source, supplier, filename=None, db_path=DB_PATH, dry_run=False,
+                      create_missing=False, chunk_size=CHUNK_SIZE, db=None):
+    """Stream a supplier price list into wine_prices and return an ImportReport.
+
+    Existing (wine, supplier) prices are updated by price_id only when a value
+    differs (the lowest price_id, when the supplier lists a wine twice);
+    rows for unknown wines are reported, or added as new wines when
+    create_missing is set. With dry_run nothing is written. Writes go through
+    db (a Database; one is opened on db_path if not given) in one transaction.
+    """
+    own_db = db is None
+    if own_db:
+        db = Database(db_path)
+    try:
+        if dry_run:
+            # Only the lookups hold the shared reader; the file is parsed after it is released
+            with db.read() as conn:
+                lookups = _lookups(conn, supplier, create=False)
+            return _import_rows(None, source, supplier, filename, create_missing, chunk_size, *lookups)
+        with db.transaction() as conn:
+            return _import_rows(conn, source, supplier, filename, create_missing, chunk_size,
+                                *_lookups(conn, supplier, create=True))
+    finally:
+        if own_db:
+            db.close()
+
+
+def _lookups(conn, supplier, create):
+    """(supplier_id, wine index, current prices) for an import into supplier."""
+    supplier_id = _supplier_id(conn, supplier, create)
+    return supplier_id, _wine_index(conn), _current_prices(conn, supplier_id)
+
+
+def _import_rows(conn, source, supplier, filename, create_missing, chunk_size, supplier_id, wines, prices):
+    """Match the file's rows against the lookups and, unless conn is None (a dry run), write them."""
+    dry_run = conn is None
+    report = ImportReport(supplier=supplier, dry_run=dry_run)
+
+    for chunk in read_price_list(source, filename, chunk_size):
+        inserts, updates, new_wines = {}, {}, {}
+        for row in chunk:
+            report.rows += 1
+            key = wine_key(row.get("producer"), row.get("wine_name"), row.get("vintage"))
+            bottle_price = parse_number(row.get("bottle_price"))
+            if not key[0] or not key[1] or bottle_price is None:
+                report.invalid += 1
+                continue
+            new = (bottle_price, parse_number(row.get("case_price")),
+                   parse_number(row.get("case_size"), int), str(row.get("availability") or "Available"))
+
+            wine_id = wines.get(key)
+            if wine_id is None:
+                if not create_missing:
+                    report.unmatched += 1
+                    if len(report.unmatched_rows) < MAX_REPORTED_CHANGES:
+                        report.unmatched_rows.append(row)
+                    continue
+                new_wines[key] = (row, new)
+                wines[key] = NEW_WINE
+                report.created_wines += 1
+                report.inserted += 1
+                report.note_change("new wine", key, None, new)
+                continue
+            if wine_id is NEW_WINE:
+                # Repeated line for a wine added earlier in this file: the last line wins
+                if key in new_wines:
+                    new_wines[key] = (row, new)
+                report.updated += 1
+                continue
+
+            price_id, old = prices.get(wine_id, (None, None))
+            if old is None:
+                inserts[wine_id] = new
+                report.inserted += 1
+                report.note_change("insert", key, None, new)
+            elif old != new:
+                if price_id is not None:
+                    updates[price_id] = new
+                elif wine_id in inserts:  # repeated line for a price added earlier in this chunk
+                    inserts[wine_id] = new
+                report.updated += 1
+                report.note_change("update", key, old, new)
+            else:
+                report.unchanged += 1
+            prices[wine_id] = (price_id, new)
+
+        if dry_run:
+            continue
+        for key, (row, new) in new_wines.items():
+            wine_id = conn.execute(
+                "INSERT INTO wines (wine_name, vintage, varietal, region, producer) VALUES (?, ?, ?, ?, ?)",
+                (row.get("wine_name"), None if key[2] == "nv" else vintage_text(row.get("vintage")),
+                 row.get("varietal"), row.get("region"), row.get("producer")),
+            ).lastrowid
+            wines[key] = wine_id
+            inserts[wine_id] = new
+        conn.executemany(
+            "INSERT INTO wine_prices (wine_id, supplier_id, bottle_price, case_price, case_size, availability) "
+            "VALUES (?, ?, ?, ?, ?, ?)", [(wine_id, supplier_id, *new) for wine_id, new in inserts.items()])
+        conn.executemany(
+            "UPDATE wine_prices SET bottle_price = ?, case_price = ?, case_size = ?, availability = ? "
+            "WHERE price_id = ?", [(*new, price_id) for price_id, new in updates.items()])
+        # Later lines for the prices just added update them by price_id too
+        for wine_id, price_id in conn.execute(
+                "SELECT wine_id, MIN(price_id) FROM wine_prices "
+                "WHERE supplier_id = ? AND wine_id IN (SELECT value FROM json_each(?)) GROUP BY wine_id",
+                (supplier_id, json.dumps(list(inserts)))):
+            prices[wine_id] = (price_id, inserts[wine_id])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a supplier price list (CSV or XLSX) into wine_prices.")
+    parser.add_argument("path")
+    parser.add_argument("--supplier", required=True, help="supplier name as stored in the suppliers table")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="report the changes without writing them")
+    parser.add_argument("--create-missing", action="store_true", help="add wines that are not in the catalogue yet")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    report = import_price_list(args.path, args.supplier, db_path=args.db, dry_run=args.dry_run,
+                               create_missing=args.create_missing, chunk_size=args.chunk_size)
+    print(report.summary())
+    for change in report.changes[:50]:
+        print(f"  {change['action']:>8}  {change['producer']} {change['wine_name']} ({change['vintage']}): "
+              f"{change['old']} -> {change['new']}")
+
+
+if __name__ == "__main__":
+    main()
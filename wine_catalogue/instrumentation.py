@@ -0,0 +1,132 @@
+"""Opt-in timing spans and counters for one run of the pipeline (e.g. one Streamlit rerun).
+
+    recorder = instrumentation.activate(Recorder() if debugging else None)
+    with instrumentation.span("browse", rows_in=len(df)) as s:
+        rows = ...
+        s.set(rows_out=len(rows))
+    instrumentation.count("cache.catalogue.miss")
+    recorder.log()  # one JSON log record with every span and counter
+
+The active recorder lives in a context variable, so library code can emit
+spans without being passed anything. With no recorder active, span()
+returns a shared no-op object and count() is a single lookup, so the
+calls can stay in hot paths. Anything that costs work only to report it
+(e.g. counting mask rows) should be guarded with enabled().
+"""
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+_recorder = ContextVar("wine_catalogue_recorder", default=None)
+
+
+class Span:
+    __slots__ = ("recorder", "name", "depth", "attrs", "start", "duration_ms")
+
+    def __init__(self, recorder, name, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.attrs = attrs
+        self.depth = 0
+        self.start = None
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        recorder = self.recorder
+        self.depth = len(recorder.open_spans)
+        recorder.spans.append(self)
+        recorder.open_spans.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        self.recorder.open_spans.pop()
+        return False
+
+    def as_dict(self):
+        return {"name": self.name, "depth": self.depth, "offset_ms": (self.start - self.recorder.start) * 1000,
+                "duration_ms": self.duration_ms, **self.attrs}
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Recorder:
+    """Spans (in start order, with nesting depth) and counters for one run."""
+
+    def __init__(self, name="run", **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.spans = []
+        self.open_spans = []
+        self.counters = Counter()
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def as_dict(self):
+        return {"run": self.name, **self.attrs, "started_at": self.started_at, "elapsed_ms": self.elapsed_ms(),
+                "spans": [span.as_dict() for span in self.spans], "counters": dict(self.counters)}
+
+    def log(self, level=logging.INFO):
+        """Emit the whole run as one JSON log record on the `wine_catalogue.instrumentation` logger."""
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps(self.as_dict(), default=str))
+
+
+def activate(recorder):
+    """Make `recorder` (or None to disable) the active recorder for this context and return it."""
+    _recorder.set(recorder)
+    return recorder
+
+
+def current():
+    return _recorder.get()
+
+
+def enabled():
+    return _recorder.get() is not None
+
+
+def span(name, **attrs):
+    recorder = _recorder.get()
+    return NULL_SPAN if recorder is None else Span(recorder, name, attrs)
+
+
+def annotate(**attrs):
+    """Add attributes to the innermost open span, if recording."""
+    recorder = _recorder.get()
+    if recorder is not None and recorder.open_spans:
+        recorder.open_spans[-1].attrs.update(attrs)
+
+
+def count(name, n=1):
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.counters[name] += n
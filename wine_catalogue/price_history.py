@@ -0,0 +1,96 @@
+"""Queries over the append-only price_history table (see migrations 4 and 6 in db.py).
+
+wine_prices holds each supplier price row's current price; triggers append
+every new, changed or deleted price row to price_history keyed by price_id
+and effective date, so the history is complete for every write path
+(edits, imports, syncs, merges). A wine can carry two price rows from one
+supplier, so histories are followed per price_id; wine_id and supplier_id
+are kept alongside (and indexed) for lookups.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# SQLite returns the other columns from the MAX() row, so this is one ordered
+# pass over the (price_id, effective_date) primary key. Rows whose latest entry
+# is a deletion no longer had a price on that date.
+AS_OF_QUERY = '''
+    SELECT price_id, wine_id, supplier_id, effective_date, bottle_price FROM (
+        SELECT price_id, wine_id, supplier_id, MAX(effective_date) AS effective_date, bottle_price, deleted
+        FROM price_history
+        WHERE effective_date <= ? {extra}
+        GROUP BY price_id)
+    WHERE NOT deleted
+'''
+
+
+def _date(value):
+    if value is None:
+        return datetime.date.today().isoformat()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def prices_as_of(conn, as_of=None, wine_ids=None):
+    """Latest price of every price row that existed on as_of (default today)."""
+    if wine_ids is None:
+        return pd.read_sql_query(AS_OF_QUERY.format(extra=""), conn, params=(_date(as_of),))
+    query = AS_OF_QUERY.format(extra="AND wine_id IN (SELECT value FROM json_each(?))")
+    return pd.read_sql_query(query, conn, params=(_date(as_of), pd.Series(wine_ids).astype(int).to_json(orient="values")))
+
+
+def price_series(conn, wine_id, supplier_id=None):
+    """Full price history of one wine, oldest first (deleted price rows end with deleted=1)."""
+    query = ("SELECT price_id, supplier_id, effective_date, bottle_price, deleted FROM price_history "
+             "WHERE wine_id = ?")
+    params = [wine_id]
+    if supplier_id is not None:
+        query += " AND supplier_id = ?"
+        params.append(supplier_id)
+    return pd.read_sql_query(query + " ORDER BY supplier_id, price_id, effective_date", conn, params=params)
+
+
+def recent_changes(conn, days=30, today=None):
+    """History rows that took effect within the last `days` days (uses the effective_date index)."""
+    since = (pd.Timestamp(_date(today)) - pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+    return pd.read_sql_query(
+        "SELECT price_id, wine_id, supplier_id, effective_date, bottle_price, deleted FROM price_history "
+        "WHERE effective_date > ? ORDER BY effective_date", conn, params=(since,))
+
+
+def biggest_movers(conn, days=30, limit=25, today=None):
+    """Supplier prices that moved most over the last `days` days.
+
+    Compares each changed price row's price at the start of the window with
+    its latest price, in one vectorized merge; rows first priced inside the
+    window have no baseline and rows deleted since are not moves, so both
+    are left out.
+    """
+    today = _date(today)
+    start = (pd.Timestamp(today) - pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+    changed = recent_changes(conn, days, today)
+    columns = ["price_id", "wine_id", "supplier_id", "producer", "wine_name", "vintage", "supplier",
+               "old_price", "new_price", "change", "pct_change"]
+    if changed.empty:
+        return pd.DataFrame(columns=columns)
+
+    wine_ids = changed["wine_id"].unique()
+    baseline = prices_as_of(conn, start, wine_ids).rename(columns={"bottle_price": "old_price"})
+    latest = changed.groupby("price_id", as_index=False).last()
+    latest = latest[latest["deleted"] == 0]
+    movers = latest.rename(columns={"bottle_price": "new_price"}).merge(
+        baseline[["price_id", "old_price"]], on="price_id")
+    movers["change"] = movers["new_price"] - movers["old_price"]
+    movers["pct_change"] = np.where(movers["old_price"] > 0, movers["change"] / movers["old_price"] * 100, np.nan)
+    movers = movers[movers["change"].fillna(0) != 0]
+    movers = movers.reindex(movers["change"].abs().sort_values(ascending=False).index).head(limit)
+
+    names = pd.read_sql_query(
+        "SELECT w.wine_id, w.producer, w.wine_name, w.vintage FROM wines w "
+        "WHERE w.wine_id IN (SELECT value FROM json_each(?))", conn,
+        params=(movers["wine_id"].astype(int).to_json(orient="values"),))
+    suppliers = pd.read_sql_query("SELECT supplier_id, name AS supplier FROM suppliers", conn)
+    movers = movers.merge(names, on="wine_id", how="left").merge(suppliers, on="supplier_id", how="left")
+    return movers[columns].reset_index(drop=True)
@@ -0,0 +1,170 @@
+import json
+import os
+from dataclasses import asdict, dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+from .config import PRICING_RULES_PATH
+
+PRICE_COLUMNS = ["calculated_bottle_price", "calculated_glass_price", "calculated_takeaway_price"]
+
+
+@dataclass(frozen=True)
+class PricingRules:
+    """One version of the pricing rules: LUC tiers, the multipliers within them and the glass limits.
+
+    The tables live only in pricing_rules.json (see load_rule_sets), so
+    margins can change (or be modelled) without a release.
+    """
+    version: str
+    price_tiers: tuple
+    bottle_multipliers: tuple
+    glass_multipliers: tuple
+    takeaway_multipliers: tuple
+    gst: float
+    max_glass_inc_price: float
+    min_glass_price: float
+    description: str = ""
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build and validate a rule set from its JSON form (ValueError if it is malformed)."""
+        names = [f.name for f in fields(cls)]
+        missing = [name for name in names if name not in data and name != "description"]
+        if missing:
+            raise ValueError(f"Pricing rule set is missing {', '.join(missing)}")
+        unknown = sorted(set(data) - set(names))
+        if unknown:
+            raise ValueError(f"Pricing rule set {data['version']} has unknown key(s) {', '.join(unknown)}")
+        rules = cls(**{**data, **{f: tuple(float(v) for v in data[f]) for f in
+                                  ("price_tiers", "bottle_multipliers", "glass_multipliers", "takeaway_multipliers")}})
+        tiers = np.asarray(rules.price_tiers)
+        if len(tiers) == 0 or tiers[0] != 0 or np.any(np.diff(tiers) <= 0):
+            raise ValueError(f"Rule set {rules.version}: price_tiers must start at 0 and increase")
+        for name in ("bottle_multipliers", "glass_multipliers", "takeaway_multipliers"):
+            if not getattr(rules, name) or len(getattr(rules, name)) > len(tiers):
+                raise ValueError(f"Rule set {rules.version}: {name} needs 1 to {len(tiers)} values")
+        return rules
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# path -> (mtime_ns, rule sets, active version) of the last parse
+_loaded_rule_sets = {}
+
+
+def load_rule_sets(path=PRICING_RULES_PATH):
+    """(version -> PricingRules in file order, active version) from a pricing rules JSON file.
+
+    The file is parsed again only when its modification time changes.
+    """
+    mtime = os.stat(path).st_mtime_ns
+    loaded = _loaded_rule_sets.get(path)
+    if loaded is None or loaded[0] != mtime:
+        loaded = _loaded_rule_sets[path] = (mtime, *_read_rule_sets(path))
+    return dict(loaded[1]), loaded[2]
+
+
+def _read_rule_sets(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    rule_sets = {}
+    for entry in data["rule_sets"]:
+        rules = PricingRules.from_dict(entry)
+        if rules.version in rule_sets:
+            raise ValueError(f"Pricing rule set {rules.version} is defined twice")
+        rule_sets[rules.version] = rules
+    active = data.get("active", next(reversed(rule_sets), None))
+    if active not in rule_sets:
+        raise ValueError(f"Active pricing rule set {active!r} is not defined")
+    return rule_sets, active
+
+
+def active_rules(path=PRICING_RULES_PATH):
+    """The rule set marked active in the pricing rules file."""
+    rule_sets, active = load_rule_sets(path)
+    return rule_sets[active]
+
+
+def _tier_multiplier(luc, tiers, multipliers, side):
+    """Look up the multiplier for every LUC at once (same clamping as the scalar lookup)."""
+    idx = np.searchsorted(tiers, luc, side=side) - 1
+    idx = np.minimum(idx, len(multipliers) - 1)
+    return np.asarray(multipliers, dtype=float)[idx]
+
+
+def _round_up_to_ten(values):
+    return np.ceil(values / 10.0) * 10
+
+
+def calculate_prices(luc, rules=None):
+    """Price a whole column of LUCs in one pass under a PricingRules version.
+
+    rules=None prices with the active rule set of pricing_rules.json
+    (read from disk only when the file changes).
+
+    Returns a dict of float arrays keyed by PRICE_COLUMNS; rows the old
+    per-row functions reported as "N/A" are NaN.  Bottle prices use a
+    right-sided tier lookup, glass and takeaway a left-sided one.
+    """
+    rules = active_rules() if rules is None else rules
+    luc = np.asarray(luc, dtype=float)
+    tiers = np.asarray(rules.price_tiers, dtype=float)
+    valid = ~np.isnan(luc) & (luc > 0)
+    # Price invalid rows at tier 0 and mask them afterwards, so no NaN reaches searchsorted
+    safe_luc = np.where(valid, luc, tiers[0])
+    inc_price = safe_luc * rules.gst
+
+    bottle = _round_up_to_ten(inc_price * _tier_multiplier(safe_luc, tiers, rules.bottle_multipliers, "right"))
+    takeaway = _round_up_to_ten(inc_price * _tier_multiplier(safe_luc, tiers, rules.takeaway_multipliers, "left"))
+    glass_bottle = _round_up_to_ten(inc_price * _tier_multiplier(safe_luc, tiers, rules.glass_multipliers, "left"))
+    glass = np.round(np.maximum(glass_bottle / 4, rules.min_glass_price), 2)
+
+    return {
+        "calculated_bottle_price": np.where(valid, bottle, np.nan),
+        "calculated_glass_price": np.where(valid & (inc_price <= rules.max_glass_inc_price), glass, np.nan),
+        "calculated_takeaway_price": np.where(valid, takeaway, np.nan),
+    }
+
+
+def add_price_columns(df, luc_column="bottle_price", rules=None):
+    """Add the three calculated price columns to df in place and return it (rules as for calculate_prices)."""
+    for column, values in calculate_prices(df[luc_column].to_numpy(dtype=float, na_value=np.nan), rules).items():
+        df[column] = values
+    return df
+
+
+def what_if(df, base, candidate, luc_column="bottle_price", keep_columns=()):
+    """Reprice every row of df under two rule sets side by side.
+
+    Returns (rows, summary). rows has keep_columns, the LUC and, for each
+    of bottle, glass and takeaway, <name>_base, <name>_candidate and
+    <name>_delta; summary has
+    one row per price column with how many rows are priced, how many
+    change, and the mean, total, min and max of the deltas. Everything is
+    computed with whole-column array operations.
+    """
+    luc = df[luc_column].to_numpy(dtype=float, na_value=np.nan)
+    before, after = calculate_prices(luc, base), calculate_prices(luc, candidate)
+    rows = {column: df[column].to_numpy() for column in keep_columns}
+    rows[luc_column] = luc
+    summary = []
+    for column in PRICE_COLUMNS:
+        name = column[len("calculated_"):-len("_price")]
+        delta = after[column] - before[column]
+        rows[f"{name}_base"] = before[column]
+        rows[f"{name}_candidate"] = after[column]
+        rows[f"{name}_delta"] = delta
+        priced = ~np.isnan(delta)
+        changed = priced & (delta != 0)
+        summary.append({
+            "price": name, "priced": int(priced.sum()), "changed": int(changed.sum()),
+            "mean_delta": float(delta[priced].mean()) if priced.any() else np.nan,
+            "mean_pct_delta": float((delta[priced] / before[column][priced]).mean() * 100) if priced.any() else np.nan,
+            "total_delta": float(delta[priced].sum()),
+            "min_delta": float(delta[priced].min()) if priced.any() else np.nan,
+            "max_delta": float(delta[priced].max()) if priced.any() else np.nan,
+        })
+    return pd.DataFrame(rows), pd.DataFrame(summary)
@@ -0,0 +1,55 @@
+from unidecode import unidecode
+
+from . import instrumentation
+from .sort_index import SORT_OPTIONS
+
+
+def browse(snapshot, search="", varietals=(), producers=(), suppliers=(), wine_types=(), shortlist=None,
+           price_min=None, price_max=None, under_50=False, over_500=False, group_suppliers=True,
+           sort="Producer A-Z", with_counts=False):
+    """Row positions into snapshot.df for one browser query, in display order.
+
+    This is everything the wine browser does between its widgets and its
+    cards: search, facet and price filters, the shortlist-only view,
+    cheapest-supplier grouping and sorting. shortlist=None means "don't
+    restrict to the shortlist". With with_counts=True the per-facet counts
+    from FilterEngine.filter are returned too; they count wines when
+    group_suppliers is on, like the cards.
+    """
+    span = instrumentation.span
+    search_mask = None
+    if search:
+        with span("browse.search", query=search):
+            search_mask = snapshot.search_index.mask(search)
+            if instrumentation.enabled():
+                instrumentation.annotate(rows_out=int(search_mask.sum()))
+    with span("browse.filter", rows_in=len(snapshot.df)) as filter_span:
+        result = snapshot.filter_engine.filter(
+            facets={
+                "clean_varietal": [unidecode(v.lower()) for v in varietals],
+                "producer": producers,
+                "supplier": suppliers,
+                "wine_type": wine_types,
+            },
+            wine_ids=shortlist,
+            extra_mask=search_mask,
+            price_min=price_min, price_max=price_max, under_50=under_50, over_500=over_500,
+            with_counts=with_counts, distinct_wines=group_suppliers,
+        )
+        if not with_counts:
+            rows, facet_counts = result, None
+        else:
+            rows, facet_counts = result
+        filter_span.set(rows_out=len(rows))
+    if group_suppliers:
+        with span("browse.group_suppliers", rows_in=len(rows)) as group_span:
+            rows = snapshot.filter_engine.cheapest_per_wine(rows)
+            group_span.set(rows_out=len(rows))
+    with span("browse.sort", sort=sort, rows=len(rows)):
+        rows = sort_rows(snapshot.sort_index, rows, sort)
+    return (rows, facet_counts) if with_counts else rows
+
+
+def sort_rows(sort_index, rows, sort):
+    """Row positions in display order for a sort option, via the snapshot's precomputed ranks."""
+    return sort_index.sort(rows, sort)
@@ -0,0 +1,299 @@
+import numpy as np
+from unidecode import unidecode
+
+# Joins producer and wine name into one searchable document. Query tokens never
+# contain it, so a token matches the document exactly when it matches either field.
+FIELD_SEP = "\x00"
+# Bigrams are posted by document and answer one- and two-character tokens. Trigrams
+# are posted by position in the documents' joined text, so a longer token is matched
+# exactly by chaining its trigrams, without re-checking candidate documents.
+BIGRAM = 2
+TRIGRAM = 3
+# Gram numberings up to this size are ranked with a lookup table instead of a sort
+GRAM_TABLE_SIZE = 1 << 24
+
+
+def normalize_query(query):
+    """Normalize search box input the same way the search box always has."""
+    return unidecode(query.lower()).strip()
+
+
+def _intersect(sorted_ids, candidates):
+    """The candidates (sorted, unique) that are also in sorted_ids; cost grows with the candidates, not sorted_ids."""
+    if not len(candidates) or not len(sorted_ids):
+        return candidates[:0]
+    at = np.searchsorted(sorted_ids, candidates)
+    found = at < len(sorted_ids)
+    found[found] = sorted_ids[at[found]] == candidates[found]
+    return candidates[found]
+
+
+def _gram_groups(text, lengths, n):
+    """Every n-gram lying inside one of the documents joined in text, grouped by gram.
+
+    Returns (grams, positions, ends): the start of every occurrence,
+    ascending within each gram, with gram i's occurrences ending at
+    ends[i]. The characters that occur are numbered 0..base-1, which makes
+    each gram a small integer computed from shifted slices of the text, so
+    grouping is one stable sort instead of per-document Python sets.
+    """
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    if len(codes) < n:
+        return [], np.empty(0, dtype=np.int64), []
+    present = np.zeros(int(codes.max()) + 1, dtype=bool)
+    present[codes] = True
+    base = int(present.sum())
+    # 32-bit grams halve the memory traffic whenever the numbering fits
+    dtype = np.int32 if base ** n <= np.iinfo(np.int32).max else np.int64
+    letters = (np.cumsum(present) - 1).astype(dtype)[codes]
+    gram = np.zeros(len(codes) - n + 1, dtype=dtype)
+    for k in range(n):
+        gram = gram * base + letters[k:len(gram) + k]
+    doc_ends = np.repeat(np.cumsum(lengths), lengths)[:len(gram)]
+    positions = np.flatnonzero(np.arange(len(gram)) + n <= doc_ends)
+    gram = gram[positions]
+    if base ** n <= GRAM_TABLE_SIZE:
+        seen = np.zeros(base ** n, dtype=bool)
+        seen[gram] = True
+        ranks = (np.cumsum(seen) - 1)[gram]
+    else:
+        ranks = np.unique(gram, return_inverse=True)[1]
+    counts = np.bincount(ranks)
+    # Stable, so positions stay ascending within a gram; numpy radix-sorts 16-bit keys
+    small = len(counts) <= np.iinfo(np.int16).max
+    positions = positions[np.argsort(ranks.astype(np.int16) if small else ranks, kind="stable")]
+    ends = np.cumsum(counts)
+    grams = [text[first:first + n] for first in positions[ends - counts].tolist()]
+    return grams, positions, ends.tolist()
+
+
+def _flat_postings(postings):
+    """(grams, ends, values): every gram's postings concatenated, ending at ends[i]."""
+    grams = list(postings)
+    arrays = [postings[gram] for gram in grams]
+    ends = np.cumsum([len(values) for values in arrays], dtype=np.int64)
+    return grams, ends, np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+
+
+def _extend_postings(postings, grams, values, ends):
+    """Append each gram's slice of values to its postings array (values exceed what is posted already)."""
+    start = 0
+    for gram, end in zip(grams, ends):
+        existing = postings.get(gram)
+        postings[gram] = values[start:end] if existing is None else np.concatenate([existing, values[start:end]])
+        start = end
+
+
+class SearchIndex:
+    """Bigram and positional trigram postings over the unidecoded producer and wine names.
+
+    Distinct (clean_producer, clean_wine_name) pairs are indexed once as
+    documents; `doc_rows(d)` maps each document back to its catalogue rows.
+    A query token matches a row when it is a substring of the row's
+    clean_producer or clean_wine_name, i.e. the same accent-insensitive
+    substring test as `str.contains`; multi-token queries require every
+    token to match.
+    """
+
+    def __init__(self, clean_producer, clean_wine_name):
+        self.docs = []
+        self.doc_of_text = {}
+        self.postings = {}
+        self.positions = {}
+        self.doc_starts = np.zeros(1, dtype=np.int64)
+        self._index_rows(clean_producer, clean_wine_name)
+
+    def _copy_tables(self, index):
+        """Give index its own copy of this index's document tables, to add documents to."""
+        index.docs, index.doc_of_text = list(self.docs), dict(self.doc_of_text)
+        index.postings, index.positions = dict(self.postings), dict(self.positions)
+        index.doc_starts = self.doc_starts
+
+    def _index_rows(self, clean_producer, clean_wine_name):
+        """Point every row at its document, indexing documents not seen before."""
+        self.row_docs = self._doc_ids(clean_producer, clean_wine_name)
+        self.n_rows = len(self.row_docs)
+        # Every row grouped by document (catalogue order within one), sliced per document by doc_bounds
+        self.doc_order = np.argsort(self.row_docs, kind="stable")
+        self.doc_bounds = np.searchsorted(self.row_docs[self.doc_order], np.arange(len(self.docs) + 1))
+
+    def _doc_ids(self, clean_producer, clean_wine_name):
+        """Document id of every given row, indexing documents not seen before."""
+        first_new_doc = len(self.docs)
+        row_docs = np.empty(len(clean_producer), dtype=np.int64)
+        for row, (producer, name) in enumerate(zip(clean_producer, clean_wine_name)):
+            text = f"{producer}{FIELD_SEP}{name}"
+            doc_id = self.doc_of_text.get(text)
+            if doc_id is None:
+                doc_id = self.doc_of_text[text] = len(self.docs)
+                self.docs.append(text)
+            row_docs[row] = doc_id
+        if len(self.docs) > first_new_doc:
+            self._index_docs(first_new_doc)
+        return row_docs
+
+    def _index_docs(self, first_new_doc):
+        """Post the grams of docs[first_new_doc:], whose ids and text positions follow every posted one."""
+        new_docs = self.docs[first_new_doc:]
+        text = "".join(new_docs)
+        lengths = np.fromiter(map(len, new_docs), dtype=np.int64, count=len(new_docs))
+        offset = self.doc_starts[-1]
+        self.doc_starts = np.append(self.doc_starts, offset + np.cumsum(lengths))
+
+        grams, positions, ends = _gram_groups(text, lengths, TRIGRAM)
+        _extend_postings(self.positions, grams, positions + offset, ends)
+
+        grams, positions, ends = _gram_groups(text, lengths, BIGRAM)
+        doc_ids = np.repeat(np.arange(first_new_doc, len(self.docs)), lengths)[positions]
+        # A bigram repeated within one document is posted once
+        keep = np.ones(len(doc_ids), dtype=bool)
+        keep[1:] = doc_ids[1:] != doc_ids[:-1]
+        starts = [0] + ends[:-1]
+        keep[starts] = True
+        ends = np.cumsum(np.add.reduceat(keep, starts)).tolist() if ends else []
+        _extend_postings(self.postings, grams, doc_ids[keep], ends)
+
+    def doc_rows(self, doc_id):
+        """Catalogue rows of one document, in catalogue order."""
+        return self.doc_order[self.doc_bounds[doc_id]:self.doc_bounds[doc_id + 1]]
+
+    def with_rows(self, clean_producer, clean_wine_name):
+        """A new index over an updated catalogue, reusing this one's postings.
+
+        Only documents (producer/name pairs) that did not exist before are
+        tokenized; documents no longer used by any row stay indexed but map to
+        no rows. This index is left untouched for readers still using it.
+        """
+        index = SearchIndex.__new__(SearchIndex)
+        self._copy_tables(index)
+        index._index_rows(clean_producer, clean_wine_name)
+        return index
+
+    def spliced(self, df, splice):
+        """Like with_rows for a catalogue Splice, touching only the re-read rows.
+
+        The document tables are shared with this index until a re-read row
+        brings a new document, and the row groups are moved, not re-sorted.
+        """
+        index = SearchIndex.__new__(SearchIndex)
+        index.docs, index.doc_of_text = self.docs, self.doc_of_text
+        index.postings, index.positions, index.doc_starts = self.postings, self.positions, self.doc_starts
+        added = splice.added
+        producers = splice.new_rows["clean_producer"].tolist()
+        names = splice.new_rows["clean_wine_name"].tolist()
+        if any(f"{producer}{FIELD_SEP}{name}" not in self.doc_of_text for producer, name in zip(producers, names)):
+            self._copy_tables(index)
+        added_docs = index._doc_ids(producers, names)
+
+        kept = splice.old_to_new >= 0
+        index.n_rows = len(df)
+        index.row_docs = np.empty(index.n_rows, dtype=np.int64)
+        index.row_docs[splice.old_to_new[kept]] = self.row_docs[kept]
+        index.row_docs[added] = added_docs
+        # Kept rows stay grouped by document; each re-read row goes in at its (document, position)
+        doc_order = splice.old_to_new[self.doc_order]
+        doc_order = doc_order[doc_order >= 0]
+        added = added[np.lexsort((added, added_docs))]
+        at = np.searchsorted(index.row_docs[doc_order] * index.n_rows + doc_order,
+                             index.row_docs[added] * index.n_rows + added)
+        index.doc_order = np.insert(doc_order, at, added)
+        index.doc_bounds = np.append(0, np.cumsum(np.bincount(index.row_docs, minlength=len(index.docs))))
+        return index
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(df["clean_producer"].tolist(), df["clean_wine_name"].tolist())
+
+    def arrays(self):
+        """The index as named flat arrays (documents as a list of str), for a catalogue snapshot."""
+        arrays = {"docs": self.docs, "doc_starts": self.doc_starts, "row_docs": self.row_docs,
+                  "doc_order": self.doc_order, "doc_bounds": self.doc_bounds}
+        for name, postings in (("bigram", self.postings), ("trigram", self.positions)):
+            grams, ends, values = _flat_postings(postings)
+            arrays.update({f"{name}s": grams, f"{name}_ends": ends, f"{name}_postings": values})
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """The index saved by arrays(); postings are slices of the given (possibly memory-mapped) arrays."""
+        index = cls.__new__(cls)
+        index.docs = arrays["docs"]
+        index.doc_of_text = {text: doc_id for doc_id, text in enumerate(index.docs)}
+        index.doc_starts, index.row_docs = arrays["doc_starts"], arrays["row_docs"]
+        index.doc_order, index.doc_bounds = arrays["doc_order"], arrays["doc_bounds"]
+        index.n_rows = len(index.row_docs)
+        index.postings, index.positions = {}, {}
+        for name, postings in (("bigram", index.postings), ("trigram", index.positions)):
+            ends, values = arrays[f"{name}_ends"].tolist(), arrays[f"{name}_postings"]
+            postings.update(zip(arrays[f"{name}s"], (values[lo:hi] for lo, hi in zip([0] + ends[:-1], ends))))
+        return index
+
+    def _token_docs(self, token):
+        """Sorted ids of documents containing token as a substring."""
+        if len(token) < BIGRAM:
+            # Every character of a document is in one of its bigrams (a document is at least the separator
+            # plus one character), so the union of the bigrams containing token finds the same documents
+            hit = np.zeros(len(self.docs), dtype=bool)
+            for gram, ids in self.postings.items():
+                if token in gram:
+                    hit[ids] = True
+            return np.flatnonzero(hit)
+        if len(token) == BIGRAM:
+            return self.postings.get(token, np.empty(0, dtype=np.int64))
+        # Positions where every trigram of token starts at its offset, rarest trigram first. Consecutive
+        # trigrams overlap and never cross a document's end, so the whole token lies in one document.
+        offsets = sorted(range(len(token) - TRIGRAM + 1),
+                         key=lambda k: len(self.positions.get(token[k:k + TRIGRAM], ())))
+        starts = self.positions.get(token[offsets[0]:offsets[0] + TRIGRAM])
+        if starts is None:
+            return np.empty(0, dtype=np.int64)
+        starts = starts - offsets[0]
+        for k in offsets[1:]:
+            starts = _intersect(self.positions.get(token[k:k + TRIGRAM], starts[:0]), starts + k) - k
+            if not len(starts):
+                break
+        docs = np.searchsorted(self.doc_starts, starts, side="right") - 1
+        return docs[np.append(True, docs[1:] != docs[:-1])] if len(docs) else docs
+
+    def matching_docs(self, query):
+        tokens = normalize_query(query).split()
+        if not tokens:
+            return np.arange(len(self.docs))
+        docs = None
+        for token in sorted(set(tokens), key=len, reverse=True):
+            token_docs = self._token_docs(token)
+            docs = token_docs if docs is None else _intersect(token_docs, docs)
+            if not len(docs):
+                break
+        return docs
+
+    def matching_rows(self, query):
+        """Catalogue row positions matching query, in catalogue order."""
+        return np.flatnonzero(self.mask(query))
+
+    def mask(self, query):
+        hit = np.zeros(len(self.docs), dtype=bool)
+        hit[self.matching_docs(query)] = True
+        return hit[self.row_docs]
+
+    def search(self, query, limit=None):
+        """Matching row positions, best matches first.
+
+        Rows whose producer or name contains the whole query come first, then
+        rows where more tokens start a word; ties keep catalogue order.
+        """
+        phrase = normalize_query(query)
+        tokens = phrase.split()
+        ranked = []
+        for d in self.matching_docs(query):
+            doc_rows = self.doc_rows(d)
+            if not len(doc_rows):
+                continue
+            fields = self.docs[d].split(FIELD_SEP)
+            words = " ".join(fields).split()
+            phrase_match = any(phrase in field for field in fields)
+            word_starts = sum(any(word.startswith(token) for word in words) for token in tokens)
+            ranked.append((-phrase_match, -word_starts, doc_rows[0], doc_rows))
+        ranked.sort(key=lambda item: item[:3])
+        rows = np.concatenate([item[3] for item in ranked]) if ranked else np.empty(0, dtype=np.int64)
+        return rows if limit is None else rows[:limit]
@@ -0,0 +1,296 @@
+"""Sync the Google Sheet's wines and prices into the database, writing only what changed.
+
+    python -m wine_catalogue sync-sheet --credentials service_account.json [--dry-run] [--force]
+    python -m wine_catalogue sync-sheet --fixture sheet.json   # a local file instead of Google
+
+The sheet is read in pages of `page_size` rows up to its row count. Each
+row is keyed by its normalized producer + wine name + vintage + supplier and
+hashed over the fields we store; sheet_sync_rows remembers the hash and
+the wine/price each key was last written to. Rows whose key is new are inserted (or
+linked to the wine's existing price from that supplier), rows whose hash
+changed are updated, and keys that disappeared from the sheet are unlinked.
+Their price is deleted only if the sync created it, and their wine only if the sync
+created it and nothing else prices it. A read that would remove most of
+the synced rows (a blank or truncated sheet) is refused unless forced.
+The whole delta is applied in one transaction together with the sheet's
+revision. When the sheet's last-update time still matches the stored
+revision the sync stops after that single metadata call.
+
+Sheet columns are matched with the importer's header aliases, plus a
+supplier column; rows without a supplier get SHEET_SUPPLIER.
+"""
+import argparse
+import hashlib
+import json
+from dataclasses import dataclass
+
+from .config import DB_PATH
+from .db import Database, migrate
+from .google_sheet import SHEET_KEY
+from .importer import _header_map, _supplier_id, _wine_index, normalize_text, parse_number, vintage_text, wine_key
+
+SYNC_PAGE_SIZE = 500
+SHEET_SUPPLIER = "Google Sheet"
+SUPPLIER_ALIASES = ["supplier", "distributor", "importer", "merchant"]
+# Removing more than this share of the synced rows in one sync needs force
+MAX_REMOVED_FRACTION = 0.5
+
+WINE_FIELDS = ["wine_name", "vintage", "varietal", "region", "producer"]
+PRICE_FIELDS = ["bottle_price", "case_price", "case_size", "availability"]
+
+
+class SyncRefused(Exception):
+    """The sheet read would remove most of the synced rows, which looks more like a bad read than an edit."""
+
+    def __init__(self, removed, synced):
+        self.removed = removed
+        self.synced = synced
+        super().__init__(f"The sheet would remove {removed} of the {synced} synced rows; "
+                         "sync with force if the sheet really shrank")
+
+
+@dataclass
+class SyncReport:
+    revision: str = None
+    skipped: bool = False    # the sheet had not changed since the last sync
+    dry_run: bool = False
+    rows: int = 0
+    inserted: int = 0
+    linked: int = 0    # new rows matched to a price the sync did not create
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    invalid: int = 0
+
+    def summary(self):
+        if self.skipped:
+            return f"Sheet unchanged since revision {self.revision}; nothing to sync"
+        verb = "would be" if self.dry_run else "were"
+        return (f"{self.rows} sheet rows: {self.inserted} {verb} added, {self.linked} {verb} linked to "
+                f"existing prices, {self.updated} {verb} updated, "
+                f"{self.deleted} {verb} deleted, {self.unchanged} unchanged, {self.invalid} invalid")
+
+
+def sheet_revision(worksheet):
+    """The spreadsheet's last-update time: one Drive metadata call, no cell data."""
+    return str(worksheet.spreadsheet.get_lastUpdateTime())
+
+
+def read_sheet_rows(worksheet, page_size=SYNC_PAGE_SIZE):
+    """Yield the sheet's rows as dicts keyed by our field names, fetching page_size rows per call."""
+    header = worksheet.row_values(1)
+    positions = _header_map(header)
+    for position, name in enumerate(header):
+        if str(name or "").strip().lower() in SUPPLIER_ALIASES:
+            positions.setdefault("supplier", position)
+            break
+    # The API leaves trailing empty rows out of a range, so a short page is not the end of
+    # the sheet: page over the whole grid, or rows after a blank one would read as removed
+    for first in range(2, worksheet.row_count + 1, page_size):
+        for values in worksheet.get(f"{first}:{first + page_size - 1}"):
+            if not values or all(v in (None, "") for v in values):
+                continue
+            yield {column: values[position] if position < len(values) else None
+                   for column, position in positions.items()}
+
+
+def sheet_record(row):
+    """(row_key, row_hash, wine values, price values, supplier) for one sheet row, or None if unusable."""
+    key = wine_key(row.get("producer"), row.get("wine_name"), row.get("vintage"))
+    bottle_price = parse_number(row.get("bottle_price"))
+    if not key[0] or not key[1] or bottle_price is None:
+        return None
+    supplier = str(row.get("supplier") or "").strip() or SHEET_SUPPLIER
+    wine = {
+        "wine_name": str(row.get("wine_name")).strip(),
+        "vintage": None if key[2] == "nv" else vintage_text(row.get("vintage")),
+        "varietal": str(row.get("varietal") or "").strip() or None,
+        "region": str(row.get("region") or "").strip() or None,
+        "producer": str(row.get("producer")).strip(),
+    }
+    price = {
+        "bottle_price": bottle_price,
+        "case_price": parse_number(row.get("case_price")),
+        "case_size": parse_number(row.get("case_size"), int),
+        "availability": str(row.get("availability") or "Available"),
+    }
+    row_key = "\x1f".join([*key, normalize_text(supplier)])
+    row_hash = hashlib.sha1(json.dumps([wine, price, supplier], sort_keys=True).encode()).hexdigest()
+    return row_key, row_hash, wine, price, supplier
+
+
+def _exists(conn, table, column, value):
+    return conn.execute(f"SELECT 1 FROM {table} WHERE {column} = ?", (value,)).fetchone() is not None
+
+
+def _price_of(conn, wine_id, supplier_id):
+    row = conn.execute("SELECT price_id FROM wine_prices WHERE wine_id = ? AND supplier_id = ? "
+                       "ORDER BY price_id LIMIT 1", (wine_id, supplier_id)).fetchone()
+    return row[0] if row else None
+
+
+def _existing_price(conn, record, wines, supplier_ids):
+    """The price_id a new sheet row would link to instead of inserting, or None."""
+    _row_key, _row_hash, wine, _price, supplier = record
+    if supplier not in supplier_ids:
+        supplier_ids[supplier] = _supplier_id(conn, supplier, create=False)
+    wine_id = wines().get(wine_key(wine["producer"], wine["wine_name"], wine["vintage"]))
+    if wine_id is None or supplier_ids[supplier] is None:
+        return None
+    return _price_of(conn, wine_id, supplier_ids[supplier])
+
+
+def _write_record(conn, record, synced, wines, supplier_ids):
+    """Write one new or changed sheet row; returns its (wine_id, price_id, created_wine, created_price)."""
+    row_key, _row_hash, wine, price, supplier = record
+    if supplier_ids.get(supplier) is None:
+        supplier_ids[supplier] = _supplier_id(conn, supplier, create=True)
+    supplier_id = supplier_ids[supplier]
+
+    wine_id, price_id, created_wine, created_price = synced if synced else (None, None, 0, 0)
+    if wine_id is None or not _exists(conn, "wines", "wine_id", wine_id):
+        wine_id = wines().get(wine_key(wine["producer"], wine["wine_name"], wine["vintage"]))
+        created_wine = 0
+    if wine_id is None:
+        wine_id = conn.execute(f"INSERT INTO wines ({', '.join(WINE_FIELDS)}) VALUES (?, ?, ?, ?, ?)",
+                               [wine[f] for f in WINE_FIELDS]).lastrowid
+        wines()[wine_key(wine["producer"], wine["wine_name"], wine["vintage"])] = wine_id
+        created_wine = 1
+    else:
+        # Blank sheet cells leave what the DB already knows about the wine
+        conn.execute(f"UPDATE wines SET {', '.join(f'{f} = COALESCE(?, {f})' for f in WINE_FIELDS)} WHERE wine_id = ?",
+                     [*(wine[f] for f in WINE_FIELDS), wine_id])
+
+    if price_id is None or not _exists(conn, "wine_prices", "price_id", price_id):
+        price_id = _price_of(conn, wine_id, supplier_id)
+        created_price = 0
+    if price_id is None:
+        price_id = conn.execute(
+            f"INSERT INTO wine_prices (wine_id, supplier_id, {', '.join(PRICE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            [wine_id, supplier_id, *(price[f] for f in PRICE_FIELDS)]).lastrowid
+        created_price = 1
+    else:
+        conn.execute(f"UPDATE wine_prices SET wine_id = ?, supplier_id = ?, {', '.join(f'{f} = ?' for f in PRICE_FIELDS)} "
+                     "WHERE price_id = ?", [wine_id, supplier_id, *(price[f] for f in PRICE_FIELDS), price_id])
+    return wine_id, price_id, created_wine, created_price
+
+
+def _lazy_wine_index(conn):
+    """A function returning _wine_index(conn), scanned only when some row first needs it."""
+    cache = {}
+
+    def wines():
+        if "wines" not in cache:
+            cache["wines"] = _wine_index(conn)
+        return cache["wines"]
+    return wines
+
+
+def _delta(conn, sheet_key, records, report, wines, supplier_ids):
+    """(synced rows by key, new or changed records, removed keys), counted into report."""
+    synced = {row[0]: row[1:] for row in conn.execute(
+        "SELECT row_key, row_hash, wine_id, price_id, created_wine, created_price FROM sheet_sync_rows "
+        "WHERE sheet_key = ?", (sheet_key,))}
+    changed = [record for key, record in records.items() if key not in synced or synced[key][0] != record[1]]
+    removed = [key for key in synced if key not in records]
+    new = [record for record in changed if record[0] not in synced]
+    report.linked = sum(1 for record in new if _existing_price(conn, record, wines, supplier_ids) is not None)
+    report.inserted = len(new) - report.linked
+    report.updated = len(changed) - len(new)
+    report.deleted = len(removed)
+    report.unchanged = len(records) - len(changed)
+    return synced, changed, removed
+
+
+def sync_sheet(db, worksheet, sheet_key=SHEET_KEY, page_size=SYNC_PAGE_SIZE, dry_run=False, force=False):
+    """Bring wines/wine_prices in line with the sheet and return a SyncReport.
+
+    `worksheet` is a gspread Worksheet (see google_sheet.open_worksheet) or
+    a google_sheet.FakeWorksheet. With force the sheet is re-read even if
+    its revision is unchanged, and a delta removing more than
+    MAX_REMOVED_FRACTION of the synced rows is applied rather than raising
+    SyncRefused; with dry_run nothing is written.
+    """
+    report = SyncReport(revision=sheet_revision(worksheet), dry_run=dry_run)
+    with db.read() as conn:
+        stored = conn.execute("SELECT revision FROM sheet_sync_state WHERE sheet_key = ?", (sheet_key,)).fetchone()
+    if stored is not None and stored[0] == report.revision and not force:
+        report.skipped = True
+        return report
+
+    records = {}
+    for row in read_sheet_rows(worksheet, page_size):
+        report.rows += 1
+        record = sheet_record(row)
+        if record is None:
+            report.invalid += 1
+            continue
+        records[record[0]] = record  # a repeated row: the last one wins
+
+    if dry_run:
+        with db.read() as conn:
+            _delta(conn, sheet_key, records, report, _lazy_wine_index(conn), {})
+        return report
+
+    with db.transaction() as conn:
+        wines, supplier_ids = _lazy_wine_index(conn), {}
+        synced, changed, removed = _delta(conn, sheet_key, records, report, wines, supplier_ids)
+        if len(removed) > MAX_REMOVED_FRACTION * len(synced) and not force:
+            raise SyncRefused(len(removed), len(synced))
+
+        for record in changed:
+            previous = synced.get(record[0])
+            written = _write_record(conn, record, previous[1:] if previous else None, wines, supplier_ids)
+            conn.execute("INSERT OR REPLACE INTO sheet_sync_rows (sheet_key, row_key, row_hash, wine_id, price_id, "
+                         "created_wine, created_price) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (sheet_key, record[0], record[1], *written))
+
+        for row_key in removed:
+            _row_hash, wine_id, price_id, created_wine, created_price = synced[row_key]
+            # Prices and wines the sheet only linked to were there before it and stay
+            if created_price:
+                conn.execute("DELETE FROM wine_prices WHERE price_id = ?", (price_id,))
+            if created_wine:
+                conn.execute("DELETE FROM wines WHERE wine_id = ? AND NOT EXISTS "
+                             "(SELECT 1 FROM wine_prices WHERE wine_id = ?)", (wine_id, wine_id))
+            conn.execute("DELETE FROM sheet_sync_rows WHERE sheet_key = ? AND row_key = ?", (sheet_key, row_key))
+
+        conn.execute("INSERT OR REPLACE INTO sheet_sync_state (sheet_key, revision, row_count, synced_at) "
+                     "VALUES (?, ?, ?, CURRENT_TIMESTAMP)", (sheet_key, report.revision, len(records)))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync the Google Sheet's wines and prices into the database.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--credentials", help="service account JSON file for the Google Sheets API")
+    source.add_argument("--fixture", help="a local .json/.csv file standing in for the sheet")
+    parser.add_argument("--sheet-key", default=SHEET_KEY)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--page-size", type=int, default=SYNC_PAGE_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="report the delta without writing it")
+    parser.add_argument("--force", action="store_true",
+                        help="re-read the sheet even if its revision is unchanged, and apply a delta that "
+                             "removes most synced rows")
+    args = parser.parse_args(argv)
+
+    from .google_sheet import FakeWorksheet, open_worksheet
+
+    if args.fixture:
+        worksheet = FakeWorksheet.from_fixture(args.fixture)
+    else:
+        with open(args.credentials) as f:
+            worksheet = open_worksheet(json.load(f), args.sheet_key)
+    migrate(args.db)
+    db = Database(args.db)
+    try:
+        report = sync_sheet(db, worksheet, args.sheet_key, args.page_size, args.dry_run, args.force)
+    except SyncRefused as e:
+        parser.exit(1, f"{e}\n")
+    finally:
+        db.close()
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
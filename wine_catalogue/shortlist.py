@@ -0,0 +1,119 @@
+import io
+from collections.abc import Mapping
+
+import numpy as np
+
+from . import instrumentation
+
+# Catalogue column -> export header, in export column order
+EXPORT_COLUMNS = {
+    "wine_name": "Wine Name",
+    "vintage": "Vintage",
+    "clean_varietal": "Varietal",
+    "region": "Region",
+    "producer": "Producer",
+    "supplier": "Supplier",
+    "bottle_price": "Price ($)"
+}
+EXPORT_FORMATS = {
+    "CSV": ("wine_shortlist.csv", "text/csv"),
+    "XLSX": ("wine_shortlist.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+class WineRows(Mapping):
+    """wine_id -> catalogue row positions (in catalogue order) for every wine.
+
+    Stored as flat arrays (sorted wine ids, each wine's slice of a row array
+    grouped by wine) rather than one array per wine, so a refresh can move
+    the rows of a few wines without touching the others.
+    """
+
+    def __init__(self, ids, bounds, rows):
+        self.ids = ids
+        self.bounds = bounds
+        self.rows = rows
+
+    @classmethod
+    def from_wine_ids(cls, wine_ids):
+        wine_ids = np.asarray(wine_ids, dtype=np.int64)
+        rows = np.argsort(wine_ids, kind="stable")
+        ids, starts = np.unique(wine_ids[rows], return_index=True)
+        return cls(ids, np.append(starts, len(rows)), rows)
+
+    def arrays(self):
+        return {"ids": self.ids, "bounds": self.bounds, "rows": self.rows}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays["ids"], arrays["bounds"], arrays["rows"])
+
+    def _slot(self, wine_id):
+        slot = int(np.searchsorted(self.ids, wine_id))
+        if slot == len(self.ids) or self.ids[slot] != wine_id:
+            raise KeyError(wine_id)
+        return slot
+
+    def __getitem__(self, wine_id):
+        slot = self._slot(wine_id)
+        return self.rows[self.bounds[slot]:self.bounds[slot + 1]]
+
+    def __contains__(self, wine_id):
+        try:
+            self._slot(wine_id)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def spliced(self, splice, wine_ids):
+        """The mapping after a catalogue Splice that re-read every row of `wine_ids`."""
+        # Kept wines keep their grouping: positions only shift, monotonically
+        kept_ids = ~np.isin(self.ids, np.asarray(wine_ids, dtype=np.int64))
+        rows = splice.old_to_new[self.rows]
+        rows = rows[rows >= 0]
+        ids, counts = self.ids[kept_ids], np.diff(self.bounds)[kept_ids]
+        offsets = np.append(0, np.cumsum(counts))
+
+        new_ids = splice.new_rows["wine_id"].to_numpy()
+        order = np.lexsort((splice.added, new_ids))
+        added_ids, added_counts = np.unique(new_ids[order], return_counts=True)
+        at = np.searchsorted(ids, added_ids)
+        rows = np.insert(rows, np.repeat(offsets[at], added_counts), splice.added[order])
+        ids = np.insert(ids, at, added_ids)
+        counts = np.insert(counts, at, added_counts)
+        return WineRows(ids, np.append(0, np.cumsum(counts)), rows)
+
+
+def index_wine_rows(wine_ids):
+    """wine_id -> catalogue row positions (in catalogue order) for every wine."""
+    return WineRows.from_wine_ids(wine_ids)
+
+
+def shortlist_rows(wine_rows, shortlist):
+    """Row positions of every supplier row of the shortlisted wines, in catalogue order."""
+    rows = [wine_rows[wine_id] for wine_id in shortlist if wine_id in wine_rows]
+    return np.sort(np.concatenate(rows)) if rows else np.empty(0, dtype=np.int64)
+
+
+def export_frame(df, rows):
+    return df.iloc[rows][list(EXPORT_COLUMNS)].rename(columns=EXPORT_COLUMNS)
+
+
+def export_bytes(export_df, fmt):
+    if fmt == "XLSX":
+        buffer = io.BytesIO()
+        export_df.to_excel(buffer, index=False, sheet_name="Shortlist", engine="openpyxl")
+        return buffer.getvalue()
+    return export_df.to_csv(index=False).encode("utf-8")
+
+
+def export_shortlist(snapshot, wine_ids, fmt="CSV"):
+    """CSV/XLSX bytes for the shortlisted wines of a catalogue snapshot."""
+    with instrumentation.span("export_shortlist", wines=len(wine_ids), format=fmt):
+        return export_bytes(export_frame(snapshot.df, shortlist_rows(snapshot.wine_rows, wine_ids)), fmt)
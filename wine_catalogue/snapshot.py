@@ -0,0 +1,98 @@
+import json
+import os
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # snapshots are an optimisation; without pyarrow every process runs the ETL
+    pa = None
+
+# Bump when the snapshot layout or the meaning of its columns changes
+SNAPSHOT_FORMAT = 2
+METADATA_KEY = b"wine_catalogue"
+FRAME_SCHEMA_KEY = b"wine_catalogue.frame_schema"
+FRAME_PREFIX = "df/"
+
+
+def snapshot_path(db_path):
+    return f"{db_path}.catalogue.arrow"
+
+
+def _packed(values):
+    """A one-row large_list column holding values (an Arrow array, a numpy array or a list of str)."""
+    if not isinstance(values, pa.Array):
+        values = pa.array(values, type=None if isinstance(values, np.ndarray) else pa.large_string())
+    return pa.LargeListArray.from_arrays(pa.array([0, len(values)], type=pa.int64()), values)
+
+
+def _frame_table(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for position, name in enumerate(table.column_names):
+        if df[name].dtype.kind == "f":
+            # Keep NaN as a value rather than a null, so the column reads back without a copy
+            table = table.set_column(position, table.field(position), pa.array(df[name].to_numpy()))
+    return table
+
+
+def write_snapshot(df, path, meta, arrays=None):
+    """Write df and named index arrays as an uncompressed Arrow IPC file; returns False without pyarrow.
+
+    The file holds a single row, where each frame column and each array
+    is one list value. Every column is then one contiguous buffer, even
+    though the arrays have different lengths. `arrays` maps names to numpy
+    arrays or lists of str. The file is written next to its final name and
+    renamed into place, so readers in other processes never see a partial
+    snapshot.
+    """
+    if pa is None:
+        return False
+    frame = _frame_table(df)
+    columns = {FRAME_PREFIX + name: _packed(frame.column(name).combine_chunks()) for name in frame.column_names}
+    columns.update({name: _packed(values) for name, values in (arrays or {}).items()})
+    table = pa.table(columns)
+    table = table.replace_schema_metadata({
+        METADATA_KEY: json.dumps({"format": SNAPSHOT_FORMAT, **meta}).encode(),
+        FRAME_SCHEMA_KEY: frame.schema.serialize().to_pybytes(),
+    })
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_snapshot_meta(path):
+    """The metadata stored with a snapshot, or None if it is missing, unreadable or another format."""
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        schema = pa.ipc.open_file(pa.memory_map(path)).schema
+        meta = json.loads(schema.metadata[METADATA_KEY])
+    except (pa.ArrowInvalid, OSError, KeyError, TypeError, ValueError):
+        return None
+    return meta if meta.get("format") == SNAPSHOT_FORMAT else None
+
+
+def read_snapshot(path):
+    """Memory-map a snapshot and return (df, arrays).
+
+    Numeric frame columns and index arrays are read-only numpy views of
+    the mapped file. With pandas' Arrow-backed strings (the default from
+    pandas 3), string columns stay Arrow arrays over it as well. Those
+    pages are shared with every other process that maps the same
+    snapshot. Arrays that were lists of str come back as lists, which are
+    per-process Python objects.
+    """
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    schema = pa.ipc.read_schema(pa.py_buffer(table.schema.metadata[FRAME_SCHEMA_KEY]))
+    frame = pa.Table.from_arrays([table.column(FRAME_PREFIX + name).chunk(0).values for name in schema.names],
+                                 schema=schema)
+    arrays = {}
+    for name in table.column_names:
+        if name.startswith(FRAME_PREFIX):
+            continue
+        values = table.column(name).chunk(0).values
+        arrays[name] = values.to_pylist() if pa.types.is_large_string(values.type) else values.to_numpy()
+    return frame.to_pandas(split_blocks=True), arrays
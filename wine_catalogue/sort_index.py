@@ -0,0 +1,175 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+SORT_OPTIONS = ["Producer A-Z", "Producer Z-A", "Price Low-High", "Price High-Low"]
+# sort option -> [(column, ascending), ...], most significant first. price_id always breaks
+# the last tie, so every mode is a total order and a page holds the same rows on every rerun.
+SORT_KEYS = {
+    "Producer A-Z": [("sort_name", True), ("vintage", True), ("supplier", True)],
+    "Producer Z-A": [("sort_name", False), ("vintage", True), ("supplier", True)],
+    "Price Low-High": [("bottle_price", True), ("sort_name", True), ("vintage", True), ("supplier", True)],
+    "Price High-Low": [("bottle_price", False), ("sort_name", True), ("vintage", True), ("supplier", True)],
+}
+TIE_BREAK_COLUMN = "price_id"
+# Above this share of the catalogue, sorting marks ranks in a bitmap instead of argsorting them
+DENSE_FRACTION = 1 / 16
+
+
+def _sort_codes(df, column):
+    """Dense integer codes 0..k-1 that order like `column` (NaN last)."""
+    values = df[column]
+    if column == "sort_name" and values.is_monotonic_increasing:
+        # The catalogue is kept in sort_name order, so equal runs can be numbered without sorting strings
+        values = values.to_numpy()
+        codes = np.zeros(len(values), dtype=np.int64)
+        codes[1:] = np.cumsum(values[1:] != values[:-1])
+        return codes
+    if pd.api.types.is_numeric_dtype(values):
+        _, codes = np.unique(values.to_numpy(dtype=float, na_value=np.inf), return_inverse=True)
+        return codes.astype(np.int64)
+    codes, _ = pd.factorize(values, sort=True, use_na_sentinel=False)
+    return codes.astype(np.int64)
+
+
+class _Descending:
+    """A sort key that orders in reverse inside a key tuple."""
+    __slots__ = ("key",)
+
+    def __init__(self, key):
+        self.key = key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+
+def _row_key(df, column, ascending):
+    """Function of a row position that orders rows like `_sort_codes` (NaN last before any flip)."""
+    if pd.api.types.is_numeric_dtype(df[column]):
+        values = df[column].to_numpy(dtype=float, na_value=np.inf)
+        return (lambda row: float(values[row])) if ascending else (lambda row: -float(values[row]))
+    values = df[column].array
+
+    def key(row):
+        value = values[row]
+        value = (True, "") if pd.isna(value) else (False, value)
+        return value if ascending else _Descending(value)
+    return key
+
+
+class _RowKey:
+    """Orders row positions by a mode's keys, reading each column only as far as a comparison needs."""
+    __slots__ = ("row", "column_keys", "tie_break", "values")
+
+    def __init__(self, row, column_keys, tie_break):
+        self.row = row
+        self.column_keys = column_keys
+        self.tie_break = tie_break
+        self.values = []
+
+    def _value(self, i):
+        while len(self.values) <= i:
+            self.values.append(self.column_keys[len(self.values)](self.row))
+        return self.values[i]
+
+    def __lt__(self, other):
+        for i in range(len(self.column_keys)):
+            mine, theirs = self._value(i), other._value(i)
+            if mine != theirs:
+                return mine < theirs
+        return self.tie_break[self.row] < self.tie_break[other.row]
+
+
+def _inverse(permutation):
+    inverse = np.empty(len(permutation), dtype=np.int64)
+    inverse[permutation] = np.arange(len(permutation))
+    return inverse
+
+
+class SortIndex:
+    """Every row's position under each sort mode, computed once per catalogue version.
+
+    Sorting a filtered subset is then a gather of integer ranks instead of
+    a string or float sort: small subsets argsort their ranks, large ones
+    mark them in a bitmap over the catalogue and read the full display
+    order back in one pass.
+    """
+
+    def __init__(self, df, sort_keys=None):
+        self.n_rows = len(df)
+        self.sort_keys = SORT_KEYS if sort_keys is None else sort_keys
+        self.orders = {}
+        self.ranks = {}
+        codes = {}
+        # Rank of every row under a suffix of sort keys; the modes share their secondary keys
+        tie_break = df[TIE_BREAK_COLUMN].to_numpy() if TIE_BREAK_COLUMN in df else np.arange(self.n_rows)
+        suffix_ranks = {(): _inverse(np.argsort(tie_break, kind="stable"))}
+        for sort, keys in self.sort_keys.items():
+            keys = tuple(keys)
+            for start in range(len(keys) - 1, -1, -1):
+                if keys[start:] in suffix_ranks:
+                    continue
+                column, ascending = keys[start]
+                if column not in codes:
+                    codes[column] = _sort_codes(df, column)
+                code = codes[column] if ascending else codes[column].max(initial=0) - codes[column]
+                # Ranks are a permutation of 0..n-1, so one int64 orders by (this key, the keys after it)
+                order = np.argsort(code * self.n_rows + suffix_ranks[keys[start + 1:]])
+                suffix_ranks[keys[start:]] = _inverse(order)
+            self.ranks[sort] = suffix_ranks[keys]
+            self.orders[sort] = _inverse(self.ranks[sort])
+
+    def arrays(self):
+        """Each sort mode's display order as named arrays, for a catalogue snapshot."""
+        return {f"orders/{sort}": order for sort, order in self.orders.items()}
+
+    @classmethod
+    def from_arrays(cls, arrays, sort_keys=None):
+        """The index saved by arrays(); ranks are recomputed from the orders."""
+        index = cls.__new__(cls)
+        index.sort_keys = SORT_KEYS if sort_keys is None else sort_keys
+        index.orders = {sort: arrays[f"orders/{sort}"] for sort in index.sort_keys}
+        index.ranks = {sort: _inverse(order) for sort, order in index.orders.items()}
+        index.n_rows = len(next(iter(index.orders.values()), ()))
+        return index
+
+    def spliced(self, df, splice):
+        """The index after a catalogue Splice, without re-sorting.
+
+        Kept rows keep their relative order under every mode, so each
+        re-read row is binary-searched into the existing order.
+        """
+        if TIE_BREAK_COLUMN not in df:
+            return SortIndex(df, self.sort_keys)
+        index = SortIndex.__new__(SortIndex)
+        index.n_rows = len(df)
+        index.sort_keys = self.sort_keys
+        index.orders, index.ranks = {}, {}
+        tie_break = df[TIE_BREAK_COLUMN].to_numpy()
+        for sort, keys in self.sort_keys.items():
+            column_keys = [_row_key(df, column, ascending) for column, ascending in keys]
+
+            def key(row):
+                return _RowKey(row, column_keys, tie_break)
+
+            order = splice.old_to_new[self.orders[sort]]
+            order = order[order >= 0]
+            added = sorted(splice.added.tolist(), key=key)
+            at = [bisect.bisect_left(order, key(row), key=key) for row in added]
+            index.orders[sort] = np.insert(order, at, added)
+            index.ranks[sort] = _inverse(index.orders[sort])
+        return index
+
+    def sort(self, rows, sort):
+        """Row positions in `sort` display order."""
+        rows = np.asarray(rows)
+        rank = self.ranks[sort]
+        if len(rows) > self.n_rows * DENSE_FRACTION:
+            selected = np.zeros(self.n_rows, dtype=bool)
+            selected[rank[rows]] = True
+            return self.orders[sort][selected]
+        return rows[np.argsort(rank[rows])]
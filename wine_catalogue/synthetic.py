@@ -0,0 +1,171 @@
+"""Synthetic wine catalogues with the production schema, for benchmarks and local testing.
+
+    python -m wine_catalogue.synthetic synthetic.db --prices 100000
+
+Names, regions, vintages and prices are drawn to look like the real price
+lists (accented producers, a long tail of varietals, a few wines sold by
+several suppliers, the odd zero price), and the same seed always produces
+the same database.
+"""
+import argparse
+import os
+import random
+
+import numpy as np
+
+from .catalogue import load_varietal_map
+from .db import connect, migrate
+
+# The tables as created by the original import scripts; migrate() adds the rest
+BASE_SCHEMA = [
+    """CREATE TABLE wines (
+        wine_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        wine_name TEXT,
+        vintage TEXT,
+        varietal TEXT,
+        region TEXT,
+        producer TEXT
+    )""",
+    """CREATE TABLE suppliers (
+        supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT
+    )""",
+    """CREATE TABLE wine_prices (
+        price_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        wine_id INTEGER,
+        supplier_id INTEGER,
+        bottle_price REAL,
+        case_price REAL,
+        case_size INTEGER,
+        availability TEXT,
+        FOREIGN KEY(wine_id) REFERENCES wines(wine_id),
+        FOREIGN KEY(supplier_id) REFERENCES suppliers(supplier_id)
+    )""",
+]
+
+SUPPLIER_NAMES = ["Red+White", "Mezzanine", "The Wine Co.", "AJWM", "Combined", "Oatley FWM", "Leckie Group",
+                  "Franc About Wine", "Cellar Door Direct", "Vinous Imports", "Bottle & Barrel", "Terroir Trading"]
+PRODUCER_PREFIXES = ["", "", "", "Domaine ", "Château ", "Maison ", "Weingut ", "Bodega ", "Tenuta ", "Champagne "]
+PRODUCER_SYLLABLES = ["al", "bel", "mon", "ro", "ver", "chê", "dru", "hin", "yer", "ing", "sta", "lu", "cien", "gi",
+                      "ant", "hen", "sch", "ke", "pi", "ga", "rè", "mar", "zo", "tal", "ni", "ul", "lo", "ne", "fé", "da"]
+PRODUCER_SUFFIXES = ["", "", " Estate", " Wines", " & Fils", " Family Wines", " Vineyard", " Cellars"]
+REGIONS = ["France", "Burgundy, France", "Margaret River, WA", "McLaren Vale, SA", "Italy", "Hunter Valley, NSW",
+           "Mornington Peninsula, VIC", "Piedmont, Italy", "Champagne, France", "Barossa Valley, SA", "Chablis, France",
+           "Yarra Valley, VIC", "Central Otago, NZ", "Orange, NSW", "Barolo, Piedmont, Italy", "Clare Valley, SA",
+           "Adelaide Hills, SA", "Eden Valley, SA", "Marlborough, NZ", "Geelong, VIC", "Coal River Valley, TAS",
+           "Rioja, Spain", "Mosel, Germany", "Côte-Rôtie, Rhône, France", "Saint-Aubin, Burgundy, France"]
+RANGE_NAMES = ["Grazing Collection", "Estate", "Reserve", "Single Vineyard", "Old Vine", "Home Block", "Riserva",
+               "Cuvée Prestige", "Les Clos", "1er Cru", "Black Label", "Heritage", "Fralù", "Héritiers", ""]
+# Wines per varietal in the live catalogue; every other mapped varietal gets the tail weight
+COMMON_VARIETALS = {
+    "Chardonnay": 324, "Pinot Noir": 259, "Shiraz": 145, "Blend / Other": 142, "Cabernet Sauvignon": 88,
+    "Riesling": 72, "Nebbiolo": 67, "Rosé": 45, "Sauvignon Blanc": 40, "Grenache": 37, "Champagne Blend": 33,
+    "Pinot Gris": 29, "Sangiovese": 27, "Pinot Grigio": 27, "Champagne": 27,
+}
+TAIL_VARIETAL_WEIGHT = 3
+VINTAGES = ["2024", "2023", "2022", "2021", "2020", "2019", "2018", "2015", "NV", "2023/2024", "22", "Various"]
+VINTAGE_WEIGHTS = [6, 17, 18, 13, 6, 5, 3, 2, 5, 3, 3, 1]
+
+# Lognormal LUC around a $43 median, like the real lists
+PRICE_MEDIAN = 43.0
+PRICE_SIGMA = 1.3
+ZERO_PRICE_RATE = 0.003
+PRICES_PER_WINE = 1.3
+
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _producer_names(rng, n):
+    names = set()
+    while len(names) < n:
+        name = "".join(rng.choices(PRODUCER_SYLLABLES, k=rng.randint(2, 4))).capitalize()
+        if rng.random() < 0.4:
+            name += " " + "".join(rng.choices(PRODUCER_SYLLABLES, k=rng.randint(2, 3))).capitalize()
+        names.add(rng.choice(PRODUCER_PREFIXES) + name + rng.choice(PRODUCER_SUFFIXES))
+    return sorted(names)
+
+
+def _varietal_weights(varietals):
+    """Real-world frequencies for the common varietals, a thin uniform tail for the rest."""
+    weights = np.array([COMMON_VARIETALS.get(v, TAIL_VARIETAL_WEIGHT) for v in varietals], dtype=float)
+    return weights / weights.sum()
+
+
+def generate_rows(n_prices, seed=0, n_suppliers=8, varietals=None):
+    """(suppliers, wines, prices) row lists for a catalogue of n_prices supplier prices."""
+    rng = np.random.default_rng(seed)
+    varietals = sorted(set(load_varietal_map()) | set(COMMON_VARIETALS)) if varietals is None else list(varietals)
+    n_wines = max(1, min(n_prices, round(n_prices / PRICES_PER_WINE)))
+    n_suppliers = min(n_suppliers, len(SUPPLIER_NAMES))
+    producers = _producer_names(random.Random(seed), max(1, n_wines // 7))
+
+    producer = rng.choice(producers, size=n_wines, p=_zipf_weights(len(producers), 0.8))
+    varietal = rng.choice(varietals, size=n_wines, p=_varietal_weights(varietals))
+    range_name = rng.choice(RANGE_NAMES, size=n_wines)
+    region = rng.choice(REGIONS, size=n_wines, p=_zipf_weights(len(REGIONS), 0.7))
+    vintage = rng.choice(VINTAGES, size=n_wines, p=np.array(VINTAGE_WEIGHTS) / sum(VINTAGE_WEIGHTS))
+    wines = [(i + 1, f"{r} {v}".strip(), vt, v, rg, p)
+             for i, (p, v, r, rg, vt) in enumerate(zip(producer, varietal, range_name, region, vintage))]
+
+    # Every wine has one supplier; the remaining prices go to random wines as extra
+    # suppliers, each from a different supplier (the importer keeps one price per pair)
+    counts = np.ones(n_wines, dtype=np.int64)
+    remaining = n_prices - n_wines
+    while remaining:
+        chosen = rng.choice(np.flatnonzero(counts < n_suppliers), size=min(remaining, max(1, n_wines // 2)),
+                            replace=False)
+        counts[chosen] += 1
+        remaining -= len(chosen)
+    wine_of_price = np.repeat(np.arange(1, n_wines + 1), counts)
+    rank = np.arange(n_prices) - np.repeat(np.cumsum(counts) - counts, counts)
+    supplier_of_price = (rng.integers(0, n_suppliers, size=n_wines)[wine_of_price - 1] + rank) % n_suppliers + 1
+    price = np.round(rng.lognormal(np.log(PRICE_MEDIAN), PRICE_SIGMA, size=n_prices), 2)
+    price[rng.random(n_prices) < ZERO_PRICE_RATE] = 0.0
+    prices = [(int(w), int(s), float(b), "Available") for w, s, b in zip(wine_of_price, supplier_of_price, price)]
+
+    suppliers = [(i + 1, name) for i, name in enumerate(SUPPLIER_NAMES[:n_suppliers])]
+    return suppliers, wines, prices
+
+
+def generate_catalogue(path, n_prices, seed=0, n_suppliers=8, overwrite=False):
+    """Write a migrated synthetic catalogue DB with n_prices rows in wine_prices and return its path."""
+    if os.path.exists(path):
+        if not overwrite:
+            raise FileExistsError(path)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    suppliers, wines, prices = generate_rows(n_prices, seed, n_suppliers)
+    conn = connect(path)
+    try:
+        with conn:
+            for statement in BASE_SCHEMA:
+                conn.execute(statement)
+            conn.executemany("INSERT INTO suppliers (supplier_id, name) VALUES (?, ?)", suppliers)
+            conn.executemany("INSERT INTO wines (wine_id, wine_name, vintage, varietal, region, producer) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", wines)
+            conn.executemany("INSERT INTO wine_prices (wine_id, supplier_id, bottle_price, availability) "
+                             "VALUES (?, ?, ?, ?)", prices)
+    finally:
+        conn.close()
+    migrate(path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--prices", type=int, default=10_000, help="rows in wine_prices")
+    parser.add_argument("--suppliers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args(argv)
+    generate_catalogue(args.path, args.prices, args.seed, args.suppliers, args.overwrite)
+    print(f"Wrote {args.prices} prices to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
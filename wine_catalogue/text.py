@@ -0,0 +1,90 @@
+"""The catalogue's text normal form (unidecode + lower-case), computed once per distinct string.
+
+Producers, wine names and varietals repeat heavily (one producer is shared
+by hundreds of wines), so columns are factorized first and only their
+distinct values are transliterated. Results are memoized in a bounded
+per-process dict, which makes incremental refreshes of a few wines almost
+free. Very large batches of new strings, such as a first load of a big
+import, are fanned out across a process pool instead, and the pool's
+results are then added to this process's memo in one update.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+from . import instrumentation
+
+FOLD_CACHE_SIZE = 1 << 18
+# Below this many distinct strings a pool costs more to start than it saves
+PARALLEL_MIN_VALUES = 50_000
+CHUNKS_PER_WORKER = 4
+
+
+# Workers are started from a fresh server process rather than forked from
+# this one, which may be a threaded web server holding locks mid-call
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# value -> fold(value), oldest first; at most FOLD_CACHE_SIZE entries
+_folded = {}
+_folded_lock = threading.Lock()
+
+
+def _remember(folded):
+    """Add a dict of value -> folded value to the memo, forgetting the oldest entries past FOLD_CACHE_SIZE."""
+    with _folded_lock:
+        _folded.update(folded)
+        for value in list(islice(_folded, max(0, len(_folded) - FOLD_CACHE_SIZE))):
+            del _folded[value]
+
+
+def fold(value):
+    """unidecode + lower-case one string (memoized)."""
+    folded = _folded.get(value)
+    if folded is None:
+        folded = unidecode(value).lower()
+        _remember({value: folded})
+    return folded
+
+
+def _fold_chunk(values):
+    return [fold(value) for value in values]
+
+
+def _transliterate_chunk(values):
+    # Runs in a worker, whose own memo would be thrown away with it
+    return [unidecode(value).lower() for value in values]
+
+
+def fold_values(values, processes=None):
+    """fold() a list of distinct strings, across `processes` worker processes when the list is large.
+
+    processes=None uses every core once there are PARALLEL_MIN_VALUES
+    values; processes=1 always folds in this process.
+    """
+    processes = processes or (os.cpu_count() or 1)
+    if processes == 1 or len(values) < PARALLEL_MIN_VALUES:
+        return _fold_chunk(values)
+    size = -(-len(values) // (processes * CHUNKS_PER_WORKER))
+    chunks = [values[start:start + size] for start in range(0, len(values), size)]
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(POOL_START_METHOD)) as pool:
+        results = [folded for chunk in pool.map(_transliterate_chunk, chunks) for folded in chunk]
+    _remember(dict(zip(values, results)))
+    return results
+
+
+def fold_columns(*columns, processes=None):
+    """fold() several string Series, transliterating each value found in any of them exactly once."""
+    codes, uniques = pd.factorize(pd.concat(columns, ignore_index=True))
+    instrumentation.annotate(distinct=len(uniques))
+    folded = np.asarray(fold_values(uniques.tolist(), processes), dtype=object)
+    results, start = [], 0
+    for column in columns:
+        results.append(pd.Series(folded[codes[start:start + len(column)]], index=column.index))
+        start += len(column)
+    return results